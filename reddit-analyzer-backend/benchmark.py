@@ -0,0 +1,612 @@
+"""
+Offline load test and benchmark for the AG-UI /awp endpoint.
+
+/awp normally needs live reddit.com and OpenAI, so its performance could
+not be measured repeatably. This script runs everything in one process on
+localhost:
+
+- a stub Reddit API that replays recorded listing responses from a
+  fixtures file (or, with --record, records them from reddit.com on first
+  use) and synthesizes deterministic listings for anything not recorded;
+- a stub OpenAI chat-completions API that answers with scripted tool calls
+  and answers (streamed or not) after a configurable latency, and can
+  return 429s above a concurrency ceiling to exercise the scheduler;
+- the app itself under uvicorn, pointed at both stubs through
+  REDDIT_BASE_URL and OPENAI_BASE_URL.
+
+It then drives /awp through the GraphQL generateMessage and plain messages
+paths at a fixed concurrency and reports throughput, client latency
+percentiles per path and p50/p95/p99 of every server stage (from the app's
+request spans). Results can be saved as JSON and compared against a
+baseline run, failing with exit status 1 when p95 latency or throughput
+regresses beyond a tolerance.
+
+Usage:
+    python benchmark.py --requests 200 --concurrency 16
+    python benchmark.py --record --fixtures listings.json
+    python benchmark.py --fixtures listings.json --json run.json --baseline previous.json
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import socket
+import sys
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+import aiohttp
+from aiohttp import web
+
+DEFAULT_QUESTIONS = [
+    "show me the latest posts",
+    "search for outages",
+    "why are people complaining about billing lately",
+    "any posts about equipment issues",
+    "what are people saying about slow internet speeds in Denver",
+    "what are the top posts this week",
+    "how common are installation problems",
+    "are customers happy with customer service",
+]
+
+# Synthetic post material: (title, body) pairs and places for the geo tools
+TOPICS = [
+    ("Internet outage since this morning", "Internet has been down for hours, the outage map shows nothing."),
+    ("Charged twice on my bill", "Billing charged me twice this month and support can't explain the fee."),
+    ("xFi gateway keeps rebooting", "My modem and router reboot every hour, already swapped the equipment once."),
+    ("Slow speeds on gigabit plan", "Paying for gigabit but speed tests show 50 Mbps down in the evening."),
+    ("Two hours on hold with support", "Customer service transferred me four times and then hung up."),
+    ("Technician never showed up", "Installation appointment was missed twice, no call from the tech."),
+    ("Price increase after promo", "My promo ended and the price went up $40 without notice."),
+    ("Xfinity Mobile port-in problems", "Porting my number has been stuck for three days."),
+]
+PLACES = ["Denver, CO", "Chicago, IL", "Atlanta, GA", "Philadelphia, PA", "Seattle, WA", "Houston, TX", "Boston, MA"]
+STOP_WORDS = {
+    "a", "about", "any", "are", "for", "in", "is", "lately", "me", "people", "posts", "saying",
+    "search", "show", "the", "there", "what", "why", "with", "complaining", "how", "common",
+}
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Linearly interpolated percentile (q in 0-100) of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: Sequence[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def jittered_sleep(seconds: float, rng: random.Random) -> None:
+    """Sleep for seconds +/- 25% so stub latency isn't perfectly regular."""
+    if seconds > 0:
+        await asyncio.sleep(seconds * rng.uniform(0.75, 1.25))
+
+
+class StubReddit:
+    """
+    Stand-in for Reddit's JSON API.
+
+    Responses are looked up in fixtures by path and sorted query string.
+    Misses are recorded from reddit.com when record is set and synthesized
+    deterministically otherwise, so every run sees the same data.
+    """
+
+    def __init__(self, fixtures_path: Optional[str] = None, record: bool = False, latency: float = 0.1, seed: int = 0):
+        self.fixtures_path = fixtures_path
+        self.record = record
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.fixtures: Dict[str, Any] = {}
+        if fixtures_path and os.path.exists(fixtures_path):
+            with open(fixtures_path, "r", encoding="utf-8") as f:
+                self.fixtures = json.load(f)
+        self.replayed = 0
+        self.synthesized = 0
+        self.recorded = 0
+        self._upstream: Optional[aiohttp.ClientSession] = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/{path:.*}", self.handle)
+        return app
+
+    async def close(self) -> None:
+        if self._upstream is not None:
+            await self._upstream.close()
+        if self.record and self.fixtures_path:
+            with open(self.fixtures_path, "w", encoding="utf-8") as f:
+                json.dump(self.fixtures, f)
+
+    @staticmethod
+    def fixture_key(path: str, query: Dict[str, str]) -> str:
+        return path + "?" + "&".join(f"{key}={query[key]}" for key in sorted(query))
+
+    async def handle(self, request: web.Request) -> web.Response:
+        await jittered_sleep(self.latency, self.rng)
+        query = dict(request.query)
+        key = self.fixture_key(request.path, query)
+        payload = self.fixtures.get(key)
+        if payload is not None:
+            self.replayed += 1
+        elif self.record:
+            payload = await self._fetch_upstream(request.path, query)
+            self.fixtures[key] = payload
+            self.recorded += 1
+        else:
+            payload = self.synthesize(request.path, query)
+            self.synthesized += 1
+        if payload is None:
+            return web.json_response({"error": 404}, status=404)
+        return web.json_response(payload)
+
+    async def _fetch_upstream(self, path: str, query: Dict[str, str]) -> Any:
+        if self._upstream is None:
+            self._upstream = aiohttp.ClientSession(headers={"User-Agent": "reddit-analyzer-benchmark/1.0"})
+        async with self._upstream.get(f"https://www.reddit.com{path}", params=query) as response:
+            return await response.json() if response.status == 200 else None
+
+    def synthesize(self, path: str, query: Dict[str, str]) -> Any:
+        """A deterministic listing (or comments pair) for path."""
+        comments = re.match(r"^/comments/(\w+)\.json$", path)
+        if comments:
+            post_id = comments.group(1)
+            return [self._listing([self._post(post_id, 0)]), self._comments(post_id)]
+
+        by_id = re.match(r"^/by_id/([\w,]+)\.json$", path)
+        if by_id:
+            ids = [name.removeprefix("t3_") for name in by_id.group(1).split(",")]
+            return self._listing([self._post(post_id, i) for i, post_id in enumerate(ids)])
+
+        listing = re.match(r"^/r/(\w+)/(\w+)\.json$", path)
+        if not listing:
+            return None
+        subreddit, sort = listing.groups()
+        limit = min(int(query.get("limit", 25)), 100)
+        search = query.get("q")
+        posts = []
+        for i in range(limit):
+            post_id = hashlib.md5(f"{subreddit}:{sort}:{search}:{i}".encode()).hexdigest()[:7]
+            posts.append(self._post(post_id, i, subreddit=subreddit, search=search))
+        return self._listing(posts)
+
+    def _post(self, post_id: str, index: int, subreddit: str = "Comcast_Xfinity", search: Optional[str] = None) -> Dict[str, Any]:
+        seed = int(post_id, 16) if re.fullmatch(r"[0-9a-f]+", post_id) else sum(map(ord, post_id))
+        title, body = TOPICS[seed % len(TOPICS)]
+        place = PLACES[(seed // 7) % len(PLACES)]
+        if search:
+            title = f"{title} ({search})"
+        return {
+            "kind": "t3",
+            "data": {
+                "id": post_id,
+                "title": title,
+                "selftext": f"{body} I'm in {place}.",
+                "score": (seed % 500) + 1,
+                "num_comments": seed % 60,
+                "created_utc": time.time() - index * 900 - seed % 600,
+                "permalink": f"/r/{subreddit}/comments/{post_id}/",
+                "author": f"user{seed % 1000}",
+                "link_flair_text": None,
+            },
+        }
+
+    @staticmethod
+    def _listing(children: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {"kind": "Listing", "data": {"after": None, "children": children}}
+
+    def _comments(self, post_id: str) -> Dict[str, Any]:
+        children = []
+        for i in range(12):
+            children.append({
+                "kind": "t1",
+                "data": {
+                    "id": f"{post_id}c{i}",
+                    "author": f"commenter{i}",
+                    "body": "Try power cycling the gateway and asking for a line check." if i % 3 == 0 else "Same here.",
+                    "score": 40 - i * 3,
+                    "parent_id": f"t3_{post_id}",
+                    "replies": "",
+                },
+            })
+        return self._listing(children)
+
+
+class StubOpenAI:
+    """
+    Stand-in for the chat-completions API with scripted behaviour.
+
+    A turn ending with a user message gets a tool call picked from its
+    keywords; a turn ending with tool results gets a canned answer, streamed
+    word by word when requested. Above max_concurrency in-flight requests
+    the stub answers 429 with Retry-After, like the real API does.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        token_delay: float = 0.005,
+        max_concurrency: Optional[int] = None,
+        seed: int = 0,
+    ):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.max_concurrency = max_concurrency
+        self.rng = random.Random(seed)
+        self.in_flight = 0
+        self.calls = 0
+        self.rate_limited = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        if self.max_concurrency is not None and self.in_flight >= self.max_concurrency:
+            self.rate_limited += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"Retry-After": "1"},
+            )
+
+        self.in_flight += 1
+        self.calls += 1
+        try:
+            await jittered_sleep(self.latency, self.rng)
+            messages = body["messages"]
+            if messages[-1]["role"] == "tool":
+                message = {"role": "assistant", "content": self.answer(messages)}
+            else:
+                message = {"role": "assistant", "content": None, "tool_calls": [self.tool_call(messages[-1]["content"])]}
+
+            if body.get("stream"):
+                return await self._stream(request, body["model"], message)
+            return web.json_response(self._completion(body["model"], message))
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def tool_call(text: str) -> Dict[str, Any]:
+        lowered = text.lower()
+        if any(word in lowered for word in ("latest", "newest", "recent")):
+            name, arguments = "fetch_recent_posts", {"timeframe": "new"}
+        elif "top" in lowered.split():
+            name, arguments = "fetch_recent_posts", {"timeframe": "top"}
+        elif any(word in lowered for word in ("common", "increasing", "how many")):
+            name, arguments = "aggregate_issue_stats", {"window_hours": 168}
+        else:
+            terms = [word for word in re.findall(r"[a-z]+", lowered) if word not in STOP_WORDS]
+            name, arguments = "search_subreddit", {"query": " ".join(terms[:3]) or "xfinity"}
+        call_id = "call_" + hashlib.md5(text.encode()).hexdigest()[:12]
+        return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+    @staticmethod
+    def answer(messages: List[Dict[str, Any]]) -> str:
+        results = [message.get("content") or "" for message in messages if message["role"] == "tool"]
+        chars = sum(len(result) for result in results)
+        return (
+            f"Based on {len(results)} tool results ({chars} characters of Reddit data), customers mostly report "
+            "outages, billing surprises and equipment that needs to be replaced. Several posts describe long "
+            "hold times with support, and a few mention that power cycling the gateway helped. Posts are "
+            "concentrated in a handful of metro areas, and the most upvoted threads are from the last two days."
+        )
+
+    @staticmethod
+    def _completion(model: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": "chatcmpl-benchmark",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    async def _stream(self, request: web.Request, model: str, message: Dict[str, Any]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await response.prepare(request)
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> bytes:
+            payload = {
+                "id": "chatcmpl-benchmark",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload)}\n\n".encode()
+
+        await response.write(chunk({"role": "assistant", "content": ""}))
+        for word in (message.get("content") or "").split(" "):
+            if self.token_delay > 0:
+                await asyncio.sleep(self.token_delay)
+            await response.write(chunk({"content": word + " "}))
+        await response.write(chunk({}, "stop"))
+        await response.write(b"data: [DONE]\n\n")
+        await response.write_eof()
+        return response
+
+
+class StageRecorder(logging.Handler):
+    """Collects the per-request summary events the app logs for /awp."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        fields = getattr(record, "fields", None) or {}
+        if record.getMessage() == "request" and fields.get("route") == "/awp":
+            self.requests.append(fields)
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        stages: Dict[str, List[float]] = {"request": [fields["duration_ms"] for fields in self.requests]}
+        for fields in self.requests:
+            for stage, ms in fields.get("stages", {}).items():
+                stages.setdefault(stage, []).append(ms)
+        return {stage: summarize(values) for stage, values in sorted(stages.items())}
+
+
+def request_body(path: str, question: str, stream: bool) -> Dict[str, Any]:
+    if path == "graphql":
+        body: Dict[str, Any] = {"operationName": "generateMessage", "variables": {"text": question}}
+    else:
+        body = {"messages": [{"role": "user", "content": question}]}
+    if stream:
+        body["stream"] = True
+    return body
+
+
+async def drive(
+    base_url: str,
+    questions: Sequence[str],
+    paths: Sequence[str],
+    total: int,
+    concurrency: int,
+    stream: bool,
+) -> List[Dict[str, Any]]:
+    """Send total requests to /awp from concurrency workers; returns one sample per request."""
+    samples: List[Dict[str, Any]] = []
+    next_index = 0
+
+    async def worker(session: aiohttp.ClientSession) -> None:
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            path = paths[index % len(paths)]
+            question = questions[(index // len(paths)) % len(questions)]
+            started = time.perf_counter()
+            first_byte = None
+            try:
+                async with session.post(f"{base_url}/awp", json=request_body(path, question, stream)) as response:
+                    body = bytearray()
+                    async for data in response.content.iter_any():
+                        if first_byte is None:
+                            first_byte = time.perf_counter()
+                        body += data
+                    status = response.status
+                    # Streamed runs fail in-band, after a 200
+                    if stream and b'"RUN_ERROR"' in body:
+                        status = "run_error"
+            except aiohttp.ClientError as e:
+                status = f"error: {e.__class__.__name__}"
+            finished = time.perf_counter()
+            samples.append({
+                "path": path,
+                "status": status,
+                "latency_ms": (finished - started) * 1000,
+                "ttfb_ms": ((first_byte or finished) - started) * 1000,
+            })
+
+    timeout = aiohttp.ClientTimeout(total=300)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+    return samples
+
+
+def configure_app_environment(args: argparse.Namespace, reddit_url: str, openai_url: str) -> None:
+    """Environment the app reads at import time: stub endpoints and an isolated, quiet setup."""
+    os.environ["REDDIT_BASE_URL"] = reddit_url
+    os.environ["OPENAI_BASE_URL"] = f"{openai_url}/v1"
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    os.environ["INGEST_ENABLED"] = "false"
+    os.environ["POST_STORE_PATH"] = ":memory:"
+    os.environ["LLM_CACHE_PATH"] = ""
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if args.no_llm_cache:
+        os.environ["LLM_CACHE_SIZE"] = "0"
+    if args.no_router:
+        os.environ["INTENT_ROUTER_ENABLED"] = "false"
+
+
+async def start_stub(app: web.Application, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    return runner
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    reddit = StubReddit(args.fixtures, args.record, args.reddit_latency, args.seed)
+    openai_stub = StubOpenAI(args.openai_latency, args.openai_token_delay, args.openai_max_concurrency, args.seed)
+    reddit_port, openai_port, app_port = free_port(), free_port(), free_port()
+    reddit_runner = await start_stub(reddit.app(), reddit_port)
+    openai_runner = await start_stub(openai_stub.app(), openai_port)
+
+    configure_app_environment(args, f"http://127.0.0.1:{reddit_port}", f"http://127.0.0.1:{openai_port}")
+    import uvicorn
+    import main as app_module
+
+    recorder = StageRecorder()
+    http_logger = logging.getLogger("reddit_analyzer.http")
+    http_logger.addHandler(recorder)
+    http_logger.setLevel(logging.INFO)
+    http_logger.propagate = False
+
+    server = uvicorn.Server(uvicorn.Config(app_module.app, host="127.0.0.1", port=app_port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()
+        await asyncio.sleep(0.05)
+
+    base_url = f"http://127.0.0.1:{app_port}"
+    paths = args.paths.split(",")
+    questions = args.questions or DEFAULT_QUESTIONS
+    try:
+        if args.warmup:
+            await drive(base_url, questions, paths, args.warmup, args.concurrency, args.stream)
+            recorder.requests.clear()
+        started = time.perf_counter()
+        samples = await drive(base_url, questions, paths, args.requests, args.concurrency, args.stream)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        await server_task
+        await reddit_runner.cleanup()
+        await openai_runner.cleanup()
+        await reddit.close()
+
+    statuses: Dict[str, int] = {}
+    for sample in samples:
+        statuses[str(sample["status"])] = statuses.get(str(sample["status"]), 0) + 1
+    client = {
+        path: summarize([sample["latency_ms"] for sample in samples if sample["path"] == path])
+        for path in paths
+    }
+    if args.stream:
+        for path in paths:
+            client[f"{path}.ttfb"] = summarize([sample["ttfb_ms"] for sample in samples if sample["path"] == path])
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "paths": paths,
+            "stream": args.stream,
+            "reddit_latency": args.reddit_latency,
+            "openai_latency": args.openai_latency,
+            "openai_max_concurrency": args.openai_max_concurrency,
+        },
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "status": statuses,
+        "client_ms": client,
+        "stages_ms": recorder.stage_summary(),
+        "stubs": {
+            "reddit": {"replayed": reddit.replayed, "recorded": reddit.recorded, "synthesized": reddit.synthesized},
+            "openai": {"calls": openai_stub.calls, "rate_limited": openai_stub.rate_limited},
+        },
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    config = result["config"]
+    print(
+        f"{config['requests']} requests at concurrency {config['concurrency']} in {result['elapsed_s']}s "
+        f"({result['throughput_rps']} req/s)"
+    )
+    print("Status: " + ", ".join(f"{status}={count}" for status, count in sorted(result["status"].items())))
+    print(f"Stubs: {json.dumps(result['stubs'])}")
+    for title, table in (("Client latency (ms)", result["client_ms"]), ("Server stages (ms)", result["stages_ms"])):
+        print(f"\n{title:<30}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+        for name, row in table.items():
+            print(f"  {name:<28}{row['count']:>8}{row['p50']:>10.2f}{row['p95']:>10.2f}{row['p99']:>10.2f}")
+
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, noise_ms: float) -> List[str]:
+    """Regressions of result against baseline: p95 latencies and throughput beyond tolerance."""
+    regressions = []
+    for section in ("client_ms", "stages_ms"):
+        for name, row in result[section].items():
+            before = baseline.get(section, {}).get(name)
+            if not before:
+                continue
+            if row["p95"] > before["p95"] * (1 + tolerance) and row["p95"] - before["p95"] > noise_ms:
+                regressions.append(f"{section}.{name} p95 {before['p95']:.2f} -> {row['p95']:.2f} ms")
+    before_rps = baseline.get("throughput_rps")
+    if before_rps and result["throughput_rps"] < before_rps * (1 - tolerance):
+        regressions.append(f"throughput {before_rps} -> {result['throughput_rps']} req/s")
+    return regressions
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--requests", type=int, default=200, help="measured requests (default 200)")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests sent first (default 20)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients (default 16)")
+    parser.add_argument("--paths", default="graphql,messages", help="comma-separated /awp paths: graphql, messages")
+    parser.add_argument("--stream", action="store_true", help="request SSE streaming and also report time to first byte")
+    parser.add_argument("--question", dest="questions", action="append", help="question to ask (repeatable)")
+    parser.add_argument("--fixtures", help="JSON file of recorded Reddit responses to replay")
+    parser.add_argument("--record", action="store_true", help="record Reddit responses missing from --fixtures from reddit.com")
+    parser.add_argument("--reddit-latency", type=float, default=0.15, help="stub Reddit latency in seconds")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="stub OpenAI latency in seconds")
+    parser.add_argument("--openai-token-delay", type=float, default=0.005, help="delay between streamed tokens")
+    parser.add_argument("--openai-max-concurrency", type=int, help="stub OpenAI returns 429 above this many in-flight calls")
+    parser.add_argument("--no-llm-cache", action="store_true", help="disable the OpenAI response cache")
+    parser.add_argument("--no-router", action="store_true", help="disable the local intent router")
+    parser.add_argument("--seed", type=int, default=0, help="seed for stub latency jitter")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95/throughput regression (default 0.2)")
+    parser.add_argument("--noise-ms", type=float, default=2.0, help="ignore p95 increases smaller than this")
+    args = parser.parse_args(argv)
+    unknown = set(args.paths.split(",")) - {"graphql", "messages"}
+    if unknown:
+        parser.error(f"unknown paths: {', '.join(sorted(unknown))}")
+    if args.record and not args.fixtures:
+        parser.error("--record needs --fixtures")
+    return args
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    args = parse_args(argv)
+    result = asyncio.run(run(args))
+    print_report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance, args.noise_ms)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+"""
+Comment-thread condensing and caching for the Reddit Analyzer.
+
+A /comments/{id}.json response is a deeply nested tree of replies, most of
+which add little beyond the few highest-voted answers and whatever the
+original poster said back. This module flattens the tree with an explicit
+stack (so thread depth is never limited by Python's recursion limit),
+keeps only the top-scored replies and the OP's own responses, and caches
+the condensed thread per post until the post's comment count changes.
+"""
+
+import heapq
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from context_packer import estimate_tokens
+from reddit_models import Post
+
+# Comments kept per thread besides the OP's responses
+TOP_COMMENTS = 8
+# OP responses kept per thread
+OP_RESPONSES = 4
+MAX_BODY_CHARS = 400
+
+REMOVED_BODIES = {"[deleted]", "[removed]", ""}
+
+POST_ID_RE = re.compile(r"(?:/comments/|^t3_|^)([a-z0-9]{5,10})(?:[/?#]|$)", re.IGNORECASE)
+
+
+@dataclass(slots=True)
+class Comment:
+    """One comment, positioned in its thread by depth."""
+
+    id: str
+    author: Optional[str]
+    body: str
+    score: int
+    depth: int
+    is_op: bool
+    parent_id: Optional[str] = None
+
+
+@dataclass(slots=True)
+class CommentThread:
+    """A post together with its condensed comments."""
+
+    post: Post
+    comments: List[Comment]
+    total_comments: int
+    fetched_at: float
+
+
+def parse_post_id(value: str) -> Optional[str]:
+    """Post id from a bare id, a "t3_" fullname or a Reddit post URL."""
+    match = POST_ID_RE.search(value.strip())
+    return match.group(1).lower() if match else None
+
+
+def flatten_comment_tree(listing: Dict[str, Any], op_author: Optional[str]) -> List[Comment]:
+    """
+    Flatten a comment listing into thread (pre-)order without recursion.
+
+    Args:
+        listing: The second element of a /comments/{id}.json response
+        op_author: Username of the post's author, to mark OP responses
+
+    Returns:
+        Every loaded comment; "load more" stubs are skipped
+    """
+    comments: List[Comment] = []
+    children = listing.get("data", {}).get("children", [])
+    stack = [(child, 0) for child in reversed(children)]
+    while stack:
+        child, depth = stack.pop()
+        if child.get("kind") != "t1":
+            continue
+        data = child.get("data", {})
+        author = data.get("author")
+        comments.append(
+            Comment(
+                id=data.get("id", ""),
+                author=author,
+                body=data.get("body", ""),
+                score=data.get("score", 0),
+                depth=depth,
+                is_op=op_author is not None and author == op_author,
+                parent_id=(data.get("parent_id") or "").partition("_")[2] or None,
+            )
+        )
+        replies = data.get("replies")
+        if isinstance(replies, dict):
+            stack.extend((reply, depth + 1) for reply in reversed(replies.get("data", {}).get("children", [])))
+    return comments
+
+
+def select_comments(
+    comments: Sequence[Comment], top_n: int = TOP_COMMENTS, op_responses: int = OP_RESPONSES
+) -> List[Comment]:
+    """
+    Keep the top-scored replies, the OP's responses and what the OP replied to.
+
+    Returns:
+        Selected comments in their original thread order
+    """
+    visible = [comment for comment in comments if comment.body.strip() not in REMOVED_BODIES]
+    chosen = {comment.id for comment in heapq.nlargest(
+        top_n, (comment for comment in visible if not comment.is_op), key=lambda comment: comment.score
+    )}
+    for comment in [comment for comment in visible if comment.is_op][:op_responses]:
+        chosen.add(comment.id)
+        if comment.parent_id:
+            chosen.add(comment.parent_id)
+    return [comment for comment in visible if comment.id in chosen]
+
+
+def decode_thread(payload: Any) -> CommentThread:
+    """
+    Build a condensed CommentThread from a /comments/{id}.json response.
+
+    Raises:
+        ValueError: If the payload is not a post/comments listing pair
+    """
+    if not isinstance(payload, list) or len(payload) < 2:
+        raise ValueError("Unexpected comments response shape")
+    children = payload[0].get("data", {}).get("children", [])
+    if not children:
+        raise ValueError("Comments response has no post")
+    post = Post.from_reddit(children[0].get("data", {}))
+    comments = flatten_comment_tree(payload[1], post.author)
+    return CommentThread(
+        post=post,
+        comments=select_comments(comments),
+        total_comments=len(comments),
+        fetched_at=time.time(),
+    )
+
+
+class CommentCache:
+    """
+    LRU cache of condensed threads, valid while a post's comment count is unchanged.
+
+    Scores keep drifting even when no comments are added, so entries also
+    expire after max_age seconds.
+    """
+
+    def __init__(self, max_entries: int = 256, max_age: float = 3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of threads kept
+            max_age: Seconds after which a thread is refetched regardless
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        # post id -> (num_comments the thread was fetched for, thread)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_env(cls) -> "CommentCache":
+        """Build a cache using COMMENT_CACHE_SIZE and COMMENT_CACHE_MAX_AGE."""
+        return cls(
+            max_entries=int(os.getenv("COMMENT_CACHE_SIZE", "256")),
+            max_age=float(os.getenv("COMMENT_CACHE_MAX_AGE", "3600")),
+        )
+
+    def get(self, post_id: str, num_comments: int) -> Optional[CommentThread]:
+        """The cached thread for post_id if its comment count still matches."""
+        entry = self._entries.get(post_id)
+        if entry is not None:
+            count, thread = entry
+            if count == num_comments and time.time() - thread.fetched_at < self.max_age:
+                self._entries.move_to_end(post_id)
+                self.hits += 1
+                return thread
+            del self._entries[post_id]
+        self.misses += 1
+        return None
+
+    def put(self, num_comments: int, thread: CommentThread) -> None:
+        """Cache thread under the comment count it was requested for."""
+        self._entries[thread.post.id] = (num_comments, thread)
+        self._entries.move_to_end(thread.post.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def format_threads(threads: Sequence[CommentThread], token_budget: int) -> str:
+    """
+    Render condensed threads for the model within a token budget.
+
+    Each thread gets an equal share of the budget; comments beyond a
+    thread's share are dropped, highest-scored first kept.
+    """
+    if not threads:
+        return "No comment threads found."
+
+    share = max(token_budget // len(threads), 50)
+    sections = []
+    for number, thread in enumerate(threads, 1):
+        post = thread.post
+        posted = datetime.fromtimestamp(post.created_utc, tz=timezone.utc).strftime("%Y-%m-%d")
+        header = (
+            f"Thread {number}: {post.title}\n"
+            f"{posted} | score {post.score} | showing {len(thread.comments)} of "
+            f"{thread.total_comments} comments | {post.url}"
+        )
+        remaining = share - estimate_tokens(header)
+        budgeted = set()
+        for comment in sorted(thread.comments, key=lambda comment: (comment.is_op, comment.score), reverse=True):
+            cost = estimate_tokens(comment.body[:MAX_BODY_CHARS]) + 6
+            if cost > remaining:
+                continue
+            remaining -= cost
+            budgeted.add(comment.id)
+
+        lines = [header]
+        for comment in thread.comments:
+            if comment.id not in budgeted:
+                continue
+            body = " ".join(comment.body.split())
+            if len(body) > MAX_BODY_CHARS:
+                body = body[:MAX_BODY_CHARS - 3].rstrip() + "..."
+            who = "OP" if comment.is_op else f"u/{comment.author}"
+            indent = "  " * min(comment.depth, 4)
+            lines.append(f"{indent}- [{comment.score}] {who}: {body}")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
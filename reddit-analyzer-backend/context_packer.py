@@ -0,0 +1,167 @@
+"""
+Token-budget-aware packing of Reddit posts into prompt context.
+
+Instead of a fixed "first 5 posts, 300 characters each" cut, this module
+collapses near-duplicate posts, ranks what is left by relevance to the
+user's question, score and recency, and greedily fills a token budget with
+compact per-post summaries. Token costs are estimated locally, so no tokenizer dependency
+or API call is needed.
+"""
+
+import math
+import re
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence, Set, Tuple
+
+from near_duplicates import collapse_near_duplicates
+from reddit_models import Post
+
+# Rough average for English text with GPT tokenizers
+CHARS_PER_TOKEN = 4
+
+# Upper bound on the content excerpt of a single post, so one long post
+# cannot crowd out the rest of the budget
+MAX_CONTENT_TOKENS = 120
+MIN_CONTENT_TOKENS = 15
+MAX_TITLE_CHARS = 150
+
+# Ranking weights: query relevance dominates, score and recency break ties
+RELEVANCE_WEIGHT = 3.0
+SCORE_WEIGHT = 0.3
+RECENCY_WEIGHT = 1.0
+RECENCY_HALF_LIFE_HOURS = 48.0
+
+STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "as", "at", "be", "by", "can", "do", "for",
+    "from", "have", "how", "i", "in", "is", "it", "me", "my", "of", "on", "or", "people",
+    "posts", "recent", "reddit", "saying", "show", "that", "the", "there", "this", "to",
+    "what", "whats", "with", "xfinity", "comcast", "you",
+}
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of how many tokens text costs."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def stem(word: str) -> str:
+    """Very light suffix stripping so "outages" matches "outage"."""
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def words_of(text: str) -> Set[str]:
+    """Stemmed lowercase words of text."""
+    return {stem(word) for word in WORD_RE.findall(text.lower())}
+
+
+def query_terms(query: Optional[str]) -> Set[str]:
+    """Significant stemmed words of a query."""
+    if not query:
+        return set()
+    return {
+        stem(word) for word in WORD_RE.findall(query.lower())
+        if word not in STOPWORDS and len(word) > 1
+    }
+
+
+def rank_posts(
+    posts: Sequence[Post], query: Optional[str] = None, now: Optional[float] = None
+) -> List[Tuple[Post, int]]:
+    """
+    Collapse near-duplicates and order the remaining posts best-first.
+
+    Args:
+        posts: Candidate posts
+        query: The user's question or search terms, used for relevance
+        now: Reference time for recency (defaults to the current time)
+
+    Returns:
+        (representative post, number of similar posts it stands for), most useful first
+    """
+    now = now or time.time()
+    terms = query_terms(query)
+    scored: List[Tuple[float, int, Post, int]] = []
+
+    for index, (post, similar) in enumerate(collapse_near_duplicates(posts)):
+        scored.append((_post_rank(post, terms, now, similar), -index, post, similar))
+
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [(post, similar) for _, _, post, similar in scored]
+
+
+def _post_rank(post: Post, terms: Set[str], now: float, similar: int = 0) -> float:
+    relevance = 0.0
+    if terms:
+        title_words = words_of(post.title)
+        content_words = words_of(post.content)
+        # Title hits count double: titles are where users state the problem
+        hits = sum(2.0 if term in title_words else 1.0 if term in content_words else 0.0 for term in terms)
+        relevance = hits / (2.0 * len(terms))
+    age_hours = max(0.0, now - post.created_utc) / 3600
+    recency = 0.5 ** (age_hours / RECENCY_HALF_LIFE_HOURS)
+    # Many similar posts signal a widespread issue, like upvotes do
+    popularity = math.log1p(max(post.score, 0) + max(post.num_comments, 0) + similar) / 10
+    return RELEVANCE_WEIGHT * relevance + SCORE_WEIGHT * popularity + RECENCY_WEIGHT * recency
+
+
+def summarize_post(post: Post, number: int, content_tokens: int, similar: int = 0) -> str:
+    """Compact one-post summary with the content excerpt capped at content_tokens."""
+    posted = datetime.fromtimestamp(post.created_utc, tz=timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
+    title = _truncate(post.title, MAX_TITLE_CHARS)
+    meta = f"{posted} | score {post.score} | {post.num_comments} comments"
+    if post.flair:
+        meta += f" | {post.flair}"
+    if similar:
+        meta += f" | +{similar} similar post{'s' if similar > 1 else ''}"
+
+    lines = [f"Post {number}: {title}", meta]
+    content = " ".join(post.content.split())
+    if content and content != "[No content]" and content_tokens > 0:
+        lines.append(f"Content: {_truncate(content, content_tokens * CHARS_PER_TOKEN)}")
+    lines.append(f"URL: {post.url}")
+    return "\n".join(lines)
+
+
+def pack_posts(posts: List[Post], token_budget: int, query: Optional[str] = None) -> Tuple[List[str], int]:
+    """
+    Greedily fill a token budget with summaries of the best posts.
+
+    Args:
+        posts: Candidate posts
+        token_budget: Maximum estimated tokens for all summaries together
+        query: The user's question or search terms, used for ranking
+
+    Returns:
+        Tuple of (post summaries in rank order, number of distinct posts left out)
+    """
+    ranked = rank_posts(posts, query)
+    summaries: List[str] = []
+    remaining = token_budget
+
+    for post, similar in ranked:
+        header_tokens = estimate_tokens(summarize_post(post, len(summaries) + 1, 0, similar))
+        content_tokens = min(MAX_CONTENT_TOKENS, remaining - header_tokens)
+        if content_tokens < MIN_CONTENT_TOKENS:
+            # Not enough room for this post with a useful excerpt
+            if remaining - header_tokens < 0:
+                break
+            content_tokens = 0
+        summary = summarize_post(post, len(summaries) + 1, content_tokens, similar)
+        summaries.append(summary)
+        remaining -= estimate_tokens(summary) + 1
+
+    return summaries, len(ranked) - len(summaries)
+
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars].rsplit(" ", 1)[0] or text[:max_chars]
+    return cut + "..."
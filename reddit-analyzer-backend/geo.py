@@ -0,0 +1,243 @@
+"""
+Gazetteer-based geographic extraction for Reddit posts.
+
+US state names, postal abbreviations, major cities in the Xfinity footprint
+and Comcast's regional division names are compiled into a word-level trie.
+A single left-to-right pass over a post's tokens finds the longest
+gazetteer match at each position, so multi-word names like "salt lake city"
+or "new york" are recognised without re-scanning the text.
+"""
+
+import heapq
+import re
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+from reddit_models import Post
+
+STATES: Dict[str, str] = {
+    "alabama": "AL", "alaska": "AK", "arizona": "AZ", "arkansas": "AR", "california": "CA",
+    "colorado": "CO", "connecticut": "CT", "delaware": "DE", "district of columbia": "DC",
+    "florida": "FL", "georgia": "GA", "hawaii": "HI", "idaho": "ID", "illinois": "IL",
+    "indiana": "IN", "iowa": "IA", "kansas": "KS", "kentucky": "KY", "louisiana": "LA",
+    "maine": "ME", "maryland": "MD", "massachusetts": "MA", "michigan": "MI", "minnesota": "MN",
+    "mississippi": "MS", "missouri": "MO", "montana": "MT", "nebraska": "NE", "nevada": "NV",
+    "new hampshire": "NH", "new jersey": "NJ", "new mexico": "NM", "new york": "NY",
+    "north carolina": "NC", "north dakota": "ND", "ohio": "OH", "oklahoma": "OK", "oregon": "OR",
+    "pennsylvania": "PA", "rhode island": "RI", "south carolina": "SC", "south dakota": "SD",
+    "tennessee": "TN", "texas": "TX", "utah": "UT", "vermont": "VT", "virginia": "VA",
+    "washington state": "WA", "west virginia": "WV", "wisconsin": "WI", "wyoming": "WY",
+}
+
+# Abbreviations that are also common English words only count after a comma
+# ("Portland, OR"); the rest count wherever they appear in upper case.
+AMBIGUOUS_ABBREVIATIONS = {"IN", "OR", "ME", "OK", "HI", "OH", "LA", "MA", "PA", "DE", "AL", "CO", "ID", "MD"}
+
+CITIES: Dict[str, str] = {
+    "atlanta": "GA", "austin": "TX", "baltimore": "MD", "boston": "MA", "boulder": "CO",
+    "chattanooga": "TN", "chicago": "IL", "colorado springs": "CO", "dallas": "TX",
+    "denver": "CO", "detroit": "MI", "fort lauderdale": "FL", "fort collins": "CO",
+    "fresno": "CA", "grand rapids": "MI", "harrisburg": "PA", "hartford": "CT",
+    "houston": "TX", "indianapolis": "IN", "jacksonville": "FL", "knoxville": "TN",
+    "miami": "FL", "minneapolis": "MN", "nashville": "TN", "naperville": "IL",
+    "new haven": "CT", "oakland": "CA", "orlando": "FL", "philadelphia": "PA", "philly": "PA",
+    "pittsburgh": "PA", "portland": "OR", "richmond": "VA", "sacramento": "CA",
+    "salt lake city": "UT", "san francisco": "CA", "san jose": "CA", "savannah": "GA",
+    "seattle": "WA", "st paul": "MN", "saint paul": "MN", "tacoma": "WA", "tallahassee": "FL",
+    "tampa": "FL", "washington dc": "DC", "west palm beach": "FL", "worcester": "MA",
+    "ann arbor": "MI", "albuquerque": "NM", "spokane": "WA", "bay area": "CA",
+    "twin cities": "MN", "silicon valley": "CA",
+}
+
+# Comcast divisions, by state
+REGIONS: Dict[str, str] = {
+    **{state: "Northeast" for state in (
+        "CT", "DC", "DE", "MA", "MD", "ME", "NH", "NJ", "NY", "PA", "RI", "VA", "VT", "WV",
+    )},
+    **{state: "Central" for state in (
+        "AL", "FL", "GA", "IL", "IN", "KY", "MI", "MS", "NC", "OH", "SC", "TN", "WI",
+    )},
+    **{state: "West" for state in (
+        "AK", "AR", "AZ", "CA", "CO", "HI", "IA", "ID", "KS", "LA", "MN", "MO", "MT", "ND",
+        "NE", "NM", "NV", "OK", "OR", "SD", "TX", "UT", "WA", "WY",
+    )},
+}
+
+# Division names as written in posts; bare "west"/"central" are too common to count
+REGION_NAMES = {
+    "northeast division": "Northeast", "central division": "Central", "west division": "West",
+    "northeast region": "Northeast", "central region": "Central", "west region": "West",
+}
+
+TOKEN_RE = re.compile(r"[A-Za-z]+|,")
+
+# Trie node: child tokens plus the (kind, value) stored at the end of a name
+_Node = Dict[str, object]
+
+
+def _build_trie() -> _Node:
+    root: _Node = {}
+    entries: List[Tuple[str, Tuple[str, str]]] = []
+    entries += [(name, ("state", code)) for name, code in STATES.items()]
+    entries += [(name, ("city", name)) for name in CITIES]
+    entries += [(name, ("region", region)) for name, region in REGION_NAMES.items()]
+    for name, value in entries:
+        node = root
+        for token in name.split():
+            node = node.setdefault(token, {})  # type: ignore[assignment]
+        node["$"] = value
+    return root
+
+
+GAZETTEER = _build_trie()
+
+
+def extract_locations(text: str) -> List[str]:
+    """
+    Locations mentioned in text, in order of first mention.
+
+    Returns:
+        Labels of the form "Denver, CO" for cities, "CO" for states and
+        "region:West" for Comcast divisions named without a state
+    """
+    tokens = TOKEN_RE.findall(text)
+    lowered = [token.lower() for token in tokens]
+    found: List[str] = []
+    i = 0
+    while i < len(tokens):
+        match, length = _longest_match(lowered, i)
+        if match is not None:
+            kind, value = match
+            if kind == "city":
+                label = f"{_title(value)}, {CITIES[value]}"
+            elif kind == "state":
+                label = value
+            else:
+                label = f"region:{value}"
+            if label not in found:
+                found.append(label)
+            i += length
+            continue
+
+        token = tokens[i]
+        if len(token) == 2 and token.isupper() and token in REGIONS:
+            after_comma = i > 0 and tokens[i - 1] == ","
+            if token not in AMBIGUOUS_ABBREVIATIONS or after_comma:
+                if token not in found:
+                    found.append(token)
+        i += 1
+
+    # A city already implies its state
+    city_states = {label.rsplit(", ", 1)[1] for label in found if ", " in label}
+    return [label for label in found if label not in city_states]
+
+
+def post_locations(post: Post) -> List[str]:
+    """Locations in a post's title and content, extracted once and kept on the post."""
+    if post.locations is None:
+        content = post.content if post.content != "[No content]" else ""
+        post.locations = extract_locations(f"{post.title}\n{content}")
+    return post.locations
+
+
+def region_keys(post: Post) -> Set[str]:
+    """Spike-detector keys ("region:West", "state:CO") for the places a post mentions."""
+    keys = set()
+    for label in post_locations(post):
+        region, state = region_of(label), state_of(label)
+        if region:
+            keys.add(f"region:{region}")
+        if state:
+            keys.add(f"state:{state}")
+    return keys
+
+
+def _longest_match(tokens: Sequence[str], start: int) -> Tuple[Optional[Tuple[str, str]], int]:
+    node = GAZETTEER
+    best: Optional[Tuple[str, str]] = None
+    best_length = 0
+    for offset in range(start, len(tokens)):
+        child = node.get(tokens[offset])
+        if child is None:
+            break
+        node = child  # type: ignore[assignment]
+        if "$" in node:
+            best, best_length = node["$"], offset - start + 1  # type: ignore[assignment]
+    return best, best_length
+
+
+def _title(name: str) -> str:
+    return " ".join(word.capitalize() for word in name.split())
+
+
+def state_of(label: str) -> Optional[str]:
+    """State code of a location label, if it has one."""
+    if label.startswith("region:"):
+        return None
+    return label.rsplit(", ", 1)[-1]
+
+
+def region_of(label: str) -> Optional[str]:
+    """Comcast division of a location label."""
+    if label.startswith("region:"):
+        return label.split(":", 1)[1]
+    return REGIONS.get(state_of(label) or "")
+
+
+LEVELS = ("region", "state", "city")
+
+
+def geographic_breakdown(posts: Sequence[Post], level: str = "state", examples_per_location: int = 2) -> Dict[str, Any]:
+    """
+    Count posts per location at the requested level.
+
+    Args:
+        posts: Posts to aggregate
+        level: "region" (Comcast division), "state" or "city"
+        examples_per_location: Number of top-scored example posts per location
+
+    Returns:
+        Dictionary with total/located counts and per-location stats, largest
+        first; a post counts once per location it mentions
+    """
+    if level not in LEVELS:
+        return {"error": f"Unknown level '{level}', use 'region', 'state' or 'city'"}
+
+    counts: Dict[str, int] = {}
+    comments: Dict[str, int] = {}
+    examples: Dict[str, List[Post]] = {}
+    located = 0
+    for post in posts:
+        keys = set()
+        for label in post_locations(post):
+            if level == "region":
+                key = region_of(label)
+            elif level == "state":
+                key = state_of(label)
+            else:
+                key = label if ", " in label else None
+            if key:
+                keys.add(key)
+        if keys:
+            located += 1
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+            comments[key] = comments.get(key, 0) + post.num_comments
+            examples.setdefault(key, []).append(post)
+
+    total = len(posts)
+    locations = {}
+    for key, count in sorted(counts.items(), key=lambda item: item[1], reverse=True):
+        top = heapq.nlargest(examples_per_location, examples[key], key=lambda post: post.score)
+        locations[key] = {
+            "posts": count,
+            "comments": comments[key],
+            "share_of_located": round(count / located, 3),
+            "examples": [{"id": post.id, "title": post.title[:100], "score": post.score} for post in top],
+        }
+
+    return {
+        "level": level,
+        "total_posts": total,
+        "located_posts": located,
+        "locations": locations,
+    }
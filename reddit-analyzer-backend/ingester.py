@@ -0,0 +1,219 @@
+"""
+Incremental background ingestion of subreddit posts.
+
+This module provides a background job that walks the subreddit's new.json
+listing with Reddit's `after` cursor, stores only posts newer than the last
+checkpoint, and refreshes score/comment counts of recent posts on a decaying
+schedule. The checkpoint lives in the PostStore, so a restart resumes where
+the previous process stopped instead of re-crawling.
+"""
+
+import asyncio
+import os
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from post_store import PostStore
+from reddit_models import Post
+from reddit_tools import RedditAnalyzer
+from reddit_transport import RedditTransportError
+from telemetry import get_logger
+
+log = get_logger("ingester")
+
+
+class RedditIngester:
+    """
+    Periodically pulls new posts into the PostStore.
+
+    Each cycle costs at most max_pages listing requests plus
+    max_refresh_batches by-id requests, so upstream traffic stays flat no
+    matter how large the local corpus grows.
+    """
+
+    def __init__(
+        self,
+        analyzer: RedditAnalyzer,
+        store: PostStore,
+        interval: float = 120.0,
+        max_pages: int = 10,
+        page_size: int = 100,
+        max_refresh_batches: int = 1,
+    ):
+        """
+        Initialize the ingester.
+
+        Args:
+            analyzer: Analyzer used to fetch listing pages
+            store: Store the posts and checkpoint are written to
+            interval: Seconds between ingestion cycles
+            max_pages: Maximum new.json pages walked per cycle
+            page_size: Posts per page (Reddit caps this at 100)
+            max_refresh_batches: Maximum 100-post score refresh requests per cycle
+        """
+        self.analyzer = analyzer
+        self.store = store
+        self.interval = interval
+        self.max_pages = max_pages
+        self.page_size = page_size
+        self.max_refresh_batches = max_refresh_batches
+        self._task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_env(cls, analyzer: RedditAnalyzer, store: PostStore) -> "RedditIngester":
+        """Build an ingester using INGEST_* environment variables."""
+        return cls(
+            analyzer,
+            store,
+            interval=float(os.getenv("INGEST_INTERVAL", "120")),
+            max_pages=int(os.getenv("INGEST_MAX_PAGES", "10")),
+        )
+
+    def start(self) -> None:
+        """Start the background ingestion loop."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run_forever())
+
+    async def stop(self) -> None:
+        """Cancel the background loop and wait for it to exit."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Dict[str, int]:
+        """
+        Run one ingestion cycle.
+
+        Returns:
+            Counts of new and refreshed posts
+        """
+        new_posts = await self.ingest_new_posts()
+        refreshed = await self.refresh_recent_scores()
+        return {"new": new_posts, "refreshed": refreshed}
+
+    async def ingest_new_posts(self) -> int:
+        """
+        Walk new.json from the top until the checkpoint post is reached.
+
+        If max_pages runs out first, the unread stretch between the last
+        page and the old checkpoint is remembered as a gap (its `after`
+        cursor and the post it ends at). Later cycles spend the pages left
+        after their own top walk continuing down that gap until it closes,
+        so no post is skipped however far ingestion falls behind.
+        """
+        subreddit = self.analyzer.subreddit
+        checkpoint = await self.store.get_checkpoint(subreddit)
+        gap = checkpoint.get("gap") if checkpoint else None
+
+        ingested, newest, reached_checkpoint, after, pages_used = await self._walk(
+            subreddit, checkpoint, self.max_pages, None
+        )
+        if checkpoint and not reached_checkpoint and after:
+            # Everything below this page down to the oldest unread checkpoint is still unread
+            gap = {"after": after, "until": gap["until"] if gap else self._position(checkpoint)}
+
+        if gap and pages_used < self.max_pages:
+            gap_ingested, _, closed, gap_after, _ = await self._walk(
+                subreddit, gap["until"], self.max_pages - pages_used, gap["after"]
+            )
+            ingested += gap_ingested
+            gap = None if closed or not gap_after else {"after": gap_after, "until": gap["until"]}
+
+        if gap:
+            log.warning("ingest_checkpoint_not_reached", subreddit=subreddit, max_pages=self.max_pages)
+
+        position = newest or (self._position(checkpoint) if checkpoint else None)
+        if position is not None:
+            await self.store.set_checkpoint(subreddit, {**position, "gap": gap} if gap else position)
+        await self.store.mark_refreshed(subreddit)
+        return ingested
+
+    async def _walk(
+        self, subreddit: str, stop_at: Optional[Dict[str, Any]], pages: int, after: Optional[str]
+    ) -> Tuple[int, Optional[Dict[str, Any]], bool, Optional[str], int]:
+        """
+        Store posts from new.json, starting at `after`, until stop_at is reached.
+
+        Returns:
+            Tuple of (posts stored, newest post seen, whether stop_at was
+            reached, cursor after the last page read, pages read)
+        """
+        newest: Optional[Dict[str, Any]] = None
+        ingested = 0
+        reached = False
+        pages_used = 0
+
+        # Pages are prefetched, so the next request overlaps with this page's upsert;
+        # aclosing cancels the outstanding prefetch when we stop at the checkpoint
+        async with aclosing(self.analyzer.iter_pages("new", pages, self.page_size, after)) as listing:
+            async for posts, after in listing:
+                pages_used += 1
+                fresh = self._newer_than(posts, stop_at)
+                reached = len(fresh) < len(posts)
+
+                if newest is None and posts:
+                    newest = {"id": posts[0].id, "created_utc": posts[0].created_utc}
+                if fresh:
+                    ingested += await self.store.upsert_posts(subreddit, fresh)
+                if reached or not after:
+                    break
+        return ingested, newest, reached, after, pages_used
+
+    async def refresh_recent_scores(self) -> int:
+        """Re-fetch score/comment counts for recent posts that are due."""
+        subreddit = self.analyzer.subreddit
+        refreshed = 0
+        requested: Set[str] = set()
+        for _ in range(self.max_refresh_batches):
+            post_ids = await self.store.posts_due_for_refresh(subreddit, limit=100)
+            if not post_ids or requested.issuperset(post_ids):
+                break
+            requested.update(post_ids)
+            try:
+                posts = await self.analyzer.fetch_posts_by_id(post_ids)
+            except RedditTransportError as e:
+                # Push the batch back a tier rather than retrying it ahead of every other post
+                log.warning("refresh_batch_failed", subreddit=subreddit, error=str(e), status=e.status)
+                await self.store.touch_posts(subreddit, post_ids)
+                break
+            refreshed += await self.store.upsert_posts(subreddit, posts)
+            # Deleted or removed posts are not returned; without this they would stay due forever
+            returned = {post.id for post in posts}
+            await self.store.touch_posts(subreddit, [post_id for post_id in post_ids if post_id not in returned])
+            if len(post_ids) < 100:
+                break
+        return refreshed
+
+    @staticmethod
+    def _position(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+        """The checkpoint post itself, without any gap bookkeeping."""
+        return {"id": checkpoint["id"], "created_utc": checkpoint["created_utc"]}
+
+    @staticmethod
+    def _newer_than(posts: List[Post], checkpoint: Optional[Dict[str, Any]]) -> List[Post]:
+        """Posts (newest first) strictly newer than the checkpoint post."""
+        if not checkpoint:
+            return posts
+        fresh = []
+        for post in posts:
+            if post.id == checkpoint["id"] or post.created_utc < checkpoint["created_utc"]:
+                break
+            fresh.append(post)
+        return fresh
+
+    async def _run_forever(self) -> None:
+        while True:
+            try:
+                counts = await self.run_once()
+                log.info("ingest_cycle", subreddit=self.analyzer.subreddit, **counts)
+            except asyncio.CancelledError:
+                raise
+            except RedditTransportError as e:
+                log.warning("ingest_cycle_failed", error=str(e), status=e.status)
+            except Exception as e:
+                log.exception("ingest_cycle_error", error=str(e))
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,173 @@
+"""
+Local intent routing for common chat requests.
+
+Most questions are some form of "show me the latest posts" or "search for
+X". For those the first OpenAI call only picks fetch_recent_posts or
+search_subreddit and fills in obvious arguments. This module recognizes
+such requests with a few anchored patterns, scores how sure it is with a
+small keyword classifier, and returns the tool call directly when the
+confidence clears a threshold; anything else falls back to letting the
+model choose.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+TIMEFRAME_WORDS = {
+    "hot": "hot", "trending": "hot", "popular": "hot",
+    "latest": "new", "newest": "new", "recent": "new", "new": "new",
+    "top": "top", "best": "top", "highest": "top",
+}
+
+_TIMEFRAME = "|".join(sorted(TIMEFRAME_WORDS, key=len, reverse=True))
+_POSTS = r"(?:posts?|threads?|discussions?|submissions?)"
+
+# (tool, pattern, base confidence); patterns run on normalized text
+RULES: List[Tuple[str, "re.Pattern[str]", float]] = [
+    (
+        "fetch_recent_posts",
+        re.compile(
+            rf"^(?:(?:please |can you |could you )?(?:show|get|list|give|fetch|pull|display)(?: me)? |what are )?"
+            rf"(?:the )?(?:(?P<limit>\d{{1,3}}) )?(?:most )?(?P<timeframe>{_TIMEFRAME})(?: (?P<limit2>\d{{1,3}}))? {_POSTS}"
+            rf"(?: (?:on|in|from) (?:the )?(?:r/)?(?:comcast_xfinity|subreddit|reddit|xfinity subreddit))?"
+            rf"(?: (?:right )?now| today| this week)?$"
+        ),
+        0.95,
+    ),
+    (
+        "search_subreddit",
+        re.compile(
+            # Bare "look"/"find" start too many analysis questions ("find out why ..."), so they
+            # only count as a search when followed by "up"/"for" or by posts
+            r"^(?:please |can you |could you )?(?:search(?: me)?(?: for)?|look (?:up|for)|find(?: me)?"
+            rf"(?= (?:any |the )?{_POSTS} )) "
+            rf"(?:(?:any |the )?{_POSTS} )?(?:(?:about|on|mentioning|regarding|for|with) )?(?P<query>.+?)$"
+        ),
+        0.9,
+    ),
+    (
+        "search_subreddit",
+        re.compile(
+            r"^(?:(?:please |can you |could you )?(?:show|get|give|list)(?: me)? |any |are there(?: any)? )?"
+            rf"(?:the )?(?:(?:{_TIMEFRAME}) )?{_POSTS} (?:about|on|mentioning|regarding) (?P<query>.+?)$"
+        ),
+        0.85,
+    ),
+]
+
+# Words that signal the user wants analysis the simple tools can't answer well
+ANALYSIS_CUES = {
+    "why", "how", "compare", "comparison", "versus", "vs", "trend", "trends", "trending up",
+    "increasing", "decreasing", "worse", "better", "where", "which", "percent", "percentage",
+    "categories", "category", "common", "most common", "summarize", "summary", "sentiment",
+    "breakdown", "region", "state", "comments", "solutions", "fix", "spectrum", "att", "verizon",
+}
+# Words that only make sense with earlier turns in view
+REFERENCE_CUES = {"it", "that", "those", "these", "them", "they", "above", "previous", "again", "more"}
+
+QUERY_FILLER_RE = re.compile(
+    rf"(?: {_POSTS})?(?: (?:on|in|from) (?:the )?(?:r/)?(?:comcast_xfinity|subreddit|reddit))?(?: (?:right )?now| today| this week)?$"
+)
+
+
+@dataclass(slots=True)
+class RoutedIntent:
+    """A tool call chosen locally, with how confident the router is."""
+
+    tool: str
+    arguments: Dict[str, Any]
+    confidence: float
+
+
+def normalize(text: str) -> str:
+    text = re.sub(r"[^\w/' ]+", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class IntentRouter:
+    """Rule-based tool selection with a keyword-penalty confidence score."""
+
+    def __init__(self, threshold: float = 0.8, max_words: int = 20):
+        """
+        Initialize the router.
+
+        Args:
+            threshold: Minimum confidence for a request to skip the model's tool choice
+            max_words: Longer messages are always left to the model
+        """
+        self.threshold = threshold
+        self.max_words = max_words
+        self.routed = 0
+        self.fallbacks = 0
+
+    @classmethod
+    def from_env(cls) -> "IntentRouter":
+        """Build a router using INTENT_ROUTER_THRESHOLD."""
+        return cls(threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.8")))
+
+    def route(self, text: str, has_history: bool = False) -> Optional[RoutedIntent]:
+        """
+        The tool call for a user message, if it is recognized confidently.
+
+        Args:
+            text: The latest user message
+            has_history: Whether earlier turns exist that the message may refer to
+
+        Returns:
+            The routed intent, or None to fall back to the model
+        """
+        intent = self.classify(text, has_history)
+        if intent is None or intent.confidence < self.threshold:
+            self.fallbacks += 1
+            return None
+        self.routed += 1
+        return intent
+
+    def classify(self, text: str, has_history: bool = False) -> Optional[RoutedIntent]:
+        """Best matching intent and its confidence, regardless of the threshold."""
+        normalized = normalize(text)
+        words = normalized.split()
+        if not words or len(words) > self.max_words:
+            return None
+
+        match = None
+        for tool, pattern, base in RULES:
+            found = pattern.match(normalized)
+            if found:
+                match = (tool, found, base)
+                break
+        if match is None:
+            return None
+        tool, found, confidence = match
+
+        if tool == "fetch_recent_posts":
+            limit = found.group("limit") or found.group("limit2")
+            arguments: Dict[str, Any] = {"timeframe": TIMEFRAME_WORDS[found.group("timeframe")]}
+            if limit:
+                arguments["limit"] = max(1, min(int(limit), 100))
+        else:
+            query = QUERY_FILLER_RE.sub("", found.group("query")).strip(" '\"")
+            query = re.sub(r"^(?:the|a|an) ", "", query)
+            if not query:
+                return None
+            arguments = {"query": query}
+
+        # Anywhere in the message, an analysis cue means the simple tools are the wrong answer
+        if set(words) & ANALYSIS_CUES or any(" " in cue and cue in normalized for cue in ANALYSIS_CUES):
+            return None
+        if has_history and set(words) & REFERENCE_CUES:
+            confidence -= 0.4
+        if tool == "search_subreddit" and len(arguments["query"].split()) > 6:
+            confidence -= 0.2
+        return RoutedIntent(tool=tool, arguments=arguments, confidence=round(max(confidence, 0.0), 3))
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.routed + self.fallbacks
+        return {
+            "routed": self.routed,
+            "fallbacks": self.fallbacks,
+            "routed_ratio": round(self.routed / total, 4) if total else 0.0,
+            "threshold": self.threshold,
+        }
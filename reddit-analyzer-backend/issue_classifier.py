@@ -0,0 +1,129 @@
+"""
+Local issue-category classification for Reddit posts.
+
+All category keywords are compiled into one regular expression with a named
+group per category, so a single left-to-right scan of a post's text finds
+every category it mentions. Aggregates over many posts are then cheap
+enough to compute on every request, and the model only needs to see a few
+hundred tokens of counts instead of thousands of tokens of raw post text.
+"""
+
+import heapq
+import re
+from typing import Any, Dict, List, Sequence, Set
+
+from reddit_models import Post
+
+# Keywords per category, matched case-insensitively as whole words;
+# a trailing "*" matches any word starting with that stem
+CATEGORY_KEYWORDS: Dict[str, List[str]] = {
+    "billing": [
+        "bill", "bills", "billing", "billed", "charg*", "overcharg*", "fee", "fees", "price*",
+        "pricing", "promo*", "rate increase", "refund*", "credit*", "payment*", "autopay",
+        "invoice*", "contract*", "cancel*", "data cap", "overage*",
+    ],
+    "outages": [
+        "outage*", "down", "no internet", "no service", "offline", "not working",
+        "disconnect*", "dropping", "drops", "dropped", "went out", "service interruption",
+    ],
+    "speed": [
+        "slow*", "speed*", "latency", "ping", "lag*", "mbps", "gbps", "bandwidth",
+        "throttl*", "packet loss", "upload*", "download*",
+    ],
+    "equipment": [
+        "modem*", "router*", "gateway*", "xfi pod*", "pods", "xb6", "xb7", "xb8", "xb10",
+        "cable box*", "x1 box*", "remote", "equipment", "firmware", "ethernet", "wifi",
+        "wi-fi", "mesh",
+    ],
+    "customer_service": [
+        "customer service", "support", "agent*", "rep", "reps", "representative*",
+        "technician*", "tech", "techs", "appointment*", "on hold", "chat", "call center",
+        "escalat*", "supervisor*", "complain*", "fcc", "retention",
+    ],
+}
+
+CATEGORIES = list(CATEGORY_KEYWORDS)
+
+
+def _keyword_regex(keyword: str) -> str:
+    if keyword.endswith("*"):
+        return re.escape(keyword[:-1]) + r"\w*"
+    return re.escape(keyword) + r"\b"
+
+
+def _compile(keywords: Dict[str, List[str]]) -> "re.Pattern[str]":
+    """One alternation with a named group per category, longest keywords first."""
+    groups = []
+    for category, words in keywords.items():
+        alternatives = "|".join(_keyword_regex(word) for word in sorted(words, key=len, reverse=True))
+        groups.append(f"(?P<{category}>{alternatives})")
+    return re.compile(r"\b(?:" + "|".join(groups) + r")", re.IGNORECASE)
+
+
+CATEGORY_PATTERN = _compile(CATEGORY_KEYWORDS)
+
+
+def classify_text(text: str) -> Set[str]:
+    """Categories mentioned anywhere in text, found in a single scan."""
+    return {match.lastgroup for match in CATEGORY_PATTERN.finditer(text)}
+
+
+def classify_post(post: Post) -> Set[str]:
+    """Categories mentioned in a post's title or content."""
+    content = post.content if post.content != "[No content]" else ""
+    return classify_text(f"{post.title}\n{content}")
+
+
+def aggregate_issue_stats(posts: Sequence[Post], examples_per_category: int = 3) -> Dict[str, Any]:
+    """
+    Count posts per issue category.
+
+    A post can belong to several categories. Shares are relative to all
+    posts in the window; score-weighted shares weight each post by its score
+    plus one, so widely upvoted complaints count for more.
+
+    Args:
+        posts: Posts to aggregate
+        examples_per_category: Number of top-scored example posts per category
+
+    Returns:
+        Dictionary with total/uncategorized counts and per-category stats
+    """
+    index = {category: i for i, category in enumerate(CATEGORIES)}
+    counts = [0] * len(CATEGORIES)
+    comment_counts = [0] * len(CATEGORIES)
+    weighted = [0.0] * len(CATEGORIES)
+    examples: List[List[Post]] = [[] for _ in CATEGORIES]
+    total_weight = 0.0
+    uncategorized = 0
+
+    for post in posts:
+        weight = max(post.score, 0) + 1
+        total_weight += weight
+        categories = classify_post(post)
+        if not categories:
+            uncategorized += 1
+        for category in categories:
+            i = index[category]
+            counts[i] += 1
+            comment_counts[i] += post.num_comments
+            weighted[i] += weight
+            examples[i].append(post)
+
+    total = len(posts)
+    stats = {}
+    for category, i in index.items():
+        top = heapq.nlargest(examples_per_category, examples[i], key=lambda post: post.score)
+        stats[category] = {
+            "posts": counts[i],
+            "comments": comment_counts[i],
+            "share": round(counts[i] / total, 3) if total else 0.0,
+            "score_weighted_share": round(weighted[i] / total_weight, 3) if total_weight else 0.0,
+            "examples": [{"id": post.id, "title": post.title[:100], "score": post.score} for post in top],
+        }
+
+    return {
+        "total_posts": total,
+        "uncategorized_posts": uncategorized,
+        "categories": dict(sorted(stats.items(), key=lambda item: item[1]["posts"], reverse=True)),
+    }
@@ -0,0 +1,161 @@
+"""
+In-process cache for Reddit listings.
+
+This module provides a bounded LRU cache with a freshness TTL that sits in
+front of RedditAnalyzer. Concurrent misses for the same key share a single
+upstream fetch, and entries past their TTL are served stale while a
+background refresh runs.
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class ListingCache:
+    """
+    A TTL/LRU cache with single-flight coalescing and stale-while-revalidate.
+
+    An entry younger than ttl is fresh and returned directly. An entry older
+    than ttl but younger than ttl + stale_ttl is returned immediately while a
+    refresh is scheduled in the background. Anything older is treated as a
+    miss.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0, stale_ttl: float = 300.0):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of listings held before LRU eviction
+            ttl: Seconds an entry is considered fresh
+            stale_ttl: Extra seconds a stale entry may be served while refreshing
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._background: set = set()
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @classmethod
+    def from_env(cls) -> "ListingCache":
+        """Build a cache using LISTING_CACHE_* environment variables."""
+        return cls(
+            max_entries=int(os.getenv("LISTING_CACHE_SIZE", "256")),
+            ttl=float(os.getenv("LISTING_CACHE_TTL", "60")),
+            stale_ttl=float(os.getenv("LISTING_CACHE_STALE_TTL", "300")),
+        )
+
+    async def get_or_fetch(
+        self,
+        key: Hashable,
+        fetcher: Callable[[], Awaitable[Any]],
+        cacheable: Callable[[Any], bool] = lambda value: True,
+    ) -> Any:
+        """
+        Return the cached value for key, fetching it if needed.
+
+        Args:
+            key: Cache key, e.g. (subreddit, sort, limit, query)
+            fetcher: Coroutine factory that fetches the value upstream
+            cacheable: Predicate deciding whether a fetched value is stored
+                (used to keep error results out of the cache)
+
+        Returns:
+            The cached or freshly fetched value
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return value
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    task = self._start_fetch(key, fetcher, cacheable)
+                    self._background.add(task)
+                    task.add_done_callback(self._background.discard)
+                    task.add_done_callback(self._consume_exception)
+                return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._start_fetch(key, fetcher, cacheable)
+        # Shield so one cancelled caller does not cancel the shared fetch
+        return await asyncio.shield(task)
+
+    def put(self, key: Hashable, value: Any, age: float = 0.0) -> None:
+        """Store a value fetched age seconds ago, evicting the least recently used entries if full."""
+        self._entries[key] = (value, time.monotonic() - age)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def items(self) -> List[Tuple[Hashable, Any, float]]:
+        """(key, value, age in seconds) of every entry, least recently used first."""
+        now = time.monotonic()
+        return [(key, value, now - fetched_at) for key, (value, fetched_at) in self._entries.items()]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop one key, or every entry when key is None."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters and current size."""
+        lookups = self.hits + self.stale_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "hit_ratio": round((self.hits + self.stale_hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _start_fetch(self, key, fetcher, cacheable) -> asyncio.Task:
+        """Start a single upstream fetch for key and register it as in flight."""
+
+        async def run():
+            try:
+                value = await fetcher()
+                if cacheable(value):
+                    self.put(key, value)
+                return value
+            finally:
+                self._inflight.pop(key, None)
+
+        task = asyncio.ensure_future(run())
+        self._inflight[key] = task
+        return task
+
+    @staticmethod
+    def _consume_exception(task: asyncio.Task) -> None:
+        """Swallow errors from background refreshes so they are not logged as unhandled."""
+        if not task.cancelled():
+            task.exception()
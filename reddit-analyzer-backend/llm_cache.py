@@ -0,0 +1,207 @@
+"""
+Response cache for OpenAI chat completions.
+
+Many users ask the same few questions ("any outages right now?"). This
+module caches each completion under a key built from the normalized
+conversation sent to the model: user and assistant text is case- and
+whitespace-folded, tool calls are reduced to name and arguments, and tool
+results are reduced to a fingerprint of their exact content. The first
+call of a turn (which picks tools) is therefore shared by every repeat of
+the question, while the second call (which writes the answer) only hits
+while the tool results are unchanged, so answers invalidate as soon as new
+posts change what the tools return. A first call that answers directly,
+without tools, is not tied to any data and is never cached.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from telemetry import get_logger
+
+log = get_logger("llm_cache")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+
+
+def normalize_text(text: str) -> str:
+    """Fold case, whitespace and trailing punctuation so trivially different phrasings match."""
+    return _TRAILING_PUNCTUATION_RE.sub("", _WHITESPACE_RE.sub(" ", text.strip().lower()))
+
+
+def fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ResponseCache:
+    """
+    TTL/LRU cache of assistant messages keyed on the normalized conversation.
+
+    Entries are plain dicts ({"role", "content", "tool_calls"}) so they can
+    be persisted as JSON; to_response and to_stream turn them back into
+    objects shaped like the OpenAI client's results.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 900.0, path: Optional[str] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries: Maximum number of responses held before LRU eviction
+            ttl: Seconds a response is reused
+            path: Optional JSON file the cache is loaded from and saved to
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        # key -> (expires_at wall-clock time, message dict)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_env(cls) -> "ResponseCache":
+        """
+        Build a cache using LLM_CACHE_* environment variables.
+
+        The TTL defaults to POST_STORE_FRESHNESS, the age at which the data
+        behind an answer is considered stale anyway.
+        """
+        return cls(
+            max_entries=int(os.getenv("LLM_CACHE_SIZE", "512")),
+            ttl=float(os.getenv("LLM_CACHE_TTL", os.getenv("POST_STORE_FRESHNESS", "900"))),
+            path=os.getenv("LLM_CACHE_PATH") or None,
+        )
+
+    @staticmethod
+    def key_for(messages: List[Dict[str, Any]], scope: str) -> str:
+        """
+        Cache key of a completion request.
+
+        Args:
+            messages: Conversation as sent to the model, without the system prompt
+            scope: Anything else that changes the answer (model, system prompt, tool schema)
+        """
+        normalized = []
+        for msg in messages:
+            role = msg.get("role")
+            content = msg.get("content") or ""
+            if role == "tool":
+                # Tool call ids differ between runs; results are matched by position
+                normalized.append(["tool", fingerprint(str(content))])
+                continue
+            entry = [role, normalize_text(str(content))]
+            if msg.get("tool_calls"):
+                entry.append([
+                    [call["function"]["name"], call["function"]["arguments"]] for call in msg["tool_calls"]
+                ])
+            normalized.append(entry)
+        return fingerprint(scope + json.dumps(normalized, separators=(",", ":")))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, message = entry
+            if expires_at > time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return message
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, message: Dict[str, Any], grounded: bool = True) -> None:
+        """
+        Cache an assistant message; empty answers are never cached.
+
+        Args:
+            key: Key from key_for
+            message: The assistant message
+            grounded: Whether the conversation already holds tool results. A
+                text answer without them could be about posts that have
+                changed since, so it is only cached when grounded.
+        """
+        if not message.get("content") and not message.get("tool_calls"):
+            return
+        if not grounded and not message.get("tool_calls"):
+            return
+        self._entries[key] = (time.time() + self.ttl, message)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def load(self) -> int:
+        """Load unexpired entries from path, if configured; returns the number loaded."""
+        if not self.path or not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning("llm_cache_unreadable", path=self.path, error=str(e))
+            return 0
+        now = time.time()
+        for key, expires_at, message in entries[-self.max_entries:]:
+            if expires_at > now:
+                self._entries[key] = (expires_at, message)
+        return len(self._entries)
+
+    def save(self) -> None:
+        """Write unexpired entries to path, if configured, replacing the file atomically."""
+        if not self.path:
+            return
+        now = time.time()
+        entries = [[key, expires_at, message] for key, (expires_at, message) in self._entries.items() if expires_at > now]
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+    @staticmethod
+    def to_response(message: Dict[str, Any]) -> SimpleNamespace:
+        """A cached message shaped like a non-streaming ChatCompletion."""
+        tool_calls = [
+            SimpleNamespace(
+                id=call["id"],
+                type="function",
+                function=SimpleNamespace(name=call["function"]["name"], arguments=call["function"]["arguments"]),
+            )
+            for call in message.get("tool_calls") or []
+        ] or None
+        return SimpleNamespace(choices=[SimpleNamespace(
+            message=SimpleNamespace(role="assistant", content=message.get("content"), tool_calls=tool_calls)
+        )])
+
+    @staticmethod
+    async def to_stream(message: Dict[str, Any]) -> AsyncIterator[SimpleNamespace]:
+        """A cached message shaped like a streaming ChatCompletion with a single chunk."""
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=message.get("content")))])
+
+    async def record_stream(self, key: str, stream: AsyncIterator[Any], grounded: bool = True) -> AsyncIterator[Any]:
+        """Pass a completion stream through, caching its text (see put) once it has been read to the end."""
+        parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                parts.append(delta)
+            yield chunk
+        self.put(key, {"role": "assistant", "content": "".join(parts)}, grounded)
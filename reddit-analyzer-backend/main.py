@@ -1,23 +1,74 @@
 import asyncio
 import json
 import os
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, JSONResponse
-from openai import AsyncOpenAI
-from typing import Dict, Any, List, Optional
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from openai import AsyncOpenAI, RateLimitError
+from typing import Dict, Any, AsyncIterator, Callable, List, Optional, Tuple
 from dotenv import load_dotenv
 from reddit_tools import RedditAnalyzer
+from context_packer import estimate_tokens
+from reddit_transport import RedditTransport
+from listing_cache import ListingCache
+from post_store import PostStore
+from ingester import RedditIngester
+from trend_index import TrendIndex, GRANULARITIES
+from spike_detector import AlertBroadcaster, SpikeDetector
+from geo import region_keys
+from comment_threads import CommentCache, format_threads
+from subreddit_fanout import SubredditFanout, format_fanout
+from llm_cache import ResponseCache, fingerprint, normalize_text
+from intent_router import IntentRouter
+from session_store import Session, SessionStore
+from openai_scheduler import AdaptiveScheduler, SchedulerOverloaded
+from snapshot import ReplayTransport, SnapshotManager
+from telemetry import REGISTRY, RequestTelemetryMiddleware, configure_logging, get_logger, span
+import logging
+import random
 import time
 
 # Load environment variables
 load_dotenv()
+configure_logging()
+log = get_logger("main")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the shared Reddit connection pool, warm caches from the snapshot and start ingestion on startup; tear down on shutdown"""
+    await reddit_transport.start()
+    response_cache.load()
+    # Pre-warm the store and listing cache from the last snapshot before anything reads them
+    if snapshot_manager:
+        await snapshot_manager.warm()
+        snapshot_manager.start()
+    # Rebuild the in-memory trend buckets from posts already on disk, one page at a time,
+    # and train spike baselines on the last two days so alerts work right after a restart
+    day_width, day_buckets = GRANULARITIES["day"]
+    spike_since = time.time() - 2 * 86400
+    async for page in post_store.iter_posts_since(reddit_analyzer.subreddit, time.time() - day_width * day_buckets):
+        trend_index.add_posts(page)
+        spike_detector.consume(post for post in page if post.created_utc >= spike_since)
+    if INGEST_ENABLED:
+        ingester.start()
+    try:
+        yield
+    finally:
+        await ingester.stop()
+        if snapshot_manager:
+            await snapshot_manager.stop()
+        response_cache.save()
+        await reddit_transport.close()
+        post_store.close()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="AG-UI Reddit Analyzer",
     description="AG-UI compatible agent for analyzing r/Comcast_Xfinity",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Setup CORS - Allow all origins for development
@@ -28,13 +79,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Request ids, per-request stage traces and HTTP latency metrics
+app.add_middleware(RequestTelemetryMiddleware)
 
 # Initialize OpenAI client
 openai_api_key = os.getenv("OPENAI_API_KEY", "dummy_key_for_testing")
-client = AsyncOpenAI(api_key=openai_api_key)
+# Client-side retries would hide 429s from the scheduler and add load during a burst;
+# overloaded requests get a 503 with Retry-After instead
+client = AsyncOpenAI(api_key=openai_api_key, max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "0")))
+
+# Admission control in front of the client: adaptive concurrency limit, bounded queue, deadlines
+openai_scheduler = AdaptiveScheduler.from_env()
+OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "60"))
+OPENAI_CALLS = REGISTRY.counter(
+    "reddit_analyzer_openai_calls_total",
+    "Chat completion requests by outcome (ok, cached, shed, rate_limited, timeout, error)",
+    ["outcome"]
+)
+
+# Initialize the shared Reddit transport and analyzer
+# REDDIT_REPLAY_SNAPSHOT serves Reddit requests from a snapshot instead, for offline, reproducible runs
+REPLAY_SNAPSHOT = os.getenv("REDDIT_REPLAY_SNAPSHOT")
+reddit_transport = ReplayTransport(REPLAY_SNAPSHOT) if REPLAY_SNAPSHOT else RedditTransport.from_env()
+listing_cache = ListingCache.from_env()
+post_store = PostStore.from_env()
+comment_cache = CommentCache.from_env()
+reddit_analyzer = RedditAnalyzer(
+    transport=reddit_transport,
+    cache=listing_cache,
+    store=post_store,
+    store_freshness=float(os.getenv("POST_STORE_FRESHNESS", "900")),
+    comment_cache=comment_cache,
+    comment_concurrency=int(os.getenv("COMMENT_FETCH_CONCURRENCY", "4"))
+)
+# Other subreddits share the transport and listing cache under one request budget
+subreddit_fanout = SubredditFanout.from_env(reddit_analyzer)
+
+# Trend buckets maintained from every batch of posts written to the store
+trend_index = TrendIndex.from_env()
+post_store.add_listener(trend_index.add_posts)
+
+# Spike alerts on newly ingested posts, pushed to clients on /alerts/stream
+alert_broadcaster = AlertBroadcaster()
+spike_detector = SpikeDetector(
+    key_extractor=lambda post: trend_index.topics_of(post) | region_keys(post),
+    publish=alert_broadcaster.publish,
+    z_threshold=float(os.getenv("SPIKE_Z_THRESHOLD", "4")),
+    min_count=int(os.getenv("SPIKE_MIN_POSTS", "5"))
+)
+post_store.add_listener(spike_detector.consume)
+
+# Periodic snapshot of stored posts and cached listings, loaded at startup to warm the caches
+snapshot_manager = SnapshotManager.from_env(reddit_analyzer.subreddit, listing_cache, post_store)
+if snapshot_manager:
+    post_store.add_listener(snapshot_manager.on_posts)
 
-# Initialize Reddit analyzer
-reddit_analyzer = RedditAnalyzer()
+# Background ingestion of new posts into the local store
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "true").lower() == "true"
+ingester = RedditIngester.from_env(reddit_analyzer, post_store)
 
 # AG-UI Tools Configuration
 TOOLS = [
@@ -86,8 +188,174 @@ TOOLS = [
                 "required": ["query"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "aggregate_issue_stats",
+            "description": "Count r/Comcast_Xfinity posts per issue category (billing, outages, speed, equipment, customer_service) over a time window, with shares, score-weighted shares and example post ids. Prefer this over fetching posts for questions like 'what are people complaining about this week'.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "window_hours": {
+                        "type": "integer",
+                        "description": "How many hours back to aggregate (1-720)",
+                        "minimum": 1,
+                        "maximum": 720,
+                        "default": 168
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "Optional keywords to restrict the posts aggregated (e.g., 'Denver')"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_trends",
+            "description": "Get hourly or daily post/comment/score counts for an issue category or tracked keyword from a precomputed index, with a verdict on whether it is increasing. Use this for 'is X getting worse' or trend questions.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "topic": {
+                        "type": "string",
+                        "description": "'all', an issue category (billing, outages, speed, equipment, customer_service) or a tracked keyword (e.g., 'outage', 'refund', 'data cap')",
+                        "default": "all"
+                    },
+                    "granularity": {
+                        "type": "string",
+                        "enum": ["hour", "day"],
+                        "description": "Bucket size",
+                        "default": "day"
+                    },
+                    "periods": {
+                        "type": "integer",
+                        "description": "Number of most recent buckets to return (2-90)",
+                        "minimum": 2,
+                        "maximum": 90,
+                        "default": 14
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "geographic_breakdown",
+            "description": "Count r/Comcast_Xfinity posts per Comcast region (Northeast, Central, West), US state or city mentioned in them over a time window, with example post ids. Use this for 'where are outages happening' or other geographic questions instead of reading posts.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "level": {
+                        "type": "string",
+                        "enum": ["region", "state", "city"],
+                        "description": "Granularity of the breakdown",
+                        "default": "state"
+                    },
+                    "window_hours": {
+                        "type": "integer",
+                        "description": "How many hours back to count (1-720)",
+                        "minimum": 1,
+                        "maximum": 720,
+                        "default": 168
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "Optional keywords to restrict the posts counted (e.g., 'outage')"
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "fetch_comments",
+            "description": "Get the top-voted comments and the original poster's replies for r/Comcast_Xfinity posts. Pass post ids or post URLs from earlier results, or a query to read the most-discussed matching posts. Use this to find solutions and workarounds suggested in comments.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "post_ids": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Post ids or post URLs"
+                    },
+                    "query": {
+                        "type": "string",
+                        "description": "Search terms used when no post ids are given (e.g., 'xb8 keeps rebooting')"
+                    },
+                    "max_posts": {
+                        "type": "integer",
+                        "description": "Number of threads to read (1-10)",
+                        "minimum": 1,
+                        "maximum": 10,
+                        "default": 5
+                    }
+                }
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_multiple_subreddits",
+            "description": "Search or list posts across several subreddits at once (by default r/Comcast_Xfinity, r/Xfinity, r/comcast and competitor subreddits such as r/Spectrum, r/ATT and r/verizon) and merge them by score or recency. Use this to compare Comcast with other providers or to widen a search beyond r/Comcast_Xfinity.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "Search terms; omit to use each subreddit's top or new listing"
+                    },
+                    "subreddits": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Subreddit names without 'r/' (at most 8); omit for the default set"
+                    },
+                    "sort": {
+                        "type": "string",
+                        "enum": ["top", "new"],
+                        "description": "Merge posts by score (top) or recency (new)",
+                        "default": "top"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "Number of merged posts to return (1-50)",
+                        "minimum": 1,
+                        "maximum": 50,
+                        "default": 30
+                    }
+                }
+            }
+        }
     }
 ]
+TOOL_NAMES = {tool["function"]["name"] for tool in TOOLS}
+
+# Bound on concurrently running tool calls per turn and per-call timeout in seconds
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+
+# Tools whose formatted result depends on the user's question as well as the arguments
+QUESTION_SCOPED_TOOLS = {"fetch_recent_posts", "search_multiple_subreddits"}
+
+# Batch analysis: most questions per request and questions answered at once
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+# Prompt-token budgeting for tool results: the model's context window, tokens kept
+# free for the answer, and the per-turn cap shared by all tool results
+MODEL_CONTEXT_TOKENS = 16385
+RESPONSE_TOKEN_RESERVE = 1000
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "2000"))
+MIN_TOOL_RESULT_TOKENS = 200
+
+# Seconds between keepalive comments on an idle /alerts/stream connection
+ALERT_KEEPALIVE_SECONDS = 15
 
 SYSTEM_PROMPT = """You are a Reddit analyzer focused on r/Comcast_Xfinity. Help users understand customer sentiment, common issues, and solutions discussed in the subreddit.
 
@@ -99,46 +367,55 @@ When analyzing posts:
 5. Always provide context about when posts were made
 6. Be helpful and provide actionable insights based on the Reddit data
 
-You have access to tools to fetch recent posts and search for specific topics. Use these tools to provide accurate, up-to-date information about what Comcast Xfinity customers are discussing."""
+You have access to tools to fetch recent posts, search for specific topics, get aggregate issue-category statistics, read precomputed trends, break posts down by region, state or city, read the top comments of posts, and search several subreddits at once to compare Comcast with other providers. For questions about how common issues are, whether they are increasing, or where they are happening, use the aggregate statistics, trends or geographic breakdown tools instead of reading many posts. Use these tools to provide accurate, up-to-date information about what Comcast Xfinity customers are discussing."""
+
+OPENAI_MODEL = "gpt-3.5-turbo"
+
+# Cached completions are only valid for the model, prompt and tools they were made with
+LLM_CACHE_SCOPE = fingerprint(OPENAI_MODEL + SYSTEM_PROMPT + json.dumps(TOOLS, sort_keys=True))
+response_cache = ResponseCache.from_env()
+
+# Common requests ("latest posts", "search for X") skip the model's tool-choice round trip
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+intent_router = IntentRouter.from_env()
+
+# Server-side conversation history, so clients send only their new message
+session_store = SessionStore.from_env()
 
 # Helper function to validate messages before sending to OpenAI
 def validate_messages(messages):
     """Ensure all messages have valid content and structure"""
     valid_messages = []
     
-    print(f"VALIDATING MESSAGES: Received {len(messages)} messages to validate")
     for i, msg in enumerate(messages):
-        # Debug log each message
-        print(f"  Validating message [{i}]: {json.dumps(msg)}")
-        
         # Make sure role exists
         if "role" not in msg:
-            print(f"  WARNING: Message [{i}] missing role, skipping: {msg}")
+            log.warning("message_missing_role", index=i)
             continue
             
         # Handle null content
         if "content" not in msg or msg["content"] is None:
-            print(f"  WARNING: Message [{i}] has null content, setting to empty string: {msg}")
             msg = msg.copy()  # Create a copy to avoid modifying the original
             msg["content"] = ""  # Replace null with empty string
         
         # Special handling for assistant messages with tool_calls
         if msg.get("role") == "assistant" and "tool_calls" in msg and not msg.get("content"):
-            print(f"  WARNING: Assistant message with tool_calls has empty content, setting default: {msg}")
             msg = msg.copy()
             msg["content"] = ""
             
         valid_messages.append(msg)
     
-    print(f"VALIDATION COMPLETE: {len(valid_messages)} valid messages for OpenAI API")
-    # Log all validated messages for debugging
-    for i, msg in enumerate(valid_messages):
-        print(f"  Final message [{i}]: role={msg.get('role')}, content_type={type(msg.get('content'))}, content_length={len(str(msg.get('content') or ''))}")
-    
+    if log.enabled(logging.DEBUG):
+        log.debug(
+            "messages_validated",
+            received=len(messages),
+            valid=len(valid_messages),
+            content_chars=sum(len(str(msg.get("content") or "")) for msg in valid_messages)
+        )
     return valid_messages
 
-async def call_openai_with_tools(messages: List[Dict]) -> Dict:
-    """Call OpenAI API with function calling support"""
+async def call_openai_with_tools(messages: List[Dict], stream: bool = False) -> Dict:
+    """Call OpenAI API with function calling support (streams chunks when stream=True)"""
     try:
         # Validate messages before sending to OpenAI
         validated_messages = validate_messages(messages)
@@ -146,74 +423,552 @@ async def call_openai_with_tools(messages: List[Dict]) -> Dict:
         # Final safety check before API call
         for i, msg in enumerate(validated_messages):
             if msg.get("content") is None:
-                print(f"CRITICAL ERROR: Message {i} still has null content after validation")
+                log.error("message_null_content_after_validation", index=i)
                 # Force to empty string as last resort
                 msg["content"] = ""
         
+        # Repeat questions with unchanged tool results are answered from the cache
+        cache_key = response_cache.key_for(validated_messages, LLM_CACHE_SCOPE)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            OPENAI_CALLS.inc(outcome="cached")
+            log.debug("openai_cache_hit", cache_key=cache_key)
+            return response_cache.to_stream(cached) if stream else response_cache.to_response(cached)
+        
         system_message = {"role": "system", "content": SYSTEM_PROMPT}
         final_messages = [system_message] + validated_messages
         
-        print(f"Sending {len(final_messages)} messages to OpenAI API")
-        response = await client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=final_messages,
-            tools=TOOLS,
-            tool_choice="auto"
-        )
+        log.debug("openai_request", messages=len(final_messages), stream=stream)
+        response = await scheduled_completion(final_messages, stream)
+        # Answers given without tool results can't be invalidated by new posts, so only cache grounded ones
+        grounded = any(msg.get("role") == "tool" for msg in validated_messages)
+        if stream:
+            return response_cache.record_stream(cache_key, response, grounded)
+        response_cache.put(cache_key, build_assistant_message(response.choices[0].message), grounded)
         return response
+    except SchedulerOverloaded:
+        raise
     except Exception as e:
-        print(f"OpenAI API error: {str(e)}")
-        # For debugging, print the full message array
-        print("Message array that caused the error:")
-        for i, msg in enumerate(messages):
-            content_type = type(msg.get("content"))
-            content_preview = str(msg.get("content", ""))[:50] + "..." if msg.get("content") else "None"
-            print(f"  Message {i}: role={msg.get('role')}, content_type={content_type}, content_preview={content_preview}")
-        
+        OPENAI_CALLS.inc(outcome="error")
+        log.error("openai_error", error=str(e), messages=len(messages), roles=[msg.get("role") for msg in messages])
         raise HTTPException(status_code=500, detail=f"OpenAI API error: {str(e)}")
 
+async def scheduled_completion(final_messages: List[Dict], stream: bool):
+    """
+    Create a chat completion under the OpenAI scheduler.
+    
+    The call waits for a slot, must finish within OPENAI_DEADLINE seconds,
+    and reports its latency or 429 back to the scheduler. A 429 cuts the
+    concurrency limit and sends the call back through the queue, so it is
+    only shed if it cannot get through before its deadline. Streams hold
+    their slot until they have been read to the end (or closed).
+    
+    Raises:
+        SchedulerOverloaded: If the call was shed or ran past its deadline
+    """
+    deadline = time.monotonic() + OPENAI_DEADLINE
+    while True:
+        try:
+            with span("openai_queue"):
+                await openai_scheduler.acquire(deadline)
+        except SchedulerOverloaded:
+            OPENAI_CALLS.inc(outcome="shed")
+            raise
+        started = time.monotonic()
+        try:
+            with span("openai_call", stream=stream):
+                response = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=OPENAI_MODEL,
+                        messages=final_messages,
+                        tools=TOOLS,
+                        tool_choice="auto",
+                        stream=stream
+                    ),
+                    timeout=max(deadline - started, 0.0)
+                )
+        except RateLimitError as e:
+            OPENAI_CALLS.inc(outcome="rate_limited")
+            openai_scheduler.record_overload()
+            openai_scheduler.release()
+            retry_after = e.response.headers.get("retry-after") if e.response is not None else None
+            try:
+                retry_after = float(retry_after)
+            except (TypeError, ValueError):
+                retry_after = None
+            if retry_after is not None and time.monotonic() + retry_after > deadline:
+                # e.g. an exhausted quota: no point queueing past the deadline
+                raise SchedulerOverloaded("OpenAI rate limit reached", retry_after) from e
+            # The reduced limit holds the retry back until the provider has room; the jitter
+            # keeps calls rejected together from all coming back at once
+            await asyncio.sleep(random.uniform(0, openai_scheduler.avg_latency or 0))
+            continue
+        except asyncio.TimeoutError:
+            OPENAI_CALLS.inc(outcome="timeout")
+            openai_scheduler.record_latency(time.monotonic() - started)
+            openai_scheduler.release()
+            raise SchedulerOverloaded("OpenAI did not respond before the request deadline", openai_scheduler.retry_after())
+        except BaseException:
+            openai_scheduler.release()
+            raise
+        break
+    
+    OPENAI_CALLS.inc(outcome="ok")
+    openai_scheduler.record_latency(time.monotonic() - started)
+    if not stream:
+        openai_scheduler.release()
+        return response
+    return release_after_stream(response)
+
+async def release_after_stream(stream: AsyncIterator[Any]) -> AsyncIterator[Any]:
+    """Pass a completion stream through, freeing its scheduler slot when it ends"""
+    try:
+        with span("openai_stream"):
+            async for chunk in stream:
+                yield chunk
+    finally:
+        openai_scheduler.release()
+
+def overloaded_response(e: SchedulerOverloaded) -> JSONResponse:
+    """Fast 503 for shed requests, with a Retry-After hint"""
+    return JSONResponse(
+        content={"error": "Service overloaded", "details": str(e), "retry_after": e.retry_after},
+        status_code=503,
+        headers={"Retry-After": str(int(e.retry_after))}
+    )
+
 # Modify the tool execution part to handle any message conversion issues
-async def execute_tool_call(tool_call) -> str:
-    """Execute a tool call and return the result"""
+async def execute_tool_call(tool_call, user_query: Optional[str] = None, token_budget: int = TOOL_RESULT_TOKEN_BUDGET) -> str:
+    """Execute a tool call and return the result, packed into token_budget prompt tokens"""
     function_name = tool_call.function.name
     function_args = json.loads(tool_call.function.arguments)
     
-    print(f"Executing tool call: {function_name} with args: {function_args}")
+    log.debug("tool_call", tool=function_name, arguments=function_args)
     
     try:
-        result = None
-        if function_name == "fetch_recent_posts":
-            posts = await reddit_analyzer.fetch_recent_posts(
-                timeframe=function_args.get("timeframe", "hot"),
-                limit=function_args.get("limit", 25)
-            )
-            result = reddit_analyzer.format_posts_for_analysis(posts)
-        
-        elif function_name == "search_subreddit":
-            posts = await reddit_analyzer.search_subreddit(
-                query=function_args["query"],
-                limit=function_args.get("limit", 20)
-            )
-            result = reddit_analyzer.format_posts_for_analysis(posts)
-        
-        else:
-            result = f"Unknown function: {function_name}"
+        # Tool names come from the model; unknown ones share a stage to bound metric labels
+        stage = f"tool.{function_name}" if function_name in TOOL_NAMES else "tool.unknown"
+        with span(stage):
+            result = await run_tool(function_name, function_args, user_query, token_budget)
         
         # Ensure result is never None or non-string
         if result is None:
-            print(f"WARNING: Tool call {function_name} returned None result")
+            log.warning("tool_result_none", tool=function_name)
             return "No results available"
         
         # Ensure result is a string
         if not isinstance(result, str):
-            print(f"WARNING: Tool call {function_name} returned non-string result: {type(result)}")
+            log.warning("tool_result_not_string", tool=function_name, result_type=type(result).__name__)
             return str(result)
             
         return result
     except Exception as e:
-        print(f"Error executing tool call {function_name}: {str(e)}")
+        log.exception("tool_call_failed", tool=function_name, error=str(e))
         return f"Error executing {function_name}: {str(e)}. Please try again with different parameters or contact support if the issue persists."
 
+async def run_tool(function_name: str, function_args: Dict, user_query: Optional[str], token_budget: int) -> Any:
+    """Dispatch one tool call; formatting of each result is timed as its own span"""
+    if function_name == "fetch_recent_posts":
+        posts = await reddit_analyzer.fetch_recent_posts(
+            timeframe=function_args.get("timeframe", "hot"),
+            limit=function_args.get("limit", 25)
+        )
+        with span("format"):
+            return reddit_analyzer.format_posts_for_analysis(posts, query=user_query, token_budget=token_budget)
+    
+    elif function_name == "search_subreddit":
+        posts = await reddit_analyzer.search_subreddit(
+            query=function_args["query"],
+            limit=function_args.get("limit", 20)
+        )
+        with span("format"):
+            return reddit_analyzer.format_posts_for_analysis(
+                posts, query=function_args["query"], token_budget=token_budget
+            )
+    
+    elif function_name == "get_trends":
+        trend = trend_index.trend(
+            topic=function_args.get("topic", "all"),
+            granularity=function_args.get("granularity", "day"),
+            periods=function_args.get("periods", 14)
+        )
+        return json.dumps(trend, separators=(",", ":"))
+    
+    elif function_name == "aggregate_issue_stats":
+        stats = await reddit_analyzer.issue_stats(
+            window_hours=function_args.get("window_hours", 168),
+            query=function_args.get("query")
+        )
+        return json.dumps(stats, separators=(",", ":"))
+    
+    elif function_name == "geographic_breakdown":
+        breakdown = await reddit_analyzer.geographic_breakdown(
+            window_hours=function_args.get("window_hours", 168),
+            query=function_args.get("query"),
+            level=function_args.get("level", "state")
+        )
+        return json.dumps(breakdown, separators=(",", ":"))
+    
+    elif function_name == "fetch_comments":
+        threads = await reddit_analyzer.fetch_comments(
+            post_ids=function_args.get("post_ids"),
+            query=function_args.get("query"),
+            max_posts=min(int(function_args.get("max_posts", 5)), 10)
+        )
+        if reddit_analyzer.is_error(threads):
+            return threads[0]["error"]
+        with span("format"):
+            return format_threads(threads, token_budget)
+    
+    elif function_name == "search_multiple_subreddits":
+        fanout = await subreddit_fanout.search(
+            subreddits=function_args.get("subreddits"),
+            query=function_args.get("query"),
+            sort=function_args.get("sort", "top"),
+            limit=min(int(function_args.get("limit", 30)), 50)
+        )
+        with span("format"):
+            return format_fanout(fanout, function_args.get("query") or user_query, token_budget)
+    
+    return f"Unknown function: {function_name}"
+
+async def plan_response(messages: List[Dict]):
+    """
+    First assistant message of a turn: a tool call chosen by the local intent
+    router when it is confident, otherwise OpenAI's reply (tool calls or a direct answer)
+    """
+    user_text = latest_user_text(messages)
+    if INTENT_ROUTER_ENABLED and user_text is not None and messages[-1].get("role") == "user":
+        has_history = any(msg.get("role") == "assistant" for msg in messages)
+        intent = intent_router.route(user_text, has_history=has_history)
+        if intent is not None:
+            log.debug("intent_routed", tool=intent.tool, arguments=intent.arguments, confidence=intent.confidence)
+            tool_call = SimpleNamespace(
+                id=f"call_router_{int(time.time() * 1000)}",
+                type="function",
+                function=SimpleNamespace(name=intent.tool, arguments=json.dumps(intent.arguments))
+            )
+            return SimpleNamespace(role="assistant", content=None, tool_calls=[tool_call])
+    
+    response = await call_openai_with_tools(messages)
+    return response.choices[0].message
+
+def tool_result_budget(messages: List[Dict], tool_call_count: int) -> int:
+    """Split the prompt tokens the conversation leaves free across this turn's tool results"""
+    used = estimate_tokens(SYSTEM_PROMPT) + sum(estimate_tokens(str(msg.get("content") or "")) for msg in messages)
+    available = MODEL_CONTEXT_TOKENS - RESPONSE_TOKEN_RESERVE - used
+    budget = min(TOOL_RESULT_TOKEN_BUDGET, available) // max(1, tool_call_count)
+    return max(MIN_TOOL_RESULT_TOKENS, budget)
+
+def latest_user_text(messages: List[Dict]) -> Optional[str]:
+    """Content of the most recent user message, used to rank posts by relevance"""
+    for msg in reversed(messages):
+        if msg.get("role") == "user" and isinstance(msg.get("content"), str):
+            return msg["content"]
+    return None
+
+def shared_tool_key(tool_call, user_query: Optional[str], token_budget: int) -> str:
+    """Identity of a tool call's result: tool, arguments, budget and, for question-scoped tools, the question"""
+    name = tool_call.function.name
+    try:
+        arguments = json.dumps(json.loads(tool_call.function.arguments), sort_keys=True)
+    except ValueError:
+        arguments = tool_call.function.arguments
+    scope = user_query if name in QUESTION_SCOPED_TOOLS else None
+    return json.dumps([name, arguments, token_budget, scope])
+
+async def execute_tool_calls(
+    tool_calls,
+    messages: List[Dict],
+    on_event: Optional[Callable[[str, Any], None]] = None,
+    shared_results: Optional[Dict[str, asyncio.Future]] = None
+) -> List[Dict]:
+    """
+    Execute tool calls concurrently and return tool messages in call order.
+    
+    messages is the conversation so far; it sets each call's token budget and
+    the query posts are ranked against. on_event, if given, is called with
+    ("TOOL_CALL_START" | "TOOL_CALL_END", tool_call) as each call starts and finishes.
+    shared_results, if given, lets several turns (the questions of a batch)
+    run each identical tool call once and share its result.
+    """
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+    token_budget = tool_result_budget(messages, len(tool_calls))
+    user_query = latest_user_text(messages)
+    
+    def start(tool_call) -> Any:
+        if shared_results is None:
+            return execute_tool_call(tool_call, user_query=user_query, token_budget=token_budget)
+        key = shared_tool_key(tool_call, user_query, token_budget)
+        task = shared_results.get(key)
+        if task is None:
+            task = shared_results[key] = asyncio.ensure_future(
+                execute_tool_call(tool_call, user_query=user_query, token_budget=token_budget)
+            )
+        # A timeout in one question must not cancel the call other questions are waiting on
+        return asyncio.shield(task)
+    
+    async def run(tool_call) -> Dict:
+        async with semaphore:
+            if on_event:
+                on_event("TOOL_CALL_START", tool_call)
+            try:
+                result = await asyncio.wait_for(start(tool_call), timeout=TOOL_TIMEOUT)
+            except asyncio.TimeoutError:
+                log.warning("tool_call_timeout", tool=tool_call.function.name, timeout=TOOL_TIMEOUT)
+                result = f"Error executing {tool_call.function.name}: timed out after {TOOL_TIMEOUT:g} seconds. Please try again with different parameters."
+            if on_event:
+                on_event("TOOL_CALL_END", tool_call)
+        
+        # Ensure result is not None and is a string
+        if result is None:
+            log.warning("tool_result_none", tool=tool_call.function.name)
+            result = "No results available"
+        
+        # Create tool message with guaranteed string content
+        tool_message = {
+            "tool_call_id": tool_call.id,
+            "role": "tool",
+            "content": str(result)  # Force to string
+        }
+        log.debug("tool_result", tool=tool_call.function.name, chars=len(tool_message["content"]))
+        return tool_message
+    
+    # gather preserves input order, so results line up with the assistant's tool_calls
+    return list(await asyncio.gather(*(run(tool_call) for tool_call in tool_calls)))
+
+def build_assistant_message(message) -> Dict:
+    """Convert an OpenAI assistant message (with any tool_calls) into a plain dict"""
+    assistant_message = {"role": message.role, "content": message.content or ""}
+    
+    # Make sure the assistant message has tool_calls property from the API response
+    if hasattr(message, 'tool_calls') and message.tool_calls:
+        # Convert tool_calls object to dict for JSON serialization
+        assistant_message["tool_calls"] = [
+            {
+                "id": tc.id,
+                "type": "function",
+                "function": {
+                    "name": tc.function.name,
+                    "arguments": tc.function.arguments
+                }
+            }
+            for tc in message.tool_calls
+        ]
+    return assistant_message
+
+def wants_stream(request: Request, body: Dict) -> bool:
+    """Client asked for SSE either with "stream": true or an event-stream Accept header"""
+    return body.get("stream") is True or "text/event-stream" in request.headers.get("accept", "")
+
+def sse_event(event_type: str, **fields) -> str:
+    """Encode an AG-UI event as a Server-Sent Events frame"""
+    return f"data: {json.dumps({'type': event_type, **fields})}\n\n"
+
+async def stream_agent_response(
+    messages: List[Dict],
+    on_finish: Optional[Callable[[List[Dict]], None]] = None,
+    session_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Run the agent loop and yield AG-UI events as Server-Sent Events.
+    
+    Tool start/end events are emitted as each tool call runs, then the final
+    completion is streamed token by token as TEXT_MESSAGE_CONTENT deltas.
+    on_finish, if given, receives the messages this turn added to the
+    conversation once the run finishes successfully.
+    """
+    run_id = f"run_{int(time.time() * 1000)}"
+    message_id = "msg_" + str(int(time.time()))
+    tool_task = None
+    if session_id:
+        yield sse_event("RUN_STARTED", runId=run_id, sessionId=session_id)
+    else:
+        yield sse_event("RUN_STARTED", runId=run_id)
+    
+    try:
+        message = await plan_response(messages)
+        
+        if message.tool_calls:
+            events: asyncio.Queue = asyncio.Queue()
+            
+            def on_event(event_type: str, tool_call) -> None:
+                fields = {"toolCallId": tool_call.id}
+                if event_type == "TOOL_CALL_START":
+                    fields["toolCallName"] = tool_call.function.name
+                events.put_nowait(sse_event(event_type, **fields))
+            
+            async def run_tools() -> List[Dict]:
+                try:
+                    return await execute_tool_calls(message.tool_calls, messages, on_event=on_event)
+                finally:
+                    events.put_nowait(None)
+            
+            # Forward tool events while the calls run, until run_tools signals completion
+            tool_task = asyncio.ensure_future(run_tools())
+            while (frame := await events.get()) is not None:
+                yield frame
+            tool_messages = await tool_task
+            
+            turn_messages = [build_assistant_message(message)] + tool_messages
+            yield sse_event("TEXT_MESSAGE_START", messageId=message_id, role="assistant")
+            # No yield between getting the stream and reading it, so its scheduler slot is always released
+            stream = await call_openai_with_tools(validate_messages(messages + turn_messages), stream=True)
+            
+            parts = []
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield sse_event("TEXT_MESSAGE_CONTENT", messageId=message_id, delta=delta)
+            yield sse_event("TEXT_MESSAGE_END", messageId=message_id)
+            turn_messages.append({"role": "assistant", "content": "".join(parts)})
+        else:
+            yield sse_event("TEXT_MESSAGE_START", messageId=message_id, role="assistant")
+            if message.content:
+                yield sse_event("TEXT_MESSAGE_CONTENT", messageId=message_id, delta=message.content)
+            yield sse_event("TEXT_MESSAGE_END", messageId=message_id)
+            turn_messages = [{"role": "assistant", "content": message.content or ""}]
+        
+        if on_finish:
+            on_finish(turn_messages)
+        yield sse_event("RUN_FINISHED", runId=run_id)
+    except SchedulerOverloaded as e:
+        log.warning("request_shed", error=str(e), retry_after=e.retry_after, stream=True)
+        yield sse_event("RUN_ERROR", runId=run_id, message=str(e), code="overloaded", retryAfter=e.retry_after)
+    except Exception as e:
+        log.exception("stream_failed", error=str(e))
+        detail = e.detail if isinstance(e, HTTPException) else str(e)
+        yield sse_event("RUN_ERROR", runId=run_id, message=detail)
+    finally:
+        # Client disconnected mid-run: don't leave tool calls running
+        if tool_task is not None and not tool_task.done():
+            tool_task.cancel()
+
+class SessionStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that frees its session however the response ends.
+    
+    The event generator's own finally never runs if the response is
+    cancelled before the generator starts (e.g. the client disconnects at
+    once), which would leave the session busy until it expires.
+    """
+    
+    def __init__(self, content: AsyncIterator[str], session: Session, **kwargs):
+        super().__init__(content, **kwargs)
+        self.session = session
+    
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.session.busy = False
+
+def sse_response(messages: List[Dict], session: Optional[Session] = None) -> StreamingResponse:
+    """Wrap the streaming agent loop in an SSE StreamingResponse, recording the turn in session if given"""
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if session is None:
+        return StreamingResponse(stream_agent_response(messages), media_type="text/event-stream", headers=headers)
+    return SessionStreamingResponse(
+        session_events(session, messages), session, media_type="text/event-stream", headers=headers
+    )
+
+async def run_agent_turn(
+    messages: List[Dict],
+    shared_results: Optional[Dict[str, asyncio.Future]] = None
+) -> Tuple[Optional[str], List[Dict]]:
+    """Run one non-streaming agent turn; returns the answer and the messages the turn added"""
+    message = await plan_response(messages)
+    if not message.tool_calls:
+        return message.content, [{"role": "assistant", "content": message.content or ""}]
+    
+    tool_messages = await execute_tool_calls(message.tool_calls, messages, shared_results=shared_results)
+    turn_messages = [build_assistant_message(message)] + tool_messages
+    final_response = await call_openai_with_tools(validate_messages(messages + turn_messages))
+    final_message = final_response.choices[0].message.content
+    return final_message, turn_messages + [{"role": "assistant", "content": final_message or ""}]
+
+async def run_batch(questions: List[str], concurrency: int) -> Dict[str, Any]:
+    """
+    Answer many independent questions together.
+    
+    Repeated questions are answered once. Up to concurrency questions run
+    at a time. Identical tool calls from different questions are run once
+    and share their result, and the listing cache coalesces the remaining
+    fetches, so each distinct listing is fetched once per batch. A
+    question that fails or is shed reports its own error; the others are
+    unaffected.
+    """
+    distinct = list(dict.fromkeys(normalize_text(question) for question in questions))
+    first_asked = {}
+    for question in questions:
+        first_asked.setdefault(normalize_text(question), question)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    shared_results: Dict[str, asyncio.Future] = {}
+    tool_calls = 0
+    
+    async def answer(key: str) -> Dict[str, Any]:
+        nonlocal tool_calls
+        async with semaphore:
+            try:
+                final_message, turn_messages = await run_agent_turn(
+                    [{"role": "user", "content": first_asked[key]}], shared_results=shared_results
+                )
+            except SchedulerOverloaded as e:
+                return {"error": str(e), "retry_after": e.retry_after}
+            except Exception as e:
+                log.exception("batch_question_failed", error=str(e))
+                detail = e.detail if isinstance(e, HTTPException) else str(e)
+                return {"error": detail}
+        tool_calls += sum(1 for msg in turn_messages if msg.get("role") == "tool")
+        return {"message": final_message}
+    
+    answers = dict(zip(distinct, await asyncio.gather(*(answer(key) for key in distinct))))
+    return {
+        "type": "batch",
+        "results": [{"question": question, **answers[normalize_text(question)]} for question in questions],
+        "stats": {
+            "questions": len(questions),
+            "distinct_questions": len(distinct),
+            "tool_calls": tool_calls,
+            "tool_executions": len(shared_results)
+        }
+    }
+
+async def session_events(session: Session, messages: List[Dict]) -> AsyncIterator[str]:
+    """Stream a session turn, storing it when it finishes and releasing the session either way"""
+    def on_finish(turn_messages: List[Dict]) -> None:
+        session_store.record_turn(session, messages[-1], turn_messages)
+    
+    try:
+        async for frame in stream_agent_response(messages, on_finish=on_finish, session_id=session.id):
+            yield frame
+    finally:
+        session.busy = False
+
+def begin_session_turn(body: Dict) -> Any:
+    """
+    Load the session named by body["session_id"] and append the new user message.
+    
+    Returns (session, messages to send) or a JSONResponse error.
+    """
+    session = session_store.get(str(body["session_id"]))
+    if session is None:
+        return JSONResponse(content={"error": "Unknown or expired session"}, status_code=404)
+    if session.busy:
+        return JSONResponse(content={"error": "A turn is already running for this session"}, status_code=409)
+    
+    text = body.get("message")
+    if not text and body.get("messages"):
+        # Tolerate clients that still send a messages array: only its last user message is new
+        text = latest_user_text(body["messages"])
+    if not isinstance(text, str) or not text.strip():
+        return JSONResponse(content={"error": "No message provided"}, status_code=400)
+    
+    session.busy = True
+    return session, session.messages + [{"role": "user", "content": text}]
+
 # AG-UI Protocol Endpoints
 
 @app.get("/")
@@ -225,7 +980,13 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "ag_ui": "/awp",
-            "health": "/health"
+            "health": "/health",
+            "cache_stats": "/cache/stats",
+            "metrics": "/metrics",
+            "alerts": "/alerts",
+            "alert_stream": "/alerts/stream",
+            "sessions": "/sessions",
+            "batch": "/awp/batch"
         }
     }
 
@@ -234,20 +995,132 @@ async def health_check():
     """Detailed health check"""
     return {"status": "healthy", "message": "Reddit Analyzer API is running"}
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Listing, comment and LLM response cache counters for sizing the caches, plus intent router, session, OpenAI scheduler and snapshot state"""
+    return {
+        "listing_cache": listing_cache.stats(),
+        "comment_cache": comment_cache.stats(),
+        "llm_response_cache": response_cache.stats(),
+        "intent_router": intent_router.stats(),
+        "sessions": session_store.stats(),
+        "fanout_request_budget": subreddit_fanout.budget.stats(),
+        "openai_scheduler": openai_scheduler.stats(),
+        "snapshot": snapshot_manager.stats() if snapshot_manager else None
+    }
+
+# Gauges read from component state at scrape time
+REGISTRY.gauge("reddit_analyzer_openai_concurrency_limit", "Current adaptive OpenAI concurrency limit", lambda: openai_scheduler.limit)
+REGISTRY.gauge("reddit_analyzer_openai_in_flight", "OpenAI calls currently holding a slot", lambda: openai_scheduler.in_flight)
+REGISTRY.gauge("reddit_analyzer_openai_queued", "OpenAI calls waiting for a slot", lambda: openai_scheduler.stats()["queued"])
+REGISTRY.gauge(
+    "reddit_analyzer_cache_hit_ratio",
+    "Lifetime hit ratio of each cache",
+    lambda: {
+        "listing": listing_cache.stats()["hit_ratio"],
+        "comment": comment_cache.stats()["hit_ratio"],
+        "llm_response": response_cache.stats()["hit_ratio"]
+    },
+    labelname="cache"
+)
+REGISTRY.gauge("reddit_analyzer_sessions", "Live server-side sessions", lambda: session_store.stats()["sessions"])
+REGISTRY.gauge(
+    "reddit_analyzer_fanout_budget_available",
+    "Requests left in the shared fan-out request budget",
+    lambda: subreddit_fanout.budget.stats()["available"]
+)
+
+@app.get("/metrics")
+async def metrics():
+    """Counters, stage latency histograms and gauges in the Prometheus text format"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+@app.post("/sessions")
+async def create_session():
+    """Start a server-side conversation; send its session_id with each new message to /awp"""
+    session = session_store.create()
+    return {"session_id": session.id}
+
+@app.get("/sessions/{session_id}")
+async def get_session(session_id: str):
+    """Stored (compacted) history of a session"""
+    session = session_store.get(session_id)
+    if session is None:
+        return JSONResponse(content={"error": "Unknown or expired session"}, status_code=404)
+    return {"session_id": session.id, "messages": session.messages}
+
+@app.delete("/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """Forget a session's history"""
+    if not session_store.delete(session_id):
+        return JSONResponse(content={"error": "Unknown or expired session"}, status_code=404)
+    return {"deleted": session_id}
+
+@app.get("/alerts")
+async def recent_alerts():
+    """Recent spike alerts and the detector's current windows"""
+    return {"alerts": list(alert_broadcaster.recent), "detector": spike_detector.status()}
+
+@app.get("/alerts/stream")
+async def alert_stream(request: Request):
+    """Push spike alerts to the client as Server-Sent Events"""
+    queue = alert_broadcaster.subscribe()
+    
+    async def events() -> AsyncIterator[str]:
+        try:
+            while not await request.is_disconnected():
+                try:
+                    alert = await asyncio.wait_for(queue.get(), timeout=ALERT_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # SSE comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_event(alert["type"], **{k: v for k, v in alert.items() if k != "type"})
+        finally:
+            alert_broadcaster.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/awp/batch")
+async def batch_endpoint(request: Request):
+    """Answer a list of questions in one request, sharing Reddit fetches and tool results between them"""
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return JSONResponse(content={"error": "Invalid JSON in request body"}, status_code=400)
+    
+    questions = body.get("questions") if isinstance(body, dict) else None
+    if not isinstance(questions, list) or not questions:
+        return JSONResponse(content={"error": "No questions provided"}, status_code=400)
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        return JSONResponse(
+            content={"error": f"Too many questions ({len(questions)}); the limit is {BATCH_MAX_QUESTIONS}"},
+            status_code=400
+        )
+    if not all(isinstance(question, str) and question.strip() for question in questions):
+        return JSONResponse(content={"error": "Every question must be a non-empty string"}, status_code=400)
+    
+    concurrency = body.get("concurrency", BATCH_CONCURRENCY)
+    if not isinstance(concurrency, int) or concurrency < 1:
+        return JSONResponse(content={"error": "concurrency must be a positive integer"}, status_code=400)
+    return JSONResponse(content=await run_batch(questions, min(concurrency, BATCH_CONCURRENCY)))
+
 @app.post("/awp")
 async def ag_ui_endpoint(request: Request):
     """Main AG-UI protocol endpoint"""
     try:
-        # Get raw content for debugging
-        raw_body = await request.body()
-        print(f"Raw request body: {raw_body}")
-        
         # Parse request body
         try:
-            body = await request.json()
-            print(f"Received request: {json.dumps(body, indent=2)}")
+            with span("parse_request"):
+                raw_body = await request.body()
+                body = json.loads(raw_body)
+            log.debug("awp_request", bytes=len(raw_body), keys=sorted(body) if isinstance(body, dict) else None)
         except json.JSONDecodeError:
-            print(f"Error parsing JSON from request body: {raw_body.decode()}")
+            log.warning("awp_invalid_json", bytes=len(raw_body))
             return JSONResponse(
                 content={"error": "Invalid JSON in request body"},
                 status_code=400
@@ -255,7 +1128,6 @@ async def ag_ui_endpoint(request: Request):
         
         # Handle GraphQL query for CopilotKit
         if "operationName" in body and body.get("operationName") == "availableAgents":
-            print("Handling availableAgents GraphQL query")
             return JSONResponse(content={
                 "data": {
                     "availableAgents": {
@@ -274,7 +1146,6 @@ async def ag_ui_endpoint(request: Request):
         
         # Handle GraphQL mutation for CopilotKit chat
         if "operationName" in body and body.get("operationName") == "generateMessage":
-            print("Handling generateMessage GraphQL mutation")
             variables = body.get("variables", {})
             text = variables.get("text", "")
             
@@ -287,68 +1158,10 @@ async def ag_ui_endpoint(request: Request):
             # Convert to messages format
             messages = [{"role": "user", "content": text}]
             
-            # Process with OpenAI and continue with existing logic
-            print(f"Sending messages to OpenAI: {messages}")
-            response = await call_openai_with_tools(messages)
-            message = response.choices[0].message
+            if wants_stream(request, body):
+                return sse_response(messages)
             
-            # Handle tool calls if present (existing code)
-            if message.tool_calls:
-                # Execute tool calls
-                tool_messages = []
-                for tool_call in message.tool_calls:
-                    result = await execute_tool_call(tool_call)
-                    # Ensure result is not None and is a string
-                    if result is None:
-                        print(f"WARNING: Tool call {tool_call.id} returned None result")
-                        result = "No results available"
-                    
-                    # Create tool message with guaranteed string content
-                    tool_message = {
-                        "tool_call_id": tool_call.id,
-                        "role": "tool",
-                        "content": str(result)  # Force to string
-                    }
-                    print(f"Adding tool message: {json.dumps(tool_message)}")
-                    tool_messages.append(tool_message)
-                
-                # Get final response with tool results
-                print("Creating final message array with tool results")
-                assistant_message = {"role": message.role, "content": message.content or ""}
-                
-                # Make sure the assistant message has tool_calls property from the API response
-                if hasattr(message, 'tool_calls') and message.tool_calls:
-                    # Convert tool_calls object to dict for JSON serialization
-                    tool_calls_data = []
-                    for tc in message.tool_calls:
-                        tool_calls_data.append({
-                            "id": tc.id,
-                            "type": "function",
-                            "function": {
-                                "name": tc.function.name,
-                                "arguments": tc.function.arguments
-                            }
-                        })
-                    assistant_message["tool_calls"] = tool_calls_data
-                
-                # First add the assistant message with tool_calls, then add tool messages
-                final_messages = messages + [assistant_message] + tool_messages
-                
-                # Print the message array for debugging
-                print(f"Final message array before validation (length={len(final_messages)}):")
-                for i, msg in enumerate(final_messages):
-                    role = msg.get('role')
-                    has_tool_calls = 'tool_calls' in msg
-                    content_type = type(msg.get('content'))
-                    content_len = len(str(msg.get('content') or ""))
-                    print(f"  Message {i}: role={role}, has_tool_calls={has_tool_calls}, content_type={content_type}, content_len={content_len}")
-                
-                # Validate messages before sending to OpenAI
-                validated_messages = validate_messages(final_messages)
-                final_response = await call_openai_with_tools(validated_messages)
-                final_message = final_response.choices[0].message.content
-            else:
-                final_message = message.content
+            final_message, _ = await run_agent_turn(messages)
                 
             # Return GraphQL-formatted response
             return JSONResponse(content={
@@ -365,12 +1178,31 @@ async def ag_ui_endpoint(request: Request):
                 }
             })
         
+        # Session turns: the client sends only its new message
+        if body.get("session_id"):
+            started = begin_session_turn(body)
+            if isinstance(started, JSONResponse):
+                return started
+            session, messages = started
+            if wants_stream(request, body):
+                return sse_response(messages, session=session)
+            try:
+                final_message, turn_messages = await run_agent_turn(messages)
+                session_store.record_turn(session, messages[-1], turn_messages)
+            finally:
+                session.busy = False
+            return JSONResponse(content={
+                "message": final_message,
+                "type": "message",
+                "session_id": session.id,
+                "timestamp": "2025-01-01T00:00:00Z"
+            })
+        
         # For non-GraphQL requests, continue with existing logic
         messages = body.get("messages", [])
         
         # Handle single message format (CopilotKit might send this)
         if not messages and "message" in body:
-            print(f"Converting single message format: {body['message']}")
             messages = [{"role": "user", "content": body["message"]}]
             
         # Handle empty string content (convert to empty list)
@@ -378,74 +1210,15 @@ async def ag_ui_endpoint(request: Request):
             messages = []
             
         if not messages:
-            print("Error: No messages provided in request")
             return JSONResponse(
                 content={"error": "No messages provided", "received": body},
                 status_code=400
             )
         
-        # Process with OpenAI
-        print(f"Sending messages to OpenAI: {messages}")
-        response = await call_openai_with_tools(messages)
-        message = response.choices[0].message
+        if wants_stream(request, body):
+            return sse_response(messages)
         
-        # Handle tool calls if present
-        if message.tool_calls:
-            # Execute tool calls
-            tool_messages = []
-            for tool_call in message.tool_calls:
-                result = await execute_tool_call(tool_call)
-                # Ensure result is not None and is a string
-                if result is None:
-                    print(f"WARNING: Tool call {tool_call.id} returned None result")
-                    result = "No results available"
-                    
-                # Create tool message with guaranteed string content
-                tool_message = {
-                    "tool_call_id": tool_call.id,
-                    "role": "tool",
-                    "content": str(result)  # Force to string
-                }
-                print(f"Adding tool message: {json.dumps(tool_message)}")
-                tool_messages.append(tool_message)
-            
-            # Get final response with tool results
-            print("Creating final message array with tool results")
-            assistant_message = {"role": message.role, "content": message.content or ""}
-            
-            # Make sure the assistant message has tool_calls property from the API response
-            if hasattr(message, 'tool_calls') and message.tool_calls:
-                # Convert tool_calls object to dict for JSON serialization
-                tool_calls_data = []
-                for tc in message.tool_calls:
-                    tool_calls_data.append({
-                        "id": tc.id,
-                        "type": "function",
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments
-                        }
-                    })
-                assistant_message["tool_calls"] = tool_calls_data
-            
-            # First add the assistant message with tool_calls, then add tool messages
-            final_messages = messages + [assistant_message] + tool_messages
-            
-            # Print the message array for debugging
-            print(f"Final message array before validation (length={len(final_messages)}):")
-            for i, msg in enumerate(final_messages):
-                role = msg.get('role')
-                has_tool_calls = 'tool_calls' in msg
-                content_type = type(msg.get('content'))
-                content_len = len(str(msg.get('content') or ""))
-                print(f"  Message {i}: role={role}, has_tool_calls={has_tool_calls}, content_type={content_type}, content_len={content_len}")
-            
-            # Validate messages before sending to OpenAI
-            validated_messages = validate_messages(final_messages)
-            final_response = await call_openai_with_tools(validated_messages)
-            final_message = final_response.choices[0].message.content
-        else:
-            final_message = message.content
+        final_message, _ = await run_agent_turn(messages)
         
         # Return AG-UI compatible response
         result = {
@@ -453,13 +1226,13 @@ async def ag_ui_endpoint(request: Request):
             "type": "message",
             "timestamp": "2025-01-01T00:00:00Z"
         }
-        print(f"Returning result: {json.dumps(result, indent=2)}")
         return JSONResponse(content=result)
         
+    except SchedulerOverloaded as e:
+        log.warning("request_shed", error=str(e), retry_after=e.retry_after, stream=False)
+        return overloaded_response(e)
     except Exception as e:
-        print(f"Error processing request: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        log.exception("awp_request_failed", error=str(e))
         return JSONResponse(
             content={
                 "error": "Internal server error",
@@ -0,0 +1,134 @@
+"""
+Near-duplicate detection for Reddit posts.
+
+During outages r/Comcast_Xfinity fills up with near-identical "is Xfinity
+down?" posts. This module turns each post's title and the opening of its
+content into a set of word shingles, sketches it with MinHash, and uses
+locality-sensitive banding to find candidate pairs in roughly linear time.
+Candidates are confirmed with exact Jaccard similarity before being merged.
+"""
+
+import re
+import zlib
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from reddit_models import Post
+
+# Posts whose shingle sets overlap at least this much are near-duplicates
+SIMILARITY_THRESHOLD = 0.5
+
+# MinHash signature of BANDS * ROWS values. With 10 bands of 3 rows a pair
+# at the threshold becomes a candidate ~75% of the time and a pair at
+# Jaccard 0.7 ~97% of the time, while unrelated posts rarely collide.
+BANDS = 10
+ROWS = 3
+NUM_HASHES = BANDS * ROWS
+
+# Only the opening of the body matters for "same question" detection
+CONTENT_CHARS = 200
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN = 0x9E3779B97F4A7C15
+# Offset added per bin of rotation when densifying, larger than any bin value
+_ROTATION_OFFSET = 1 << 64
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def shingles(post: Post) -> FrozenSet[str]:
+    """Word unigrams and bigrams of a post's title plus the start of its content."""
+    content = post.content if post.content != "[No content]" else ""
+    tokens = TOKEN_RE.findall(f"{post.title} {content[:CONTENT_CHARS]}".lower())
+    return frozenset(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+
+def minhash(features: FrozenSet[str]) -> Tuple[int, ...]:
+    """
+    MinHash signature of a feature set (stable across processes).
+
+    Uses one-permutation hashing: each feature is hashed once and lands in
+    one of NUM_HASHES bins, keeping the minimum per bin, so the cost is
+    linear in the number of features rather than features x hashes. Empty
+    bins borrow the value of the next non-empty bin (rotation densification)
+    so short posts still get a full signature.
+    """
+    if not features:
+        return ()
+    bins: List[Optional[int]] = [None] * NUM_HASHES
+    for feature in features:
+        h = (zlib.crc32(feature.encode()) * _GOLDEN) & _MASK64
+        index, value = h % NUM_HASHES, h // NUM_HASHES
+        current = bins[index]
+        if current is None or value < current:
+            bins[index] = value
+
+    signature = []
+    for index in range(NUM_HASHES):
+        distance = 0
+        while bins[(index + distance) % NUM_HASHES] is None:
+            distance += 1
+        signature.append(bins[(index + distance) % NUM_HASHES] + distance * _ROTATION_OFFSET)
+    return tuple(signature)
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cluster_posts(posts: Sequence[Post], threshold: float = SIMILARITY_THRESHOLD) -> List[List[Post]]:
+    """
+    Group near-duplicate posts.
+
+    Args:
+        posts: Posts to cluster
+        threshold: Minimum Jaccard similarity of two posts' shingle sets
+
+    Returns:
+        Clusters in order of their first post; each cluster keeps the input
+        order of its members
+    """
+    features = [shingles(post) for post in posts]
+    parent = list(range(len(posts)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = {}
+    for index, feature_set in enumerate(features):
+        signature = minhash(feature_set)
+        if not signature:
+            continue
+        for band in range(BANDS):
+            key = (band, signature[band * ROWS:(band + 1) * ROWS])
+            bucket = buckets.setdefault(key, [])
+            for other in bucket:
+                if find(index) != find(other) and jaccard(feature_set, features[other]) >= threshold:
+                    parent[find(index)] = find(other)
+            bucket.append(index)
+
+    clusters: Dict[int, List[Post]] = {}
+    for index, post in enumerate(posts):
+        clusters.setdefault(find(index), []).append(post)
+    return list(clusters.values())
+
+
+def collapse_near_duplicates(posts: Sequence[Post]) -> List[Tuple[Post, int]]:
+    """
+    Replace each near-duplicate cluster with one representative.
+
+    The representative is the cluster's highest-scored post, ties going to
+    the one with the most comments.
+
+    Returns:
+        List of (representative, number of other posts it stands for)
+    """
+    collapsed = []
+    for cluster in cluster_posts(posts):
+        representative = max(cluster, key=lambda post: (post.score, post.num_comments))
+        collapsed.append((representative, len(cluster) - 1))
+    return collapsed
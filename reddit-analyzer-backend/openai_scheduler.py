@@ -0,0 +1,198 @@
+"""
+Admission control and adaptive concurrency for OpenAI calls.
+
+Bursts of chat requests used to fire unlimited concurrent completions,
+run into 429s and surface as HTTP 500s. This module puts one scheduler in
+front of the OpenAI client. Calls run under a concurrency limit that adapts
+AIMD-style: it grows by about one slot per round of fast successes and is
+cut multiplicatively on 429s or slow responses. Calls beyond the limit wait
+in a bounded FIFO queue until a slot frees up or their deadline passes, and
+calls that cannot be admitted are shed immediately with a Retry-After hint
+instead of piling up.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when a call is shed; retry_after is a suggested wait in seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class AdaptiveScheduler:
+    """
+    AIMD concurrency limiter with a bounded wait queue and per-call deadlines.
+
+    Use acquire() before a call and release() once its slot is no longer
+    needed (for streams, when the stream ends), reporting the outcome with
+    record_latency() or record_overload() in between.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 8,
+        min_limit: float = 1,
+        max_limit: float = 32,
+        max_queue: int = 64,
+        queue_timeout: float = 10.0,
+        latency_target: float = 10.0,
+        backoff_factor: float = 0.5,
+        decrease_cooldown: float = 2.0,
+    ):
+        """
+        Initialize the scheduler.
+
+        Args:
+            initial_limit: Concurrent calls allowed at startup
+            min_limit: Lower bound on the concurrency limit
+            max_limit: Upper bound on the concurrency limit
+            max_queue: Calls allowed to wait for a slot; more are shed at once
+            queue_timeout: Longest a call waits for a slot before it is shed
+            latency_target: Call latency in seconds above which the limit shrinks
+            backoff_factor: Multiplier applied to the limit on a 429
+            decrease_cooldown: Seconds after a decrease during which further
+                overload signals (from calls already in flight) are ignored and
+                the limit does not grow; replaced by the smoothed call latency
+                once one has been observed
+        """
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_target = latency_target
+        self.backoff_factor = backoff_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+        self.avg_latency: Optional[float] = None
+
+        self.admitted = 0
+        self.shed = 0
+        self.rate_limited = 0
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveScheduler":
+        """Build a scheduler using OPENAI_* environment variables."""
+        return cls(
+            initial_limit=float(os.getenv("OPENAI_CONCURRENCY_INITIAL", "8")),
+            max_limit=float(os.getenv("OPENAI_CONCURRENCY_MAX", "32")),
+            max_queue=int(os.getenv("OPENAI_QUEUE_SIZE", "64")),
+            queue_timeout=float(os.getenv("OPENAI_QUEUE_TIMEOUT", "10")),
+            latency_target=float(os.getenv("OPENAI_LATENCY_TARGET", "10")),
+        )
+
+    async def acquire(self, deadline: Optional[float] = None) -> None:
+        """
+        Wait for a call slot.
+
+        Args:
+            deadline: time.monotonic() by which the call must have started
+
+        Raises:
+            SchedulerOverloaded: If the queue is full or no slot frees up in time
+        """
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self._admit()
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._shed()
+            raise SchedulerOverloaded("OpenAI request queue is full", self.retry_after())
+
+        timeout = self.queue_timeout
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+        if timeout <= 0:
+            self._shed()
+            raise SchedulerOverloaded("Request deadline passed before an OpenAI slot was free", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            self._shed()
+            raise SchedulerOverloaded("Timed out waiting for an OpenAI slot", self.retry_after())
+        except BaseException:
+            # Cancelled (e.g. client disconnect) after release() had already handed us the slot
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        # release() already counted this call as in flight when it woke us
+
+    def release(self) -> None:
+        """Free a slot and admit waiting calls up to the current limit."""
+        self.in_flight -= 1
+        self._wake()
+
+    def record_latency(self, latency: float) -> None:
+        """Feed back a finished or timed-out call: grow the limit if it was fast, shrink it if slow."""
+        self.avg_latency = latency if self.avg_latency is None else 0.8 * self.avg_latency + 0.2 * latency
+        if latency > self.latency_target:
+            self._decrease(0.9)
+        elif self._cooling_down():
+            # Calls that started above the old limit are still finishing; growing now would
+            # push the limit straight back over the provider's ceiling
+            return
+        else:
+            # Additive increase: about +1 slot once every slot has completed a call
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self._wake()
+
+    def record_overload(self) -> None:
+        """Feed back a 429 from the provider."""
+        self.rate_limited += 1
+        self._decrease(self.backoff_factor)
+
+    def retry_after(self) -> float:
+        """Rough time for the current queue to drain, in whole seconds (at least 1)."""
+        latency = self.avg_latency or self.latency_target / 2
+        return float(max(1, round((len(self._waiters) + 1) / max(self.limit, 1.0) * latency)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "rate_limited": self.rate_limited,
+            "avg_latency": round(self.avg_latency, 3) if self.avg_latency is not None else None,
+        }
+
+    def _admit(self) -> None:
+        self.in_flight += 1
+        self.admitted += 1
+
+    def _shed(self) -> None:
+        self.shed += 1
+
+    def _cooling_down(self) -> bool:
+        """Whether the last decrease was less than one round trip ago."""
+        cooldown = self.avg_latency if self.avg_latency is not None else self.decrease_cooldown
+        return time.monotonic() - self._last_decrease < cooldown
+
+    def _decrease(self, factor: float) -> None:
+        if self._cooling_down():
+            return
+        self._last_decrease = time.monotonic()
+        self.limit = max(self.min_limit, self.limit * factor)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._admit()
+                waiter.set_result(None)
@@ -0,0 +1,423 @@
+"""
+Local SQLite post store for the Reddit Analyzer.
+
+This module persists ingested subreddit posts in SQLite with an FTS5
+full-text index so search tool calls can be answered from disk instead of
+Reddit's rate-limited search endpoint. SQLite calls are blocking, so every
+public coroutine runs its query in a worker thread.
+"""
+
+import asyncio
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+from geo import post_locations
+from reddit_models import Post
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS posts (
+    id TEXT PRIMARY KEY,
+    subreddit TEXT NOT NULL,
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    author TEXT,
+    flair TEXT,
+    created_utc REAL NOT NULL,
+    score INTEGER NOT NULL,
+    num_comments INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    ingested_at REAL NOT NULL,
+    locations TEXT
+);
+CREATE INDEX IF NOT EXISTS posts_created ON posts(subreddit, created_utc);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+    title, content, flair, content='posts', content_rowid='rowid'
+);
+
+CREATE TRIGGER IF NOT EXISTS posts_ai AFTER INSERT ON posts BEGIN
+    INSERT INTO posts_fts(rowid, title, content, flair)
+    VALUES (new.rowid, new.title, new.content, new.flair);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_ad AFTER DELETE ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, title, content, flair)
+    VALUES ('delete', old.rowid, old.title, old.content, old.flair);
+END;
+CREATE TRIGGER IF NOT EXISTS posts_au AFTER UPDATE OF title, content, flair ON posts BEGIN
+    INSERT INTO posts_fts(posts_fts, rowid, title, content, flair)
+    VALUES ('delete', old.rowid, old.title, old.content, old.flair);
+    INSERT INTO posts_fts(rowid, title, content, flair)
+    VALUES (new.rowid, new.title, new.content, new.flair);
+END;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+POST_COLUMNS = (
+    "p.id, p.title, p.created_utc, p.score, p.num_comments, p.content, p.url, p.author, p.flair, p.locations"
+)
+
+# Decaying refresh schedule for score/comment counts: (max post age, refresh interval) in seconds.
+# Young posts change quickly and are revisited often; posts older than the last tier are frozen.
+REFRESH_SCHEDULE = [
+    (6 * 3600, 10 * 60),
+    (24 * 3600, 60 * 60),
+    (7 * 86400, 6 * 3600),
+]
+
+# Blend weights for "relevance" ranking: text match, recency, community score
+RELEVANCE_WEIGHT = 1.0
+RECENCY_WEIGHT = 0.5
+SCORE_WEIGHT = 0.25
+RECENCY_HALF_LIFE_DAYS = 7.0
+
+
+class PostStore:
+    """
+    A persistent, full-text indexed store of subreddit posts.
+
+    Stored posts are returned as reddit_models.Post objects, so search
+    results can be formatted exactly like live API results.
+    """
+
+    def __init__(self, path: str = "reddit_posts.db"):
+        """
+        Open (or create) the store.
+
+        Args:
+            path: SQLite database file path, or ":memory:"
+        """
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[List[Post]], None]] = []
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._migrate()
+
+    @classmethod
+    def from_env(cls) -> "PostStore":
+        """Build a store using the POST_STORE_PATH environment variable."""
+        return cls(path=os.getenv("POST_STORE_PATH", "reddit_posts.db"))
+
+    def add_listener(self, listener: Callable[[List[Post]], None]) -> None:
+        """
+        Register a callback invoked with every batch of upserted posts.
+
+        Callbacks run on the event loop after the write commits and receive
+        both new posts and refreshed copies of known ones.
+        """
+        self._listeners.append(listener)
+
+    def close(self) -> None:
+        """Close the underlying database connection."""
+        with self._lock:
+            self._conn.close()
+
+    async def upsert_posts(self, subreddit: str, posts: Iterable[Post], notify: bool = True) -> int:
+        """
+        Insert new posts and refresh score/comment counts of known ones.
+
+        Args:
+            subreddit: Subreddit the posts belong to
+            posts: Posts as produced by reddit_models.decode_listing
+            notify: Whether listeners see the batch; restored posts (e.g. from
+                a snapshot) are not news and skip them
+
+        Returns:
+            Number of posts written
+        """
+        posts = list(posts)
+        # Extract locations here, on the event loop: the Post objects are shared with the
+        # listing cache, so the writer thread only reads them
+        for post in posts:
+            if isinstance(post, Post):
+                post_locations(post)
+        written = await asyncio.to_thread(self._upsert_posts, subreddit, posts)
+        if notify:
+            for listener in self._listeners:
+                listener(posts)
+        return written
+
+    async def search(self, subreddit: str, query: str, limit: int = 20, sort: str = "relevance") -> List[Post]:
+        """
+        Full-text search the local corpus.
+
+        Args:
+            subreddit: Subreddit to search within
+            query: Free-text query; every word must match
+            limit: Maximum number of results
+            sort: "relevance" (blend of text match, recency and score),
+                "new" (most recent first) or "top" (highest score first)
+
+        Returns:
+            List of posts
+        """
+        return await asyncio.to_thread(self._search, subreddit, query, limit, sort)
+
+    async def posts_since(
+        self, subreddit: str, since: float, query: Optional[str] = None, limit: int = 5000
+    ) -> List[Post]:
+        """
+        Posts created at or after since, newest first.
+
+        Args:
+            subreddit: Subreddit to read from
+            since: Unix timestamp lower bound on created_utc
+            query: Optional free-text filter; every word must match
+            limit: Maximum number of posts returned
+        """
+        return await asyncio.to_thread(self._posts_since, subreddit, since, query, limit)
+
+    async def iter_posts_since(
+        self, subreddit: str, since: float, page_size: int = 1000
+    ) -> AsyncIterator[List[Post]]:
+        """
+        Posts created at or after since, oldest first, in pages of page_size.
+
+        Only one page is held in memory at a time, so callers can rebuild
+        in-memory indexes from a store of any size.
+
+        Yields:
+            Lists of up to page_size posts
+        """
+        position = (since, "")
+        while True:
+            page = await asyncio.to_thread(self._posts_page, subreddit, position, page_size)
+            if not page:
+                return
+            yield page
+            if len(page) < page_size:
+                return
+            position = (page[-1].created_utc, page[-1].id)
+
+    async def is_fresh(self, subreddit: str, max_age: float) -> bool:
+        """Whether the corpus for subreddit was refreshed within max_age seconds."""
+        refreshed_at = await asyncio.to_thread(self._get_meta, f"refreshed_at:{subreddit}")
+        return refreshed_at is not None and time.time() - float(refreshed_at) < max_age
+
+    async def mark_refreshed(self, subreddit: str, when: Optional[float] = None) -> None:
+        """Record that the corpus for subreddit is up to date with Reddit."""
+        await asyncio.to_thread(self._set_meta, f"refreshed_at:{subreddit}", str(when or time.time()))
+
+    async def get_checkpoint(self, subreddit: str) -> Optional[Dict[str, Any]]:
+        """Return the ingestion checkpoint (newest ingested post) for subreddit."""
+        value = await asyncio.to_thread(self._get_meta, f"checkpoint:{subreddit}")
+        return json.loads(value) if value else None
+
+    async def set_checkpoint(self, subreddit: str, checkpoint: Dict[str, Any]) -> None:
+        """Persist the ingestion checkpoint so restarts resume instead of re-crawling."""
+        await asyncio.to_thread(self._set_meta, f"checkpoint:{subreddit}", json.dumps(checkpoint))
+
+    async def posts_due_for_refresh(self, subreddit: str, limit: int = 100) -> List[str]:
+        """
+        Ids of recent posts whose score/comment counts are due a refresh.
+
+        Uses REFRESH_SCHEDULE, so the youngest posts are returned first and
+        most often.
+        """
+        return await asyncio.to_thread(self._posts_due_for_refresh, subreddit, limit)
+
+    async def touch_posts(self, subreddit: str, post_ids: List[str]) -> None:
+        """
+        Count posts as refreshed without new data, e.g. ones Reddit no longer returns.
+
+        Moves them to the back of the refresh schedule so they stop being due.
+        """
+        if post_ids:
+            await asyncio.to_thread(self._touch_posts, subreddit, post_ids)
+
+    async def count(self, subreddit: str) -> int:
+        """Number of stored posts for subreddit."""
+        return await asyncio.to_thread(self._count, subreddit)
+
+    def _migrate(self) -> None:
+        """Add columns introduced after a database file was first created."""
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(posts)")}
+        if "locations" not in columns:
+            self._conn.execute("ALTER TABLE posts ADD COLUMN locations TEXT")
+
+    def _upsert_posts(self, subreddit: str, posts: List[Post]) -> int:
+        now = time.time()
+        rows = [
+            (
+                post.id, subreddit, post.title, post.content, post.author, post.flair,
+                post.created_utc, post.score, post.num_comments, post.url, now,
+                json.dumps(post.locations),
+            )
+            for post in posts
+            if isinstance(post, Post) and post.id
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """
+                INSERT INTO posts (id, subreddit, title, content, author, flair,
+                                   created_utc, score, num_comments, url, ingested_at, locations)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET
+                    title = excluded.title,
+                    content = excluded.content,
+                    flair = excluded.flair,
+                    locations = excluded.locations,
+                    score = excluded.score,
+                    num_comments = excluded.num_comments,
+                    ingested_at = excluded.ingested_at
+                """,
+                rows,
+            )
+        return len(rows)
+
+    def _search(self, subreddit: str, query: str, limit: int, sort: str) -> List[Post]:
+        match = self._to_match_expression(query)
+        if not match:
+            return []
+
+        if sort == "new":
+            order, candidates = "p.created_utc DESC", limit
+        elif sort == "top":
+            order, candidates = "p.score DESC", limit
+        else:
+            # Over-fetch by text relevance, then re-rank with recency and score
+            order, candidates = "rank", limit * 4
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT {POST_COLUMNS}, bm25(posts_fts, 10.0, 1.0, 2.0) AS rank
+                FROM posts_fts
+                JOIN posts p ON p.rowid = posts_fts.rowid
+                WHERE posts_fts MATCH ? AND p.subreddit = ?
+                ORDER BY {order}
+                LIMIT ?
+                """,
+                (match, subreddit, candidates),
+            ).fetchall()
+
+        if sort not in ("new", "top"):
+            now = time.time()
+            rows = sorted(rows, key=lambda row: self._relevance(row, now), reverse=True)[:limit]
+        return [self._row_to_post(row) for row in rows]
+
+    @staticmethod
+    def _relevance(row: sqlite3.Row, now: float) -> float:
+        """Blend text match (bm25 is lower-is-better), exponential recency decay and log score."""
+        age_days = max(0.0, now - row["created_utc"]) / 86400
+        recency = 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS)
+        popularity = math.log1p(max(row["score"], 0))
+        return RELEVANCE_WEIGHT * -row["rank"] + RECENCY_WEIGHT * recency + SCORE_WEIGHT * popularity
+
+    @staticmethod
+    def _to_match_expression(query: str) -> str:
+        """Quote each word so user input can never be parsed as FTS5 syntax."""
+        words = re.findall(r"\w+", query.lower())
+        return " ".join(f'"{word}"' for word in words)
+
+    @staticmethod
+    def _row_to_post(row: sqlite3.Row) -> Post:
+        return Post(
+            id=row["id"],
+            title=row["title"],
+            created_utc=row["created_utc"],
+            score=row["score"],
+            num_comments=row["num_comments"],
+            content=row["content"],
+            url=row["url"],
+            author=row["author"],
+            flair=row["flair"],
+            locations=json.loads(row["locations"]) if row["locations"] is not None else None,
+        )
+
+    def _posts_since(self, subreddit: str, since: float, query: Optional[str], limit: int) -> List[Post]:
+        if query:
+            match = self._to_match_expression(query)
+            if not match:
+                return []
+            sql = f"""
+                SELECT {POST_COLUMNS} FROM posts_fts
+                JOIN posts p ON p.rowid = posts_fts.rowid
+                WHERE posts_fts MATCH ? AND p.subreddit = ? AND p.created_utc >= ?
+                ORDER BY p.created_utc DESC LIMIT ?
+            """
+            params = (match, subreddit, since, limit)
+        else:
+            sql = f"""
+                SELECT {POST_COLUMNS} FROM posts p
+                WHERE p.subreddit = ? AND p.created_utc >= ?
+                ORDER BY p.created_utc DESC LIMIT ?
+            """
+            params = (subreddit, since, limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [self._row_to_post(row) for row in rows]
+
+    def _posts_page(self, subreddit: str, after: Tuple[float, str], limit: int) -> List[Post]:
+        # Keyset pagination on (created_utc, id): each page starts after the last row of the previous one
+        created_utc, post_id = after
+        sql = f"""
+            SELECT {POST_COLUMNS} FROM posts p
+            WHERE p.subreddit = ? AND (p.created_utc > ? OR (p.created_utc = ? AND p.id > ?))
+            ORDER BY p.created_utc, p.id LIMIT ?
+        """
+        with self._lock:
+            rows = self._conn.execute(sql, (subreddit, created_utc, created_utc, post_id, limit)).fetchall()
+        return [self._row_to_post(row) for row in rows]
+
+    def _posts_due_for_refresh(self, subreddit: str, limit: int) -> List[str]:
+        now = time.time()
+        tiers = " ".join(
+            f"WHEN ? - created_utc < {max_age} THEN ? - ingested_at >= {interval}"
+            for max_age, interval in REFRESH_SCHEDULE
+        )
+        params = [value for _ in REFRESH_SCHEDULE for value in (now, now)]
+        with self._lock:
+            rows = self._conn.execute(
+                f"""
+                SELECT id FROM posts
+                WHERE subreddit = ? AND created_utc > ?
+                  AND CASE {tiers} ELSE 0 END
+                ORDER BY created_utc DESC
+                LIMIT ?
+                """,
+                [subreddit, now - REFRESH_SCHEDULE[-1][0], *params, limit],
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def _touch_posts(self, subreddit: str, post_ids: List[str]) -> None:
+        placeholders = ",".join("?" * len(post_ids))
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE posts SET ingested_at = ? WHERE subreddit = ? AND id IN ({placeholders})",
+                [time.time(), subreddit, *post_ids],
+            )
+
+    def _count(self, subreddit: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM posts WHERE subreddit = ?", (subreddit,)
+            ).fetchone()[0]
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def _set_meta(self, key: str, value: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
@@ -0,0 +1,118 @@
+"""
+Typed post model and fast listing decoder for the Reddit Analyzer.
+
+Reddit listing payloads carry dozens of fields per post (preview images,
+awards, media embeds) that the analyzer never reads. This module decodes
+the raw response bytes straight into compact, slotted Post objects, using
+msgspec when it is installed so unused fields are skipped without ever
+being materialized, and falling back to the standard json module otherwise.
+"""
+
+import json
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speedup
+    msgspec = None
+
+REDDIT_URL = "https://www.reddit.com"
+
+
+@dataclass(slots=True)
+class Post:
+    """A single subreddit post with only the fields the analyzer uses."""
+
+    id: str
+    title: str
+    created_utc: float
+    score: int
+    num_comments: int
+    content: str
+    url: str
+    author: Optional[str] = None
+    flair: Optional[str] = None
+    # Place names found in the text; filled in by geo.post_locations
+    locations: Optional[List[str]] = None
+
+    @classmethod
+    def from_reddit(cls, data: Dict[str, Any]) -> "Post":
+        """Build a Post from an already-decoded Reddit "t3" data object."""
+        return cls(
+            id=data.get("id") or "",
+            title=data.get("title") or "",
+            created_utc=data.get("created_utc", 0),
+            score=data.get("score", 0),
+            num_comments=data.get("num_comments", 0),
+            content=data["selftext"] if data.get("selftext") is not None else "[No content]",
+            url=f"{REDDIT_URL}{data.get('permalink') or ''}",
+            author=data.get("author"),
+            flair=data.get("link_flair_text"),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain-dict form, for JSON responses and persistence."""
+        return asdict(self)
+
+
+if msgspec is not None:
+
+    class _PostData(msgspec.Struct):
+        """Only the t3 fields we keep; msgspec skips every other key while decoding."""
+
+        # Reddit sends null for some of these (e.g. selftext on removed posts), so
+        # they are optional here and defaulted when the Post is built
+        id: Optional[str] = ""
+        title: Optional[str] = ""
+        created_utc: float = 0
+        score: int = 0
+        num_comments: int = 0
+        selftext: Optional[str] = "[No content]"
+        permalink: Optional[str] = ""
+        author: Optional[str] = None
+        link_flair_text: Optional[str] = None
+
+    class _Child(msgspec.Struct):
+        data: _PostData
+
+    class _ListingData(msgspec.Struct):
+        children: List[_Child] = []
+        after: Optional[str] = None
+
+    class _Listing(msgspec.Struct):
+        data: _ListingData
+
+    _listing_decoder = msgspec.json.Decoder(_Listing)
+
+
+def decode_listing(raw: bytes) -> Tuple[List[Post], Optional[str]]:
+    """
+    Decode a raw Reddit listing response body.
+
+    Args:
+        raw: Response body of a listing/search/by_id endpoint
+
+    Returns:
+        Tuple of (posts, `after` cursor or None)
+    """
+    if msgspec is not None:
+        listing = _listing_decoder.decode(raw)
+        posts = [
+            Post(
+                id=child.data.id or "",
+                title=child.data.title or "",
+                created_utc=child.data.created_utc,
+                score=child.data.score,
+                num_comments=child.data.num_comments,
+                content=child.data.selftext if child.data.selftext is not None else "[No content]",
+                url=f"{REDDIT_URL}{child.data.permalink or ''}",
+                author=child.data.author,
+                flair=child.data.link_flair_text,
+            )
+            for child in listing.data.children
+        ]
+        return posts, listing.data.after
+
+    data = json.loads(raw)["data"]
+    return [Post.from_reddit(child["data"]) for child in data["children"]], data.get("after")
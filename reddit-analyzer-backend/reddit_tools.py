@@ -1,36 +1,86 @@
 """
 Reddit data fetching and analysis utilities for the Reddit Analyzer.
 
-This module provides a class to fetch and process data from the
-r/Comcast_Xfinity subreddit using asynchronous HTTP requests.
+This module provides a class to fetch and process data from a subreddit
+(r/Comcast_Xfinity by default) using asynchronous HTTP requests made
+through a shared, pooled RedditTransport.
 """
 
 import asyncio
+import heapq
 import json
 import os
-from typing import List, Dict, Any, Optional
-import aiohttp
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
 from datetime import datetime, timezone
 import random
 import time
+from contextlib import aclosing
+from reddit_transport import RedditTransport, RedditTransportError, RequestBudget
+from listing_cache import ListingCache
+from post_store import PostStore
+from reddit_models import Post, decode_listing
+from context_packer import pack_posts
+from issue_classifier import aggregate_issue_stats
+import geo
+from comment_threads import CommentCache, CommentThread, decode_thread, parse_post_id
+from telemetry import get_logger
+
+log = get_logger("reddit_tools")
+
+# Origin of Reddit's JSON API; point it at a local stand-in for offline benchmarks
+REDDIT_BASE_URL = os.getenv("REDDIT_BASE_URL", "https://www.reddit.com").rstrip("/")
+
+# Default prompt-token budget for one tool call's formatted posts
+DEFAULT_TOKEN_BUDGET = 1500
 
 class RedditAnalyzer:
     """
-    A class for fetching and analyzing Reddit data from r/Comcast_Xfinity.
+    A class for fetching and analyzing Reddit data from one subreddit.
     
     This class provides methods to fetch recent posts, search for posts,
     and format the data for analysis by the OpenAI model.
     """
     
-    def __init__(self):
-        """Initialize the RedditAnalyzer with the target subreddit."""
-        self.subreddit = "Comcast_Xfinity"
-        self.base_url = "https://www.reddit.com/r"
+    def __init__(
+        self,
+        subreddit: str = "Comcast_Xfinity",
+        transport: Optional[RedditTransport] = None,
+        cache: Optional[ListingCache] = None,
+        store: Optional[PostStore] = None,
+        store_freshness: float = 900.0,
+        comment_cache: Optional[CommentCache] = None,
+        comment_concurrency: int = 4,
+        request_budget: Optional[RequestBudget] = None
+    ):
+        """
+        Initialize the RedditAnalyzer with the target subreddit.
+        
+        Args:
+            subreddit: Subreddit name without the "r/" prefix
+            transport: Shared HTTP transport; a private one is created if omitted
+            cache: Listing cache placed in front of the fetch methods
+            store: Optional local post store used to answer searches from disk
+            store_freshness: Max age in seconds of the local corpus before
+                searches fall back to the live API
+            comment_cache: Cache of condensed comment threads
+            comment_concurrency: Maximum comment threads downloaded at once
+            request_budget: Optional shared budget; listing and search requests
+                that would exceed it fail instead of reaching Reddit
+        """
+        self.transport = transport or RedditTransport()
+        self.cache = cache or ListingCache()
+        self.store = store
+        self.store_freshness = store_freshness
+        self.comment_cache = comment_cache or CommentCache()
+        self.comment_concurrency = comment_concurrency
+        self.request_budget = request_budget
+        self.subreddit = subreddit
+        self.base_url = f"{REDDIT_BASE_URL}/r"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
         
-    async def fetch_recent_posts(self, timeframe: str = "hot", limit: int = 25) -> List[Dict[str, Any]]:
+    async def fetch_recent_posts(self, timeframe: str = "hot", limit: int = 25) -> List[Post]:
         """
         Fetch recent posts from the subreddit.
         
@@ -39,110 +89,358 @@ class RedditAnalyzer:
             limit: Number of posts to return
         
         Returns:
-            List of post dictionaries
+            List of posts, or a single {"error": ...} dict on failure
         """
-        url = f"{self.base_url}/{self.subreddit}/{timeframe}.json?limit={limit}"
+        key = (self.subreddit, timeframe, limit, None)
+        posts = await self.cache.get_or_fetch(
+            key, lambda: self._fetch_recent_posts(timeframe, limit), cacheable=self._is_cacheable
+        )
+        return list(posts)
+    
+    async def _fetch_recent_posts(self, timeframe: str, limit: int) -> List[Post]:
+        """Fetch a listing from Reddit, bypassing the cache."""
+        url = f"{self.base_url}/{self.subreddit}/{timeframe}.json"
+        if not self._spend_budget():
+            return [{"error": f"Request budget exhausted for r/{self.subreddit}"}]
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        posts = []
-                        
-                        for post in data["data"]["children"]:
-                            post_data = self._extract_post_data(post["data"])
-                            posts.append(post_data)
-                        
-                        return posts
-                    else:
-                        return [{"error": f"Error fetching posts: {response.status}"}]
+            raw = await self.transport.get_bytes(url, params={"limit": limit}, headers=self.headers)
+            posts, _ = decode_listing(raw)
+        except RedditTransportError as e:
+            return [{"error": f"Error fetching posts: {e.status or str(e)}"}]
         except Exception as e:
             return [{"error": f"Error fetching posts: {str(e)}"}]
+        
+        if self.store:
+            await self.store.upsert_posts(self.subreddit, posts)
+            # The newest posts are now on disk, so the local corpus is current
+            if timeframe == "new":
+                await self.store.mark_refreshed(self.subreddit)
+        return posts
     
-    async def search_subreddit(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+    async def search_subreddit(self, query: str, limit: int = 20) -> List[Post]:
         """
         Search subreddit for posts containing the query.
         
+        Searches are answered from the local post store when its corpus is
+        fresh, and only go to Reddit when it is stale or has no matches.
+        
         Args:
             query: Search term
             limit: Maximum number of results to return
         
         Returns:
-            List of post dictionaries
+            List of posts, or a single {"error": ...} dict on failure
         """
-        url = f"{self.base_url}/{self.subreddit}/search.json?q={query}&restrict_sr=1&limit={limit}"
+        key = (self.subreddit, "search", limit, query.strip().lower())
+        posts = await self.cache.get_or_fetch(
+            key, lambda: self._search_subreddit(query, limit), cacheable=self._is_cacheable
+        )
+        return list(posts)
+    
+    async def _search_subreddit(self, query: str, limit: int) -> List[Post]:
+        """Run a search against the local store or Reddit, bypassing the cache."""
+        if self.store and await self.store.is_fresh(self.subreddit, self.store_freshness):
+            posts = await self.store.search(self.subreddit, query, limit)
+            if posts:
+                return posts
+        
+        url = f"{self.base_url}/{self.subreddit}/search.json"
+        params = {"q": query, "restrict_sr": 1, "limit": limit}
+        if not self._spend_budget():
+            return [{"error": f"Request budget exhausted for r/{self.subreddit}"}]
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, headers=self.headers) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        posts = []
-                        
-                        for post in data["data"]["children"]:
-                            post_data = self._extract_post_data(post["data"])
-                            posts.append(post_data)
-                        
-                        return posts
-                    else:
-                        return [{"error": f"Error searching posts: {response.status}"}]
+            raw = await self.transport.get_bytes(url, params=params, headers=self.headers)
+            posts, _ = decode_listing(raw)
+        except RedditTransportError as e:
+            return [{"error": f"Error searching posts: {e.status or str(e)}"}]
         except Exception as e:
             return [{"error": f"Error searching posts: {str(e)}"}]
+        
+        if self.store:
+            await self.store.upsert_posts(self.subreddit, posts)
+        return posts
     
-    def format_posts_for_analysis(self, posts: List[Dict[str, Any]]) -> str:
-        """Format posts for analysis by OpenAI"""
-        if not posts:
-            return "No posts found."
+    async def fetch_listing_page(
+        self, sort: str = "new", limit: int = 100, after: Optional[str] = None
+    ) -> Tuple[List[Post], Optional[str]]:
+        """
+        Fetch one page of a listing, bypassing the cache.
         
-        if "error" in posts[0]:
-            return f"Error: {posts[0]['error']}"
+        Args:
+            sort: Listing to page through (new, hot, top)
+            limit: Page size (Reddit caps this at 100)
+            after: Fullname cursor (e.g. "t3_abc123") of the last post on the previous page
         
-        # Limit to max 5 posts to reduce token usage
-        limited_posts = posts[:5]
-        
-        formatted_posts = []
-        for i, post in enumerate(limited_posts):
-            # Get formatted time
-            post_time = datetime.fromtimestamp(post["created_utc"], tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-            
-            # Truncate title and content to reduce token usage
-            title = post["title"][:100] + ("..." if len(post["title"]) > 100 else "")
-            content = post["content"][:300] + ("..." if len(post["content"]) > 300 else "")
-            
-            formatted_post = (
-                f"Post {i+1}:\n"
-                f"Title: {title}\n"
-                f"Posted: {post_time}\n"
-                f"Score: {post['score']}\n"
-                f"Comments: {post['num_comments']}\n"
-                f"Content: {content}\n"
-                f"URL: {post['url']}\n"
-            )
-            formatted_posts.append(formatted_post)
+        Returns:
+            Tuple of (posts, cursor for the next page or None at the end)
         
-        result = "Reddit posts from r/Comcast_Xfinity:\n\n" + "\n\n".join(formatted_posts)
+        Raises:
+            RedditTransportError: If the page could not be fetched
+        """
+        url = f"{self.base_url}/{self.subreddit}/{sort}.json"
+        params = {"limit": limit}
+        if after:
+            params["after"] = after
+        raw = await self.transport.get_bytes(url, params=params, headers=self.headers)
+        return decode_listing(raw)
+    
+    async def fetch_posts_by_id(self, post_ids: List[str]) -> List[Post]:
+        """
+        Fetch current data for up to 100 posts in one request.
         
-        if len(posts) > 5:
-            result += f"\n\nNote: Showing 5 of {len(posts)} total posts to save token usage."
+        Args:
+            post_ids: Post ids without the "t3_" prefix
         
-        return result
+        Returns:
+            List of posts
+        
+        Raises:
+            RedditTransportError: If the posts could not be fetched
+        """
+        names = ",".join(f"t3_{post_id}" for post_id in post_ids[:100])
+        url = f"{REDDIT_BASE_URL}/by_id/{names}.json"
+        raw = await self.transport.get_bytes(url, headers=self.headers)
+        posts, _ = decode_listing(raw)
+        return posts
+    
+    async def iter_pages(
+        self, sort: str = "new", pages: int = 10, page_size: int = 100, after: Optional[str] = None
+    ) -> AsyncIterator[Tuple[List[Post], Optional[str]]]:
+        """
+        Iterate over consecutive listing pages, prefetching the next page.
+        
+        While the caller processes one page, the request for the following
+        page is already in flight, so network time overlaps with processing.
+        Only two pages are held in memory at any time.
+        
+        Args:
+            sort: Listing to page through (new, hot, top)
+            pages: Maximum number of pages to fetch
+            page_size: Posts per page (Reddit caps this at 100)
+            after: Optional cursor to start from
+        
+        Yields:
+            Tuples of (posts, cursor for the next page or None at the end)
+        
+        Raises:
+            RedditTransportError: If a page could not be fetched
+        """
+        if pages < 1:
+            return
+        pending = asyncio.ensure_future(self.fetch_listing_page(sort, page_size, after))
+        try:
+            for page_number in range(pages):
+                posts, after = await pending
+                pending = None
+                if after and page_number + 1 < pages:
+                    pending = asyncio.ensure_future(self.fetch_listing_page(sort, page_size, after))
+                yield posts, after
+                if pending is None:
+                    return
+        finally:
+            # Caller stopped early: don't leave a prefetch running
+            if pending is not None and not pending.done():
+                pending.cancel()
+    
+    async def iter_posts(
+        self, sort: str = "new", pages: int = 10, page_size: int = 100
+    ) -> AsyncIterator[Post]:
+        """
+        Iterate over posts across up to `pages` listing pages in constant memory.
+        
+        Args:
+            sort: Listing to page through (new, hot, top)
+            pages: Maximum number of pages to fetch
+            page_size: Posts per page (Reddit caps this at 100)
+        
+        Yields:
+            Posts, in listing order
+        """
+        async with aclosing(self.iter_pages(sort, pages, page_size)) as page_iter:
+            async for posts, _ in page_iter:
+                for post in posts:
+                    yield post
+    
+    async def posts_in_window(self, window_hours: float, query: Optional[str] = None) -> List[Post]:
+        """
+        Posts created within the last window_hours, optionally filtered by query.
+        
+        Read from the local post store when it has data; otherwise falls back
+        to the newest page of the live listing.
+        """
+        since = time.time() - window_hours * 3600
+        if self.store and await self.store.count(self.subreddit):
+            return await self.store.posts_since(self.subreddit, since, query)
+        
+        posts = await self.fetch_recent_posts("new", 100)
+        if self.is_error(posts):
+            return posts
+        posts = [post for post in posts if post.created_utc >= since]
+        if query:
+            terms = query.lower().split()
+            posts = [
+                post for post in posts
+                if all(term in f"{post.title} {post.content}".lower() for term in terms)
+            ]
+        return posts
+    
+    async def issue_stats(self, window_hours: float = 168, query: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Aggregate issue-category statistics over a time window.
+        
+        Args:
+            window_hours: How far back to look
+            query: Optional free-text filter applied before aggregating
+        
+        Returns:
+            Category counts, shares and example post ids, or {"error": ...}
+        """
+        posts = await self.posts_in_window(window_hours, query)
+        if self.is_error(posts):
+            return posts[0]
+        stats = aggregate_issue_stats(posts)
+        stats["window_hours"] = window_hours
+        if query:
+            stats["query"] = query
+        return stats
+    
+    async def geographic_breakdown(
+        self, window_hours: float = 168, query: Optional[str] = None, level: str = "state"
+    ) -> Dict[str, Any]:
+        """
+        Count posts per Comcast region, state or city over a time window.
+        
+        Args:
+            window_hours: How far back to look
+            query: Optional free-text filter applied before counting
+            level: "region", "state" or "city"
+        
+        Returns:
+            Per-location counts and example post ids, or {"error": ...}
+        """
+        posts = await self.posts_in_window(window_hours, query)
+        if self.is_error(posts):
+            return posts[0]
+        breakdown = geo.geographic_breakdown(posts, level=level)
+        breakdown["window_hours"] = window_hours
+        if query:
+            breakdown["query"] = query
+        return breakdown
     
-    def _extract_post_data(self, post_data: Dict[str, Any]) -> Dict[str, Any]:
+    async def fetch_comment_threads(self, posts: List[Post]) -> List[CommentThread]:
         """
-        Extract relevant data from a Reddit post.
+        Fetch condensed comment threads for several posts concurrently.
+        
+        Threads whose comment count has not changed since they were cached
+        are served without a request; at most comment_concurrency threads
+        are downloaded at the same time. Threads that fail to download are
+        left out.
         
         Args:
-            post_data: Raw post data from Reddit API
-            
+            posts: Posts whose comments to fetch
+        
         Returns:
-            Dictionary with extracted post data
-        """
-        return {
-            "title": post_data.get("title", ""),
-            "created_utc": post_data.get("created_utc", 0),
-            "score": post_data.get("score", 0),
-            "num_comments": post_data.get("num_comments", 0),
-            "content": post_data.get("selftext", "[No content]"),
-            "url": f"https://www.reddit.com{post_data.get('permalink', '')}"
-        } 
\ No newline at end of file
+            Condensed threads, in the order of posts
+        """
+        semaphore = asyncio.Semaphore(self.comment_concurrency)
+        
+        async def fetch_thread(post: Post) -> Optional[CommentThread]:
+            cached = self.comment_cache.get(post.id, post.num_comments)
+            if cached is not None:
+                return cached
+            url = f"{REDDIT_BASE_URL}/comments/{post.id}.json"
+            params = {"sort": "top", "limit": 200, "raw_json": 1}
+            try:
+                async with semaphore:
+                    payload = await self.transport.get_json(url, params=params, headers=self.headers)
+                thread = decode_thread(payload)
+            except (RedditTransportError, ValueError) as e:
+                log.warning("comment_fetch_failed", post_id=post.id, error=str(e))
+                return None
+            self.comment_cache.put(post.num_comments, thread)
+            return thread
+        
+        threads = await asyncio.gather(*(fetch_thread(post) for post in posts))
+        return [thread for thread in threads if thread is not None]
+    
+    async def fetch_comments(
+        self, post_ids: Optional[List[str]] = None, query: Optional[str] = None, max_posts: int = 5
+    ) -> List[Any]:
+        """
+        Condensed comment threads for given posts or for the most-discussed matches of a query.
+        
+        Args:
+            post_ids: Post ids, "t3_" fullnames or post URLs
+            query: Search terms used when no post ids are given
+            max_posts: Maximum number of threads to return
+        
+        Returns:
+            List of CommentThread, or a single {"error": ...} dict on failure
+        """
+        if post_ids:
+            ids = [post_id for post_id in (parse_post_id(value) for value in post_ids) if post_id]
+            if not ids:
+                return [{"error": "No valid post ids given"}]
+            try:
+                # One request refreshes every post's comment count for the cache check
+                posts = await self.fetch_posts_by_id(list(dict.fromkeys(ids))[:max_posts])
+            except RedditTransportError as e:
+                return [{"error": f"Error fetching posts: {e.status or str(e)}"}]
+        elif query:
+            posts = await self.search_subreddit(query, 25)
+            if self.is_error(posts):
+                return posts
+            posts = heapq.nlargest(
+                max_posts, (post for post in posts if post.num_comments > 0), key=lambda post: post.num_comments
+            )
+        else:
+            return [{"error": "Either post_ids or query is required"}]
+        
+        return await self.fetch_comment_threads(posts)
+    
+    def format_posts_for_analysis(
+        self, posts: List[Post], query: Optional[str] = None, token_budget: int = DEFAULT_TOKEN_BUDGET
+    ) -> str:
+        """
+        Format posts for analysis by OpenAI.
+        
+        Near-duplicate posts are collapsed into one representative with a
+        "+N similar posts" count, then ranked by relevance to query, score and
+        recency, and packed as compact summaries until the token budget is used up.
+        
+        Args:
+            posts: Posts returned by a fetch or search
+            query: The user's question or search terms, used for ranking
+            token_budget: Maximum estimated prompt tokens for the post summaries
+        """
+        if not posts:
+            return "No posts found."
+        
+        if self.is_error(posts):
+            return f"Error: {posts[0]['error']}"
+        
+        summaries, omitted = pack_posts(posts, token_budget, query)
+        result = f"Reddit posts from r/{self.subreddit}:\n\n" + "\n\n".join(summaries)
+        
+        if omitted:
+            result += (
+                f"\n\nNote: Showing the {len(summaries)} most relevant of {len(posts)} posts "
+                f"(after grouping similar posts) to fit the token budget."
+            )
+        
+        return result
+    
+    def _spend_budget(self) -> bool:
+        return self.request_budget is None or self.request_budget.try_acquire()
+    
+    @staticmethod
+    def is_error(posts: List[Any]) -> bool:
+        """Whether a fetch result is the single {"error": ...} failure marker."""
+        return bool(posts) and isinstance(posts[0], dict) and "error" in posts[0]
+    
+    @classmethod
+    def _is_cacheable(cls, posts: List[Any]) -> bool:
+        """Only cache successful listings, never error results."""
+        return not cls.is_error(posts)
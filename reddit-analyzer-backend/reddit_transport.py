@@ -0,0 +1,309 @@
+"""
+Shared HTTP transport for talking to Reddit.
+
+This module provides a long-lived, pooled aiohttp session that is opened
+once for the lifetime of the FastAPI app and shared by every RedditAnalyzer
+call. It keeps connections alive, caches DNS lookups, caps concurrent
+connections per host, follows Reddit's rate-limit headers and retries
+throttled or failed requests with jittered exponential backoff.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import aiohttp
+
+from telemetry import REGISTRY, span
+
+# Status codes worth retrying: throttling and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+REDDIT_RETRIES = REGISTRY.counter(
+    "reddit_analyzer_reddit_retries_total", "Reddit requests retried, by HTTP status or network", ["reason"]
+)
+
+
+class RedditTransportError(Exception):
+    """Raised when a Reddit request fails after all retries."""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class RequestBudget:
+    """
+    Token bucket capping upstream requests shared by several callers.
+
+    Holds up to `capacity` requests and refills continuously at
+    capacity / window requests per second. Callers that find the bucket
+    empty are expected to skip the request rather than wait for it.
+    """
+
+    def __init__(self, capacity: int = 30, window: float = 60.0):
+        """
+        Initialize a full bucket.
+
+        Args:
+            capacity: Maximum burst of requests
+            window: Seconds to refill an empty bucket completely
+        """
+        self.capacity = capacity
+        self.window = window
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self.granted = 0
+        self.denied = 0
+
+    @classmethod
+    def from_env(cls) -> "RequestBudget":
+        """Build a budget using FANOUT_REQUEST_BUDGET and FANOUT_BUDGET_WINDOW."""
+        return cls(
+            capacity=int(os.getenv("FANOUT_REQUEST_BUDGET", "30")),
+            window=float(os.getenv("FANOUT_BUDGET_WINDOW", "60")),
+        )
+
+    def try_acquire(self) -> bool:
+        """Take one request from the budget if any is left."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.capacity / self.window)
+        self._updated = now
+        if self._tokens < 1:
+            self.denied += 1
+            return False
+        self._tokens -= 1
+        self.granted += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": int(self._tokens),
+            "capacity": self.capacity,
+            "granted": self.granted,
+            "denied": self.denied,
+        }
+
+
+class RedditTransport:
+    """
+    A pooled, rate-limit-aware HTTP client for the Reddit JSON API.
+
+    The transport owns a single aiohttp.ClientSession. Call start() when the
+    app boots and close() when it shuts down; if start() was never called the
+    session is opened lazily on the first request.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_per_host: int = 8,
+        dns_cache_ttl: int = 300,
+        keepalive_timeout: float = 30.0,
+        request_timeout: float = 15.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        low_water: int = 5,
+    ):
+        """
+        Initialize the transport configuration.
+
+        Args:
+            max_connections: Total size of the connection pool
+            max_per_host: Maximum concurrent connections to a single host
+            dns_cache_ttl: Seconds to cache DNS lookups
+            keepalive_timeout: Seconds to keep idle connections open
+            request_timeout: Total timeout for a single request attempt
+            max_retries: Retries after the first attempt for 429/5xx/network errors
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound on a single backoff delay
+            low_water: Remaining-request count below which requests are paced
+                across the rest of the rate-limit window
+        """
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.dns_cache_ttl = dns_cache_ttl
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.low_water = low_water
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_lock = asyncio.Lock()
+        self._budget_lock = asyncio.Lock()
+
+        # Rate-limit budget as last reported by Reddit
+        self.ratelimit_remaining: Optional[float] = None
+        self.ratelimit_reset_at: float = 0.0
+        self._next_slot: float = 0.0
+
+    @classmethod
+    def from_env(cls) -> "RedditTransport":
+        """Build a transport using REDDIT_* environment variables."""
+        return cls(
+            max_connections=int(os.getenv("REDDIT_MAX_CONNECTIONS", "20")),
+            max_per_host=int(os.getenv("REDDIT_MAX_PER_HOST", "8")),
+            request_timeout=float(os.getenv("REDDIT_REQUEST_TIMEOUT", "15")),
+            max_retries=int(os.getenv("REDDIT_MAX_RETRIES", "3")),
+        )
+
+    async def start(self) -> None:
+        """Open the pooled session if it is not already open."""
+        async with self._session_lock:
+            if self._session is None or self._session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.max_per_host,
+                    ttl_dns_cache=self.dns_cache_ttl,
+                    keepalive_timeout=self.keepalive_timeout,
+                )
+                self._session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                )
+
+    async def close(self) -> None:
+        """Close the pooled session and release its connections."""
+        async with self._session_lock:
+            if self._session is not None and not self._session.closed:
+                await self._session.close()
+            self._session = None
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        """
+        GET a URL and decode the JSON body, retrying transient failures.
+
+        Args:
+            url: Absolute URL to fetch
+            params: Optional query string parameters
+            headers: Optional request headers
+
+        Returns:
+            The decoded JSON payload
+
+        Raises:
+            RedditTransportError: If the request fails after all retries or
+                returns a non-retryable error status
+        """
+        return json.loads(await self.get_bytes(url, params=params, headers=headers))
+
+    async def get_bytes(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> bytes:
+        """
+        GET a URL and return the raw response body, retrying transient failures.
+
+        Use this with a specialised decoder (see reddit_models.decode_listing)
+        to avoid decoding fields that are thrown away.
+
+        Raises:
+            RedditTransportError: If the request fails after all retries or
+                returns a non-retryable error status
+        """
+        with span("reddit_fetch"):
+            return await self._get_bytes(url, params, headers)
+
+    async def _get_bytes(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]],
+        headers: Optional[Dict[str, str]],
+    ) -> bytes:
+        if self._session is None or self._session.closed:
+            await self.start()
+
+        last_error = "unknown error"
+        last_status = None
+        for attempt in range(self.max_retries + 1):
+            await self._wait_for_budget()
+            retry_after = None
+            try:
+                async with self._session.get(url, params=params, headers=headers) as response:
+                    self._update_budget(response.headers)
+                    if response.status == 200:
+                        return await response.read()
+
+                    last_status = response.status
+                    last_error = f"HTTP {response.status}"
+                    if response.status not in RETRYABLE_STATUSES:
+                        raise RedditTransportError(last_error, status=response.status)
+                    retry_after = self._parse_retry_after(response.headers)
+            except RedditTransportError:
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_status = None
+                last_error = str(e) or e.__class__.__name__
+
+            if attempt < self.max_retries:
+                REDDIT_RETRIES.inc(reason=str(last_status or "network"))
+                await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+        raise RedditTransportError(last_error, status=last_status)
+
+    def _backoff_delay(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when given."""
+        cap = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def _wait_for_budget(self) -> None:
+        """Delay the next request so we stay inside Reddit's rate-limit window."""
+        async with self._budget_lock:
+            now = time.monotonic()
+            delay = 0.0
+
+            if self.ratelimit_remaining is not None and now < self.ratelimit_reset_at:
+                window_left = self.ratelimit_reset_at - now
+                if self.ratelimit_remaining < 1:
+                    # Budget exhausted: wait for the window to reset
+                    delay = window_left
+                elif self.ratelimit_remaining <= self.low_water:
+                    # Running low: spread what is left over the rest of the window
+                    interval = window_left / self.ratelimit_remaining
+                    delay = max(0.0, self._next_slot - now)
+                    self._next_slot = max(now, self._next_slot) + interval
+                self.ratelimit_remaining = max(0.0, self.ratelimit_remaining - 1)
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _update_budget(self, headers) -> None:
+        """Record the X-Ratelimit-Remaining/Reset values from a response."""
+        remaining = headers.get("X-Ratelimit-Remaining")
+        reset = headers.get("X-Ratelimit-Reset")
+        try:
+            if remaining is not None:
+                self.ratelimit_remaining = float(remaining)
+            if reset is not None:
+                self.ratelimit_reset_at = time.monotonic() + float(reset)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _parse_retry_after(headers) -> Optional[float]:
+        """Read a Retry-After (or X-Ratelimit-Reset) delay in seconds."""
+        for header in ("Retry-After", "X-Ratelimit-Reset"):
+            value = headers.get(header)
+            if value is None:
+                continue
+            try:
+                return float(value)
+            except ValueError:
+                continue
+        return None
@@ -0,0 +1,192 @@
+"""
+Server-side conversation sessions for the AG-UI endpoint.
+
+Without sessions every client turn resends the whole conversation,
+including earlier tool results, so prompts grow with every question. This
+module keeps each conversation on the server: clients send only their new
+message, and after every turn the stored history is compacted to a token
+ceiling. Bulky tool results from older turns are reduced to a short
+summary first; if that is not enough the oldest turns are dropped and
+remembered only as a one-line list of what the user asked.
+"""
+
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from context_packer import estimate_tokens
+
+COMPACTED_PREFIX = "[Compacted tool result]"
+EARLIER_TURNS_PREFIX = "Earlier in this conversation the user asked:"
+# Headline lines of tool results worth keeping in a compacted summary
+SUMMARY_LINE_PREFIXES = ("Reddit posts from", "Posts from", "Post ", "Thread ")
+SUMMARY_LINES = 6
+SUMMARY_CHARS = 300
+
+
+class Session:
+    """History of one conversation."""
+
+    __slots__ = ("id", "messages", "created_at", "updated_at", "busy")
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.messages: List[Dict[str, Any]] = []
+        self.created_at = self.updated_at = time.time()
+        self.busy = False
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Estimated prompt tokens of one chat message, including its tool calls."""
+    tokens = estimate_tokens(str(message.get("content") or "")) + 4
+    for call in message.get("tool_calls") or []:
+        tokens += estimate_tokens(call["function"]["name"] + call["function"]["arguments"]) + 4
+    return tokens
+
+
+def split_turns(messages: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """Group messages into turns, each starting at a user message."""
+    turns: List[List[Dict[str, Any]]] = []
+    for message in messages:
+        if message.get("role") == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def summarize_tool_result(content: str) -> str:
+    """Short stand-in for a tool result: its headline lines or its opening."""
+    if content.startswith(COMPACTED_PREFIX):
+        return content
+    lines = [line for line in content.splitlines() if line.startswith(SUMMARY_LINE_PREFIXES)]
+    summary = "\n".join(lines[:SUMMARY_LINES]) if lines else content[:SUMMARY_CHARS]
+    return f"{COMPACTED_PREFIX} {summary}\n(Full result dropped; call the tool again for details.)"
+
+
+def compact_history(
+    messages: List[Dict[str, Any]], token_ceiling: int, keep_recent_turns: int = 2
+) -> List[Dict[str, Any]]:
+    """
+    Shrink a conversation to at most token_ceiling estimated tokens.
+
+    Tool results outside the most recent keep_recent_turns turns are
+    summarized first. If the history is still too large, whole turns are
+    dropped oldest first (never the latest turn), so every assistant
+    tool call keeps its matching tool results.
+
+    Returns:
+        The compacted message list; the input is not modified
+    """
+    turns = split_turns(messages)
+    earlier_questions: List[str] = []
+    if turns and turns[0][0].get("role") == "system" and turns[0][0].get("content", "").startswith(EARLIER_TURNS_PREFIX):
+        earlier_questions.append(turns.pop(0)[0]["content"][len(EARLIER_TURNS_PREFIX):].strip())
+
+    for turn in turns[:-keep_recent_turns] if keep_recent_turns else turns:
+        for i, message in enumerate(turn):
+            if message.get("role") == "tool":
+                turn[i] = {**message, "content": summarize_tool_result(str(message.get("content") or ""))}
+
+    def total() -> int:
+        return sum(message_tokens(message) for turn in turns for message in turn)
+
+    while len(turns) > 1 and total() > token_ceiling:
+        dropped = turns.pop(0)
+        question = str(dropped[0].get("content") or "") if dropped[0].get("role") == "user" else ""
+        if question:
+            earlier_questions.append(" ".join(question.split())[:120])
+
+    compacted = [message for turn in turns for message in turn]
+    if earlier_questions:
+        note = f"{EARLIER_TURNS_PREFIX} " + "; ".join(earlier_questions[-10:])
+        compacted.insert(0, {"role": "system", "content": note})
+    return compacted
+
+
+class SessionStore:
+    """
+    Bounded in-memory session store with idle expiry and LRU eviction.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        idle_ttl: float = 3600.0,
+        token_ceiling: int = 4000,
+        keep_recent_turns: int = 2,
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            max_sessions: Sessions kept before the least recently used is evicted
+            idle_ttl: Seconds of inactivity after which a session expires
+            token_ceiling: Maximum estimated tokens of a session's stored history
+            keep_recent_turns: Recent turns whose tool results are kept in full
+        """
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.token_ceiling = token_ceiling
+        self.keep_recent_turns = keep_recent_turns
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.evictions = 0
+        self.compactions = 0
+
+    @classmethod
+    def from_env(cls) -> "SessionStore":
+        """Build a store using SESSION_* environment variables."""
+        return cls(
+            max_sessions=int(os.getenv("SESSION_MAX_SESSIONS", "1000")),
+            idle_ttl=float(os.getenv("SESSION_IDLE_TTL", "3600")),
+            token_ceiling=int(os.getenv("SESSION_TOKEN_CEILING", "4000")),
+        )
+
+    def create(self) -> Session:
+        """Start an empty session."""
+        self._expire()
+        session = Session(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+        return session
+
+    def get(self, session_id: str) -> Optional[Session]:
+        """The session with this id, or None if unknown or expired."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        if time.time() - session.updated_at > self.idle_ttl:
+            del self._sessions[session_id]
+            return None
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    def record_turn(self, session: Session, user_message: Dict[str, Any], turn_messages: List[Dict[str, Any]]) -> None:
+        """Append a finished turn to the session and compact its history."""
+        history = session.messages + [user_message] + turn_messages
+        compacted = compact_history(history, self.token_ceiling, self.keep_recent_turns)
+        if compacted != history:
+            self.compactions += 1
+        session.messages = compacted
+        session.updated_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        self._expire()
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "evictions": self.evictions,
+            "compactions": self.compactions,
+            "token_ceiling": self.token_ceiling,
+        }
+
+    def _expire(self) -> None:
+        cutoff = time.time() - self.idle_ttl
+        for session_id in [sid for sid, session in self._sessions.items() if session.updated_at < cutoff and not session.busy]:
+            del self._sessions[session_id]
@@ -0,0 +1,671 @@
+"""
+Append-only snapshots of posts and cached listings.
+
+A restarted process used to start cold: an empty listing cache (and, with
+an ephemeral POST_STORE_PATH, an empty post store), so the first users
+after a deploy paid full upstream latency. This module periodically dumps
+new posts and changed listing-cache entries to a snapshot and loads it at
+startup to pre-warm the store and cache before the first request.
+
+A snapshot is two append-only files:
+
+- ``<path>`` holds zlib-compressed JSON records (a batch of posts, or one
+  listing response with the time it was fetched).
+- ``<path>.idx`` is a memory-mapped array of fixed-size entries (key hash,
+  kind, write time, offset, length, crc32) pointing into the data file.
+
+Both files start with the same random generation stamp. Loading walks the
+index once, keeps only the newest record per listing key and skips entries
+that are truncated or fail their checksum, so a crash mid-append costs at
+most the last flush. Compaction swaps in the new index before the new data
+file; a reader that finds the stamps disagree finishes the interrupted swap
+from the leftover data file instead of discarding the snapshot. The same files can be served by
+ReplayTransport as a deterministic, offline stand-in for Reddit.
+"""
+
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Hashable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from listing_cache import ListingCache
+from post_store import PostStore
+from reddit_models import REDDIT_URL, Post
+from reddit_transport import RedditTransportError
+from telemetry import get_logger
+
+log = get_logger("snapshot")
+
+DATA_MAGIC = b"RASNAP2\n"
+INDEX_MAGIC = b"RAIDX02\n"
+GENERATION_SIZE = 16
+# Magic plus generation stamp, the same length for both files
+HEADER_SIZE = len(DATA_MAGIC) + GENERATION_SIZE
+# key hash, kind, written_at (unix time), data offset, data length, crc32 of the data
+INDEX_ENTRY = struct.Struct("<16sB3xdQII")
+
+KIND_POSTS = 1
+KIND_LISTING = 2
+
+
+def _key_hash(key: Any) -> bytes:
+    return hashlib.blake2b(json.dumps(key).encode("utf-8"), digest_size=16).digest()
+
+
+def _encode_posts(posts: List[Post]) -> List[Dict[str, Any]]:
+    return [post.to_dict() for post in posts]
+
+
+def _decode_posts(items: List[Dict[str, Any]]) -> List[Post]:
+    return [Post(**item) for item in items]
+
+
+@dataclass
+class Snapshot:
+    """Contents of a snapshot after replaying every record in order."""
+
+    # subreddit -> post id -> newest copy of the post
+    posts: Dict[str, Dict[str, Post]] = field(default_factory=dict)
+    # listing cache key -> (posts, unix time the listing was fetched)
+    listings: Dict[Tuple, Tuple[List[Post], float]] = field(default_factory=dict)
+    # index entries skipped because their data was missing or corrupt
+    skipped: int = 0
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    """Read-only map of path, or None if it is missing or empty."""
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def _read_header(path: str, magic: bytes) -> Optional[bytes]:
+    """Generation stamp of a snapshot file, or None if it is missing or not a snapshot file."""
+    try:
+        with open(path, "rb") as f:
+            header = f.read(HEADER_SIZE)
+    except FileNotFoundError:
+        return None
+    if len(header) < HEADER_SIZE or not header.startswith(magic):
+        return None
+    return header[len(magic):]
+
+
+def _recover(path: str) -> bool:
+    """
+    Make sure the data file and index belong together.
+
+    compact() replaces the index first, so a crash before the data file is
+    replaced leaves the new index next to the old data while the new data
+    is still at path + ".tmp". That swap is completed here.
+
+    Returns:
+        Whether the data file and index now match (False if they are
+        missing or from different generations with nothing to recover)
+    """
+    data_generation = _read_header(path, DATA_MAGIC)
+    index_generation = _read_header(path + ".idx", INDEX_MAGIC)
+    if index_generation is None or data_generation == index_generation:
+        return index_generation is not None
+    if _read_header(path + ".tmp", DATA_MAGIC) == index_generation:
+        os.replace(path + ".tmp", path)
+        log.info("snapshot_compaction_recovered", path=path)
+        return True
+    log.warning("snapshot_generation_mismatch", path=path)
+    return False
+
+
+def iter_records(path: str) -> Iterator[Tuple[int, bytes, float, Dict[str, Any]]]:
+    """
+    Yield the valid records of a snapshot in write order.
+
+    Args:
+        path: Snapshot data file; the index is read from path + ".idx"
+
+    Yields:
+        Tuples of (kind, key hash, written_at, decoded payload). Entries
+        whose data is truncated or fails its checksum yield a payload of None.
+    """
+    if not _recover(path):
+        return
+    index = _map(path + ".idx")
+    data = _map(path)
+    if index is None or data is None:
+        return
+    try:
+        # A partially written trailing entry is ignored
+        end = HEADER_SIZE + (len(index) - HEADER_SIZE) // INDEX_ENTRY.size * INDEX_ENTRY.size
+        for position in range(HEADER_SIZE, end, INDEX_ENTRY.size):
+            digest, kind, written_at, offset, length, crc = INDEX_ENTRY.unpack_from(index, position)
+            payload = None
+            if offset + length <= len(data):
+                blob = data[offset:offset + length]
+                if zlib.crc32(blob) == crc:
+                    try:
+                        payload = json.loads(zlib.decompress(blob))
+                    except (zlib.error, ValueError):
+                        payload = None
+            yield kind, digest, written_at, payload
+    finally:
+        index.close()
+        data.close()
+
+
+def load_snapshot(path: str, max_posts: Optional[int] = None) -> Snapshot:
+    """
+    Replay a snapshot into memory.
+
+    Args:
+        path: Snapshot data file
+        max_posts: Keep only this many of the newest posts per subreddit
+
+    Returns:
+        The posts and newest listing per cache key
+    """
+    snapshot = Snapshot()
+    newest: Dict[bytes, Dict[str, Any]] = {}
+    for kind, digest, _, payload in iter_records(path):
+        if payload is None:
+            snapshot.skipped += 1
+        elif kind == KIND_POSTS:
+            posts = snapshot.posts.setdefault(payload["subreddit"], {})
+            for post in _decode_posts(payload["posts"]):
+                posts[post.id] = post
+        elif kind == KIND_LISTING:
+            # Later records for the same key supersede earlier ones; decode only the survivors
+            newest[digest] = payload
+    for payload in newest.values():
+        snapshot.listings[tuple(payload["key"])] = (_decode_posts(payload["posts"]), payload["fetched_at"])
+    if max_posts is not None:
+        for subreddit, posts in snapshot.posts.items():
+            if len(posts) > max_posts:
+                keep = sorted(posts.values(), key=lambda post: post.created_utc, reverse=True)[:max_posts]
+                snapshot.posts[subreddit] = {post.id: post for post in keep}
+    return snapshot
+
+
+class SnapshotWriter:
+    """Appends records to a snapshot, creating its files on first use."""
+
+    def __init__(self, path: str):
+        """
+        Initialize the writer.
+
+        Args:
+            path: Snapshot data file; the index is written to path + ".idx"
+        """
+        self.path = path
+
+    def append(self, records: List[Tuple[int, Any, Dict[str, Any]]]) -> int:
+        """
+        Append records and flush them to disk.
+
+        Data is written and synced before the index entries that point at
+        it, so a reader never sees an index entry for data not on disk. A
+        data file and index that do not belong together are started afresh.
+
+        Args:
+            records: Tuples of (kind, key, JSON-serializable payload)
+
+        Returns:
+            Bytes appended to the data file
+        """
+        if not records:
+            return 0
+        now = time.time()
+        entries = []
+        fresh = not _recover(self.path)
+        with open(self.path, "wb" if fresh else "ab") as data:
+            if fresh:
+                generation = os.urandom(GENERATION_SIZE)
+                data.write(DATA_MAGIC + generation)
+            offset = data.tell()
+            start = offset
+            for kind, key, payload in records:
+                blob = zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 6)
+                data.write(blob)
+                entries.append(INDEX_ENTRY.pack(_key_hash(key), kind, now, offset, len(blob), zlib.crc32(blob)))
+                offset += len(blob)
+            data.flush()
+            os.fsync(data.fileno())
+        with open(self.path + ".idx", "wb" if fresh else "ab") as index:
+            if fresh:
+                index.write(INDEX_MAGIC + generation)
+            # Drop a partial entry left by an interrupted append so new entries stay aligned
+            misaligned = (index.tell() - HEADER_SIZE) % INDEX_ENTRY.size
+            if misaligned:
+                index.truncate(index.tell() - misaligned)
+            index.write(b"".join(entries))
+            index.flush()
+            os.fsync(index.fileno())
+        return offset - start
+
+
+def compact(path: str, max_posts: Optional[int] = None, max_age: Optional[float] = None) -> Snapshot:
+    """
+    Rewrite a snapshot keeping only live records.
+
+    Superseded listings, listings older than max_age and all but the newest
+    max_posts posts per subreddit are dropped. The new files are written
+    next to the old ones and swapped in with os.replace, index first; see
+    _recover for finishing a swap interrupted between the two.
+
+    Returns:
+        The compacted contents
+    """
+    snapshot = load_snapshot(path, max_posts)
+    if max_age is not None:
+        cutoff = time.time() - max_age
+        snapshot.listings = {
+            key: entry for key, entry in snapshot.listings.items() if entry[1] >= cutoff
+        }
+    writer = SnapshotWriter(path + ".tmp")
+    for leftover in (writer.path, writer.path + ".idx"):
+        if os.path.exists(leftover):
+            os.remove(leftover)
+    writer.append(_records(snapshot.posts, snapshot.listings))
+    os.replace(writer.path + ".idx", path + ".idx")
+    os.replace(writer.path, path)
+    return snapshot
+
+
+def _records(
+    posts: Dict[str, Dict[str, Post]], listings: Dict[Tuple, Tuple[List[Post], float]]
+) -> List[Tuple[int, Any, Dict[str, Any]]]:
+    records = [
+        (KIND_POSTS, ["posts", subreddit], {"subreddit": subreddit, "posts": _encode_posts(list(by_id.values()))})
+        for subreddit, by_id in posts.items()
+        if by_id
+    ]
+    records.extend(
+        (KIND_LISTING, list(key), {"key": list(key), "fetched_at": fetched_at, "posts": _encode_posts(value)})
+        for key, (value, fetched_at) in listings.items()
+    )
+    return records
+
+
+class SnapshotManager:
+    """
+    Keeps a snapshot of one subreddit's stored posts and the listing cache.
+
+    Register on_posts as a PostStore listener, call warm() once at startup,
+    then start() to flush on an interval and stop() on shutdown for a final
+    flush.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        subreddit: str,
+        cache: ListingCache,
+        store: Optional[PostStore] = None,
+        interval: float = 300.0,
+        max_age: float = 3600.0,
+        max_posts: int = 10000,
+        compact_after: int = 2000,
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            path: Snapshot data file
+            subreddit: Subreddit whose stored posts are snapshotted
+            cache: Listing cache to dump and pre-warm
+            store: Post store to restore posts into when it is empty
+            interval: Seconds between periodic flushes
+            max_age: Listings fetched longer ago than this are not restored
+            max_posts: Newest posts per subreddit kept when loading or compacting
+            compact_after: Index entries after which a flush compacts the snapshot
+        """
+        self.path = path
+        self.subreddit = subreddit
+        self.cache = cache
+        self.store = store
+        self.interval = interval
+        self.max_age = max_age
+        self.max_posts = max_posts
+        self.compact_after = compact_after
+
+        self._writer = SnapshotWriter(path)
+        self._lock = asyncio.Lock()
+        self._pending: Dict[str, Post] = {}
+        # Cache key -> fetched_at of the copy already in the snapshot
+        self._dumped: Dict[Hashable, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+        self.flushes = 0
+        self.compactions = 0
+        self.bytes_written = 0
+        self.last_warm: Dict[str, Any] = {}
+
+    @classmethod
+    def from_env(
+        cls, subreddit: str, cache: ListingCache, store: Optional[PostStore] = None
+    ) -> Optional["SnapshotManager"]:
+        """Build a manager from SNAPSHOT_* environment variables, or None if SNAPSHOT_PATH is unset."""
+        path = os.getenv("SNAPSHOT_PATH")
+        if not path:
+            return None
+        return cls(
+            path=path,
+            subreddit=subreddit,
+            cache=cache,
+            store=store,
+            interval=float(os.getenv("SNAPSHOT_INTERVAL", "300")),
+            max_age=float(os.getenv("SNAPSHOT_MAX_AGE", "3600")),
+            max_posts=int(os.getenv("SNAPSHOT_MAX_POSTS", "10000")),
+        )
+
+    def on_posts(self, posts: List[Post]) -> None:
+        """PostStore listener: queue written posts for the next flush."""
+        for post in posts:
+            self._pending[post.id] = post
+
+    async def warm(self) -> Dict[str, Any]:
+        """
+        Load the snapshot into the post store and listing cache.
+
+        Posts are restored only into an empty store and without notifying
+        listeners; full-text indexing makes this the slow part, at roughly
+        40µs per post. Listings are restored with their real age, capped at the
+        cache TTL so an old listing is served immediately but refreshed in
+        the background on first use.
+
+        Returns:
+            Counts of what was restored and how long it took
+        """
+        started = time.perf_counter()
+        snapshot = await asyncio.to_thread(load_snapshot, self.path, self.max_posts)
+        loaded = time.perf_counter()
+
+        restored_posts = 0
+        posts = list(snapshot.posts.get(self.subreddit, {}).values())
+        if posts and self.store is not None and await self.store.count(self.subreddit) == 0:
+            restored_posts = await self.store.upsert_posts(self.subreddit, posts, notify=False)
+
+        restored_listings = 0
+        now = time.time()
+        for key, (value, fetched_at) in snapshot.listings.items():
+            age = now - fetched_at
+            if age > self.max_age:
+                continue
+            self.cache.put(key, value, age=min(age, self.cache.ttl))
+            self._dumped[key] = fetched_at
+            restored_listings += 1
+
+        self.last_warm = {
+            "posts": restored_posts,
+            "listings": restored_listings,
+            "skipped_records": snapshot.skipped,
+            "load_ms": round((loaded - started) * 1000, 1),
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        log.info("snapshot_warm", path=self.path, **self.last_warm)
+        return self.last_warm
+
+    async def flush(self) -> int:
+        """
+        Append queued posts and new or refreshed listings to the snapshot.
+
+        Returns:
+            Number of records written
+        """
+        async with self._lock:
+            posts, self._pending = self._pending, {}
+            listings = {}
+            now = time.time()
+            for key, value, age in self.cache.items():
+                if not self._snapshottable(key, value):
+                    continue
+                fetched_at = now - age
+                # Ages are recomputed from the monotonic clock, so allow for drift
+                if abs(self._dumped.get(key, 0.0) - fetched_at) < 1.0:
+                    continue
+                listings[key] = (value, fetched_at)
+            records = _records({self.subreddit: posts}, listings)
+            if not records:
+                return 0
+            # The file writes run in a thread that cancellation cannot stop, so a cancelled
+            # flush still waits for them before releasing the lock to the next writer
+            write = asyncio.ensure_future(self._write(records, posts, listings))
+            try:
+                return await asyncio.shield(write)
+            except asyncio.CancelledError:
+                await write
+                raise
+
+    async def _write(
+        self,
+        records: List[Tuple[int, Any, Dict[str, Any]]],
+        posts: Dict[str, Post],
+        listings: Dict[Hashable, Tuple[List[Post], float]],
+    ) -> int:
+        """Append records (compacting if the index has grown) and update the bookkeeping."""
+        try:
+            self.bytes_written += await asyncio.to_thread(self._writer.append, records)
+        except OSError as e:
+            # Keep the posts for the next attempt; listings are rediscovered from the cache
+            for post_id, post in posts.items():
+                self._pending.setdefault(post_id, post)
+            log.warning("snapshot_flush_failed", path=self.path, error=str(e))
+            return 0
+        for key, (_, fetched_at) in listings.items():
+            self._dumped[key] = fetched_at
+        self.flushes += 1
+        if os.path.getsize(self.path + ".idx") > HEADER_SIZE + self.compact_after * INDEX_ENTRY.size:
+            await asyncio.to_thread(compact, self.path, self.max_posts, self.max_age)
+            self.compactions += 1
+        log.debug("snapshot_flush", path=self.path, records=len(records), posts=len(posts), listings=len(listings))
+        return len(records)
+
+    def start(self) -> None:
+        """Start flushing every interval seconds in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        """Stop the periodic flushes, wait for one in progress, then flush what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def run(self) -> None:
+        """Flush every interval seconds until cancelled."""
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                log.exception("snapshot_flush_error", path=self.path)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "pending_posts": len(self._pending),
+            "flushes": self.flushes,
+            "compactions": self.compactions,
+            "bytes_written": self.bytes_written,
+            "last_warm": self.last_warm,
+        }
+
+    @staticmethod
+    def _snapshottable(key: Hashable, value: Any) -> bool:
+        """Only listing-shaped entries: a tuple key of plain values and a list of posts."""
+        return (
+            isinstance(key, tuple)
+            and all(part is None or isinstance(part, (str, int, float)) for part in key)
+            and isinstance(value, list)
+            and all(isinstance(post, Post) for post in value)
+        )
+
+
+class ReplayTransport:
+    """
+    Serves Reddit listing, search and by_id requests from a snapshot.
+
+    A drop-in replacement for RedditTransport for offline tests and
+    reproducible runs: the same snapshot always produces the same
+    responses. Requests are answered from the recorded listing with the
+    same cache key, then from a recorded listing of the same kind with a
+    larger limit, then by sorting and filtering the recorded posts.
+    Anything else (comment threads included) fails with a 404.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initialize the transport; the snapshot is loaded by start().
+
+        Args:
+            path: Snapshot data file
+        """
+        self.path = path
+        self.requests = 0
+        self.misses = 0
+        self._listings: Dict[Tuple, List[Post]] = {}
+        self._posts: Dict[str, Dict[str, Post]] = {}
+        self._by_id: Dict[str, Post] = {}
+
+    async def start(self) -> None:
+        snapshot = await asyncio.to_thread(load_snapshot, self.path)
+        # Subreddit names are matched case-insensitively, like Reddit does
+        self._listings = {
+            (key[0].lower(),) + tuple(key[1:]): value for key, (value, _) in snapshot.listings.items()
+        }
+        self._posts = {subreddit.lower(): posts for subreddit, posts in snapshot.posts.items()}
+        self._by_id = {}
+        for posts in list(self._posts.values()) + [
+            {post.id: post for post in value} for value in self._listings.values()
+        ]:
+            for post_id, post in posts.items():
+                self._by_id.setdefault(post_id, post)
+        log.info("replay_loaded", path=self.path, listings=len(self._listings), posts=len(self._by_id))
+
+    async def close(self) -> None:
+        pass
+
+    async def get_json(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Any:
+        return json.loads(await self.get_bytes(url, params=params, headers=headers))
+
+    async def get_bytes(
+        self,
+        url: str,
+        params: Optional[Dict[str, Any]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> bytes:
+        """
+        Answer a request from the snapshot with a Reddit-shaped listing body.
+
+        Raises:
+            RedditTransportError: With status 404 if the snapshot cannot answer
+        """
+        self.requests += 1
+        params = params or {}
+        parts = urlsplit(url).path.strip("/").split("/")
+        limit = int(params.get("limit", 25))
+
+        if len(parts) == 2 and parts[0] == "by_id":
+            names = parts[1].removesuffix(".json").split(",")
+            posts = [self._by_id[name[3:]] for name in names if name[3:] in self._by_id]
+            return self._encode(posts, None)
+
+        if len(parts) == 3 and parts[0] == "r" and parts[2].endswith(".json"):
+            subreddit = parts[1].lower()
+            sort = parts[2].removesuffix(".json")
+            if sort == "search":
+                query = str(params.get("q", "")).strip().lower()
+                posts = self._recorded(subreddit, "search", query, limit)
+                if posts is None:
+                    posts = self._search(subreddit, query)[:limit]
+                return self._encode(posts, None)
+            if sort in ("hot", "new", "top", "rising"):
+                after = params.get("after")
+                posts = None if after else self._recorded(subreddit, sort, None, limit)
+                if posts is None:
+                    return self._page(self._sorted(subreddit, sort), after, limit)
+                # Later pages continue from this post in the sorted recorded posts
+                return self._encode(posts, f"t3_{posts[-1].id}" if len(posts) == limit else None)
+
+        self.misses += 1
+        raise RedditTransportError(f"No snapshot data for {url}", status=404)
+
+    def _recorded(self, subreddit: str, sort: str, query: Optional[str], limit: int) -> Optional[List[Post]]:
+        """The recorded listing for this key, or the prefix of a larger recorded one."""
+        exact = self._listings.get((subreddit, sort, limit, query))
+        if exact is not None:
+            return exact
+        larger = [
+            value
+            for (sub, kind, size, q), value in self._listings.items()
+            if sub == subreddit and kind == sort and q == query and size > limit
+        ]
+        if not larger:
+            return None
+        return min(larger, key=len)[:limit]
+
+    def _sorted(self, subreddit: str, sort: str) -> List[Post]:
+        posts = self._posts.get(subreddit, {}).values()
+        if sort == "new":
+            return sorted(posts, key=lambda post: (-post.created_utc, post.id))
+        return sorted(posts, key=lambda post: (-post.score, post.id))
+
+    def _search(self, subreddit: str, query: str) -> List[Post]:
+        words = query.split()
+        return [
+            post
+            for post in self._sorted(subreddit, "top")
+            if all(word in f"{post.title} {post.content}".lower() for word in words)
+        ]
+
+    def _page(self, posts: List[Post], after: Optional[str], limit: int) -> bytes:
+        start = 0
+        if after:
+            ids = [f"t3_{post.id}" for post in posts]
+            start = ids.index(after) + 1 if after in ids else len(posts)
+        page = posts[start:start + limit]
+        more = start + limit < len(posts)
+        return self._encode(page, f"t3_{page[-1].id}" if page and more else None)
+
+    @staticmethod
+    def _encode(posts: List[Post], after: Optional[str]) -> bytes:
+        children = [
+            {
+                "kind": "t3",
+                "data": {
+                    "id": post.id,
+                    "title": post.title,
+                    "created_utc": post.created_utc,
+                    "score": post.score,
+                    "num_comments": post.num_comments,
+                    "selftext": post.content,
+                    "permalink": post.url[len(REDDIT_URL):] if post.url.startswith(REDDIT_URL) else post.url,
+                    "author": post.author,
+                    "link_flair_text": post.flair,
+                },
+            }
+            for post in posts
+        ]
+        return json.dumps({"kind": "Listing", "data": {"after": after, "children": children}}).encode("utf-8")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "requests": self.requests, "misses": self.misses}
@@ -0,0 +1,234 @@
+"""
+Streaming spike detection over newly ingested posts.
+
+This module keeps, for every keyword/category key, a sliding window of
+per-bucket post counts and an exponentially weighted baseline of the
+normal rate. When the window count rises well above the baseline (a
+z-score test with a Poisson floor on the variance) an alert is published to
+every connected client. All state is bounded: a fixed number of keys, a
+fixed window per key and a fixed-size set of recently seen post ids.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Set
+
+from reddit_models import Post
+
+
+class AlertBroadcaster:
+    """
+    Fan-out of alerts to connected clients.
+
+    Each subscriber gets its own bounded queue; a slow client loses its
+    oldest undelivered alerts instead of holding memory or blocking others.
+    """
+
+    def __init__(self, queue_size: int = 100, history: int = 50):
+        self.queue_size = queue_size
+        self.recent: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a client; it starts with the recent alert history."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for alert in self.recent:
+            queue.put_nowait(alert)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, alert: Dict[str, Any]) -> None:
+        """Deliver an alert to every subscriber without blocking."""
+        self.recent.append(alert)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(alert)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+class _KeyState:
+    """Sliding window and EWMA baseline for one key."""
+
+    __slots__ = ("window", "bucket", "mean", "variance", "closed_buckets", "last_alert", "examples")
+
+    def __init__(self, window_buckets: int, bucket: int):
+        self.window: Deque[int] = deque([0] * window_buckets, maxlen=window_buckets)
+        self.bucket = bucket
+        self.mean = 0.0
+        self.variance = 0.0
+        self.closed_buckets = 0
+        self.last_alert = 0.0
+        self.examples: Deque[str] = deque(maxlen=3)
+
+
+class SpikeDetector:
+    """
+    Flags keys whose recent post rate is significantly above their baseline.
+
+    Time is measured in post creation time, so a backfill of older posts
+    trains the baselines instead of triggering alerts.
+    """
+
+    def __init__(
+        self,
+        key_extractor: Callable[[Post], Iterable[str]],
+        publish: Callable[[Dict[str, Any]], None],
+        bucket_seconds: int = 300,
+        window_buckets: int = 12,
+        alpha: float = 0.02,
+        z_threshold: float = 4.0,
+        min_count: int = 5,
+        warmup_buckets: int = 48,
+        cooldown_seconds: float = 3600,
+        max_keys: int = 500,
+        max_seen_posts: int = 20000,
+    ):
+        """
+        Initialize the detector.
+
+        Args:
+            key_extractor: Returns the keys (keywords, categories, regions) of a post
+            publish: Called with each alert dictionary
+            bucket_seconds: Width of one counting bucket
+            window_buckets: Buckets in the sliding window being tested
+            alpha: EWMA smoothing factor for the per-bucket baseline
+            z_threshold: Standard deviations above baseline that count as a spike
+            min_count: Minimum posts in the window before a spike can fire
+            warmup_buckets: Closed buckets a key needs before it may alert
+            cooldown_seconds: Minimum time between alerts for the same key
+            max_keys: Keys tracked at once; least recently active are dropped
+            max_seen_posts: Recent post ids remembered to skip re-ingested posts
+        """
+        self.key_extractor = key_extractor
+        self.publish = publish
+        self.bucket_seconds = bucket_seconds
+        self.window_buckets = window_buckets
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.min_count = min_count
+        self.warmup_buckets = warmup_buckets
+        self.cooldown_seconds = cooldown_seconds
+        self.max_keys = max_keys
+        self.max_seen_posts = max_seen_posts
+
+        self._keys: "OrderedDict[str, _KeyState]" = OrderedDict()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+
+    def consume(self, posts: Iterable[Post]) -> List[Dict[str, Any]]:
+        """
+        Feed a batch of ingested posts; re-ingested posts are ignored.
+
+        Returns:
+            Alerts raised by this batch (also passed to publish)
+        """
+        fresh = [post for post in posts if isinstance(post, Post) and self._first_sighting(post.id)]
+        fresh.sort(key=lambda post: post.created_utc)
+
+        touched: Dict[str, _KeyState] = {}
+        for post in fresh:
+            bucket = int(post.created_utc // self.bucket_seconds)
+            for key in set(self.key_extractor(post)):
+                state = self._state(key, bucket)
+                self._record(state, bucket, post)
+                touched[key] = state
+
+        alerts = []
+        now = time.time()
+        for key, state in touched.items():
+            alert = self._check(key, state, now)
+            if alert:
+                alerts.append(alert)
+                self.publish(alert)
+        return alerts
+
+    def status(self) -> Dict[str, Any]:
+        """Current window counts and baselines, busiest keys first."""
+        keys = sorted(self._keys.items(), key=lambda item: sum(item[1].window), reverse=True)
+        return {
+            "tracked_keys": len(self._keys),
+            "keys": {
+                key: {
+                    "window_posts": sum(state.window),
+                    "baseline_per_window": round(state.mean * self.window_buckets, 2),
+                    "warm": state.closed_buckets >= self.warmup_buckets,
+                }
+                for key, state in keys[:20]
+            },
+        }
+
+    def _first_sighting(self, post_id: str) -> bool:
+        if post_id in self._seen:
+            return False
+        self._seen[post_id] = None
+        if len(self._seen) > self.max_seen_posts:
+            self._seen.popitem(last=False)
+        return True
+
+    def _state(self, key: str, bucket: int) -> _KeyState:
+        state = self._keys.get(key)
+        if state is None:
+            state = _KeyState(self.window_buckets, bucket)
+            self._keys[key] = state
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+        return state
+
+    def _record(self, state: _KeyState, bucket: int, post: Post) -> None:
+        if bucket > state.bucket:
+            self._advance(state, bucket)
+        offset = state.bucket - bucket
+        if offset >= self.window_buckets:
+            return  # too old for the window; already folded into the baseline
+        state.window[-1 - offset] += 1
+        state.examples.append(post.title[:100])
+
+    def _advance(self, state: _KeyState, bucket: int) -> None:
+        """Close buckets up to `bucket`, folding each into the EWMA baseline."""
+        gap = bucket - state.bucket
+        # After a long quiet gap only the most recent empty buckets matter
+        for _ in range(min(gap, self.window_buckets + self.warmup_buckets)):
+            closed = state.window[0]
+            deviation = closed - state.mean
+            state.mean += self.alpha * deviation
+            state.variance = (1 - self.alpha) * (state.variance + self.alpha * deviation * deviation)
+            state.closed_buckets += 1
+            state.window.append(0)
+        state.bucket = bucket
+
+    def _check(self, key: str, state: _KeyState, now: float) -> Optional[Dict[str, Any]]:
+        window_end = (state.bucket + 1) * self.bucket_seconds
+        if window_end < now - self.bucket_seconds:
+            return None  # historical window (e.g. during backfill)
+        if state.closed_buckets < self.warmup_buckets or now - state.last_alert < self.cooldown_seconds:
+            return None
+
+        observed = sum(state.window)
+        expected = state.mean * self.window_buckets
+        # Poisson floor: counts are never less variable than their mean
+        variance = max(state.variance, state.mean, 1.0 / self.window_buckets) * self.window_buckets
+        z_score = (observed - expected) / math.sqrt(variance)
+        if observed < self.min_count or z_score < self.z_threshold:
+            return None
+
+        state.last_alert = now
+        return {
+            "type": "SPIKE_ALERT",
+            "key": key,
+            "window_minutes": self.window_buckets * self.bucket_seconds // 60,
+            "observed_posts": observed,
+            "expected_posts": round(expected, 2),
+            "z_score": round(z_score, 2),
+            "detected_at": int(now),
+            "example_titles": list(state.examples),
+        }
@@ -0,0 +1,185 @@
+"""
+Multi-subreddit fan-out for the Reddit Analyzer.
+
+One tool call can compare r/Comcast_Xfinity with r/Xfinity, r/comcast or
+competitor subreddits. Each subreddit is served by its own RedditAnalyzer
+(sharing the pooled transport and the listing cache, whose keys include the
+subreddit), all subreddits are queried concurrently, and the per-subreddit
+result lists are combined with a k-way merge by score or recency. Requests
+that miss the cache draw from one shared RequestBudget, so querying more
+subreddits never multiplies our exposure to Reddit's rate limit.
+"""
+
+import asyncio
+import heapq
+import os
+import re
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from context_packer import pack_posts
+from reddit_models import Post
+from reddit_tools import RedditAnalyzer
+from reddit_transport import RequestBudget
+
+DEFAULT_SUBREDDITS = ["Comcast_Xfinity", "Xfinity", "comcast", "Spectrum", "ATT", "verizon"]
+
+SUBREDDIT_RE = re.compile(r"^[A-Za-z0-9_]{2,21}$")
+
+# Merge orders: every per-subreddit list is sorted by the same key, largest first
+MERGE_KEYS: Dict[str, Callable[[Post], float]] = {
+    "top": lambda post: post.score,
+    "new": lambda post: post.created_utc,
+}
+
+
+class SubredditFanout:
+    """
+    Concurrent queries across several subreddits under a shared request budget.
+
+    The main subreddit is answered through a copy of the primary analyzer
+    that shares its store, transport and cache but spends from the fan-out
+    budget; other subreddits get lightweight analyzers without a store,
+    created on first use and kept in a small LRU.
+    """
+
+    def __init__(
+        self,
+        primary: RedditAnalyzer,
+        subreddits: Optional[List[str]] = None,
+        budget: Optional[RequestBudget] = None,
+        max_subreddits: int = 8,
+        max_analyzers: int = 32,
+    ):
+        """
+        Initialize the fan-out.
+
+        Args:
+            primary: Analyzer of the main subreddit; its transport and cache are shared
+            subreddits: Subreddits queried when a call does not name any
+            budget: Upstream request budget shared by all fan-out analyzers
+            max_subreddits: Maximum subreddits one call may query
+            max_analyzers: Maximum per-subreddit analyzers kept alive
+        """
+        self.primary = primary
+        self.subreddits = subreddits or DEFAULT_SUBREDDITS
+        self.budget = budget or RequestBudget()
+        self.max_subreddits = max_subreddits
+        self.max_analyzers = max_analyzers
+        self._analyzers: "OrderedDict[str, RedditAnalyzer]" = OrderedDict()
+        self._primary: Optional[RedditAnalyzer] = None
+
+    @classmethod
+    def from_env(cls, primary: RedditAnalyzer) -> "SubredditFanout":
+        """Build a fan-out over the comma-separated FANOUT_SUBREDDITS, if set."""
+        subreddits = os.getenv("FANOUT_SUBREDDITS")
+        return cls(
+            primary,
+            subreddits=[name.strip() for name in subreddits.split(",") if name.strip()] if subreddits else None,
+            budget=RequestBudget.from_env(),
+        )
+
+    def analyzer(self, subreddit: str) -> RedditAnalyzer:
+        """The analyzer serving subreddit, created on first use."""
+        if subreddit.lower() == self.primary.subreddit.lower():
+            # The primary analyzer itself has no budget (its own tool calls are not fan-out)
+            if self._primary is None:
+                self._primary = RedditAnalyzer(
+                    subreddit=self.primary.subreddit,
+                    transport=self.primary.transport,
+                    cache=self.primary.cache,
+                    store=self.primary.store,
+                    store_freshness=self.primary.store_freshness,
+                    comment_cache=self.primary.comment_cache,
+                    comment_concurrency=self.primary.comment_concurrency,
+                    request_budget=self.budget,
+                )
+            return self._primary
+        key = subreddit.lower()
+        analyzer = self._analyzers.get(key)
+        if analyzer is None:
+            analyzer = RedditAnalyzer(
+                subreddit=subreddit,
+                transport=self.primary.transport,
+                cache=self.primary.cache,
+                request_budget=self.budget,
+            )
+            self._analyzers[key] = analyzer
+            if len(self._analyzers) > self.max_analyzers:
+                self._analyzers.popitem(last=False)
+        else:
+            self._analyzers.move_to_end(key)
+        return analyzer
+
+    async def search(
+        self,
+        subreddits: Optional[Sequence[str]] = None,
+        query: Optional[str] = None,
+        sort: str = "top",
+        limit: int = 30,
+        per_subreddit: int = 25,
+    ) -> Dict[str, Any]:
+        """
+        Query several subreddits concurrently and merge the results.
+
+        Args:
+            subreddits: Subreddit names; the configured set when omitted
+            query: Search terms; without one each subreddit's listing is used
+            sort: Merge order, "top" (score) or "new" (recency)
+            limit: Maximum merged posts returned
+            per_subreddit: Posts requested from each subreddit
+
+        Returns:
+            Dictionary with merged "posts", per-subreddit "counts" and the
+            subreddits "skipped" with the reason, or {"error": ...}
+        """
+        if sort not in MERGE_KEYS:
+            return {"error": f"Unknown sort '{sort}', use 'top' or 'new'"}
+        names = list(dict.fromkeys(name.strip().removeprefix("r/") for name in (subreddits or self.subreddits)))
+        invalid = [name for name in names if not SUBREDDIT_RE.match(name)]
+        if invalid:
+            return {"error": f"Invalid subreddit names: {', '.join(invalid)}"}
+        names = names[:self.max_subreddits]
+
+        async def fetch(name: str) -> List[Any]:
+            analyzer = self.analyzer(name)
+            if query:
+                return await analyzer.search_subreddit(query, per_subreddit)
+            return await analyzer.fetch_recent_posts(sort, per_subreddit)
+
+        results = await asyncio.gather(*(fetch(name) for name in names))
+
+        key = MERGE_KEYS[sort]
+        lists, counts, skipped = [], {}, {}
+        for name, posts in zip(names, results):
+            if RedditAnalyzer.is_error(posts):
+                skipped[name] = posts[0]["error"]
+                continue
+            counts[name] = len(posts)
+            lists.append(sorted(posts, key=key, reverse=True))
+
+        merged = list(islice(heapq.merge(*lists, key=key, reverse=True), limit))
+        return {"posts": merged, "counts": counts, "skipped": skipped}
+
+
+def format_fanout(result: Dict[str, Any], query: Optional[str], token_budget: int) -> str:
+    """Render a fan-out result for the model within a token budget."""
+    if "error" in result:
+        return f"Error: {result['error']}"
+
+    counts = ", ".join(f"r/{name} ({count})" for name, count in result["counts"].items())
+    lines = [f"Posts from {counts or 'no subreddits'}. The subreddit of each post is part of its URL."]
+    if result["skipped"]:
+        lines.append("Skipped: " + "; ".join(f"r/{name}: {reason}" for name, reason in result["skipped"].items()))
+    if not result["posts"]:
+        return "\n".join(lines + ["No posts found."])
+
+    summaries, omitted = pack_posts(result["posts"], token_budget, query)
+    text = "\n".join(lines) + "\n\n" + "\n\n".join(summaries)
+    if omitted:
+        text += (
+            f"\n\nNote: Showing the {len(summaries)} most relevant of {len(result['posts'])} merged posts "
+            f"to fit the token budget."
+        )
+    return text
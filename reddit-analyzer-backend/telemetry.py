@@ -0,0 +1,391 @@
+"""
+Logging, request tracing and metrics for the Reddit Analyzer.
+
+Instrumentation used to be unconditional print calls that dumped whole
+request bodies and message arrays on every OpenAI call. This module
+replaces them with three cheap pieces:
+
+- Level-gated structured logging: get_logger() returns a logger whose
+  calls take an event name plus key/value fields and cost nothing beyond
+  a level check when the level is disabled. Output is one JSON object or
+  one key=value line per event, tagged with the current request id.
+- Spans: span("openai_call") times a stage of the current request and
+  records it into a per-stage latency histogram and the request's trace.
+- Metrics: counters, histograms and callback gauges kept in a registry
+  and rendered in the Prometheus text format for GET /metrics.
+"""
+
+import bisect
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+LOGGER_PREFIX = "reddit_analyzer"
+
+# Latency buckets in seconds, from a cached lookup to a slow OpenAI completion
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class Trace:
+    """Stages timed while handling one HTTP request."""
+
+    __slots__ = ("request_id", "spans")
+
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.spans: List[Tuple[str, float]] = []
+
+    def summary(self) -> Dict[str, float]:
+        """Total milliseconds per stage."""
+        totals: Dict[str, float] = {}
+        for stage, duration in self.spans:
+            totals[stage] = totals.get(stage, 0.0) + duration * 1000
+        return {stage: round(ms, 2) for stage, ms in totals.items()}
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+# Logging
+
+class StructuredFormatter(logging.Formatter):
+    """Formats a record as one JSON object, or as key=value pairs when json_output is False."""
+
+    def __init__(self, json_output: bool = True):
+        super().__init__()
+        self.json_output = json_output
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name.removeprefix(LOGGER_PREFIX + "."),
+            "event": record.getMessage(),
+        }
+        trace = _current_trace.get()
+        if trace is not None:
+            entry["request_id"] = trace.request_id
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+
+        if self.json_output:
+            return json.dumps(entry, default=str)
+        return " ".join(f"{key}={value if isinstance(value, (int, float)) else json.dumps(str(value))}" for key, value in entry.items())
+
+
+class StructuredLogger:
+    """
+    Thin wrapper over logging.Logger taking an event name and key/value fields.
+
+    Fields are only formatted when the level is enabled; guard anything
+    expensive to compute with enabled().
+    """
+
+    __slots__ = ("logger",)
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def enabled(self, level: int) -> bool:
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, event: str, exc_info: bool = False, **fields: Any) -> None:
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields: Any) -> None:
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields: Any) -> None:
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields: Any) -> None:
+        self.log(logging.WARNING, event, **fields)
+
+    def error(self, event: str, **fields: Any) -> None:
+        self.log(logging.ERROR, event, **fields)
+
+    def exception(self, event: str, **fields: Any) -> None:
+        """Log at ERROR level with the current exception's traceback."""
+        self.log(logging.ERROR, event, exc_info=True, **fields)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    return StructuredLogger(logging.getLogger(f"{LOGGER_PREFIX}.{name}"))
+
+
+def configure_logging(level: Optional[str] = None, log_format: Optional[str] = None) -> None:
+    """
+    Send this app's logs to stderr at LOG_LEVEL in LOG_FORMAT ("json" or "text").
+
+    Safe to call more than once; the handler is replaced, not duplicated.
+    """
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    log_format = (log_format or os.getenv("LOG_FORMAT", "json")).lower()
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_output=log_format != "text"))
+    logger = logging.getLogger(LOGGER_PREFIX)
+    logger.handlers = [handler]
+    logger.setLevel(getattr(logging, level, logging.INFO))
+    logger.propagate = False
+
+
+# Metrics
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with optional labels.
+
+    Buckets are stored non-cumulatively so observe() is one bisect and one
+    increment; render() accumulates them into Prometheus' cumulative form.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[LabelValues, List[Any]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames + ('le',), key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+GaugeValue = Union[float, Dict[str, float]]
+
+
+class CallbackGauge:
+    """
+    Gauge read from a callback at scrape time, for state that already lives
+    elsewhere (queue depths, cache sizes). The callback returns a number, or
+    a dict mapping the value of the single label to a number.
+    """
+
+    def __init__(self, name: str, help_text: str, callback: Callable[[], GaugeValue], labelname: Optional[str] = None):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.labelname = labelname
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        value = self.callback()
+        if isinstance(value, dict):
+            for label, number in sorted(value.items()):
+                if number is not None:
+                    lines.append(f"{self.name}{_labels((self.labelname,), (str(label),))} {_number(number)}")
+        elif value is not None:
+            lines.append(f"{self.name} {_number(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics rendered together in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(
+        self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def gauge(
+        self, name: str, help_text: str, callback: Callable[[], GaugeValue], labelname: Optional[str] = None
+    ) -> CallbackGauge:
+        return self._register(CallbackGauge(name, help_text, callback, labelname))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric: Any) -> Any:
+        # Re-registering (e.g. on module reload) returns the existing metric
+        return self._metrics.setdefault(metric.name, metric)
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "reddit_analyzer_stage_duration_seconds", "Time spent in each stage of request handling", ["stage"]
+)
+STAGE_ERRORS = REGISTRY.counter(
+    "reddit_analyzer_stage_errors_total", "Stages that ended with an exception", ["stage"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "reddit_analyzer_http_request_duration_seconds",
+    "HTTP request latency, until the response body has been sent",
+    ["method", "route"],
+)
+REQUESTS = REGISTRY.counter(
+    "reddit_analyzer_http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+
+_span_log = get_logger("span")
+_request_log = get_logger("http")
+
+
+# Tracing
+
+@contextmanager
+def span(stage: str, **fields: Any) -> Iterator[None]:
+    """
+    Time a stage of the current request.
+
+    The duration goes to the stage histogram and the request's trace, and
+    is logged at DEBUG with fields. Works in sync and async code alike;
+    tasks started inside a request share its trace.
+    """
+    started = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        STAGE_SECONDS.observe(duration, stage=stage)
+        if failed:
+            STAGE_ERRORS.inc(stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((stage, duration))
+        _span_log.debug("span", stage=stage, duration_ms=round(duration * 1000, 2), failed=failed, **fields)
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace is not None else None
+
+
+class RequestTelemetryMiddleware:
+    """
+    ASGI middleware giving each HTTP request a trace and request id.
+
+    Timing ends when the response body has been fully sent, so streamed
+    (SSE) responses are measured to their last event. Requests are labelled
+    with their route template (/sessions/{session_id}) to keep metric
+    cardinality bounded. The request id is taken from an incoming
+    X-Request-ID header or generated, and echoed on the response.
+    """
+
+    def __init__(self, app: Any, skip_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        request_id = _header(scope, b"x-request-id") or uuid.uuid4().hex[:16]
+        trace = Trace(request_id)
+        token = _current_trace.set(trace)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_id(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-request-id", request_id.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            duration = time.perf_counter() - started
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(duration, method=scope["method"], route=route)
+            REQUESTS.inc(method=scope["method"], route=route, status=str(status))
+            _request_log.info(
+                "request",
+                method=scope["method"],
+                route=route,
+                status=status,
+                duration_ms=round(duration * 1000, 2),
+                stages=trace.summary(),
+            )
+            _current_trace.reset(token)
+
+
+def _header(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")[:64] or None
+    return None
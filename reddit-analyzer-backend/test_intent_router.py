@@ -0,0 +1,51 @@
+import pytest
+
+from intent_router import IntentRouter
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "find out why my internet is slow",
+        "find how many outages happened this week",
+        "look at this and tell me why",
+        "search for outages and explain the trend",
+        "search for outages and why they happen",
+        "what are the most common complaints",
+    ],
+)
+def test_analysis_questions_fall_back_to_model(router, text):
+    assert router.route(text) is None
+
+
+@pytest.mark.parametrize(
+    "text, query",
+    [
+        ("search for modem issues", "modem issues"),
+        ("look up xb8 gateway", "xb8 gateway"),
+        ("look for outages in denver", "outages in denver"),
+        ("find posts about data cap", "data cap"),
+        ("any posts about refunds", "refunds"),
+    ],
+)
+def test_search_requests_are_routed(router, text, query):
+    intent = router.route(text)
+    assert intent is not None
+    assert intent.tool == "search_subreddit"
+    assert intent.arguments == {"query": query}
+
+
+def test_latest_posts_are_routed(router):
+    intent = router.route("show me the 10 latest posts")
+    assert intent.tool == "fetch_recent_posts"
+    assert intent.arguments == {"timeframe": "new", "limit": 10}
+
+
+def test_references_need_history(router):
+    assert router.route("search for more outages", has_history=True) is None
+    assert router.route("search for more outages").arguments == {"query": "more outages"}
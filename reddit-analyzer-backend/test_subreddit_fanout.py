@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+from listing_cache import ListingCache
+from reddit_tools import RedditAnalyzer
+from reddit_transport import RequestBudget
+from subreddit_fanout import SubredditFanout
+
+
+class StubTransport:
+    """Answers every listing request with one post and counts the requests."""
+
+    def __init__(self):
+        self.requests = 0
+
+    async def get_bytes(self, url, params=None, headers=None):
+        self.requests += 1
+        child = {"kind": "t3", "data": {"id": f"p{self.requests}", "title": url, "permalink": "/r/x/"}}
+        return json.dumps({"data": {"children": [child], "after": None}}).encode()
+
+
+def make_fanout(capacity):
+    transport = StubTransport()
+    primary = RedditAnalyzer(subreddit="Comcast_Xfinity", transport=transport, cache=ListingCache())
+    fanout = SubredditFanout(primary, budget=RequestBudget(capacity=capacity, window=3600))
+    return fanout, transport
+
+
+def test_every_subreddit_spends_the_shared_budget():
+    fanout, transport = make_fanout(capacity=10)
+    subreddits = ["Comcast_Xfinity", "Xfinity", "Spectrum", "verizon"]
+
+    result = asyncio.run(fanout.search(subreddits, query="outage"))
+
+    assert transport.requests == 4
+    assert fanout.budget.granted == 4
+    assert sorted(result["counts"]) == sorted(subreddits)
+
+
+def test_primary_subreddit_is_skipped_when_budget_is_exhausted():
+    fanout, transport = make_fanout(capacity=2)
+
+    result = asyncio.run(fanout.search(["Xfinity", "Spectrum", "comcast_xfinity"], query="outage"))
+
+    assert transport.requests == 2
+    assert fanout.budget.granted == 2
+    assert fanout.budget.denied == 1
+    assert "comcast_xfinity" in result["skipped"]
+
+
+def test_primary_analyzer_itself_stays_unbudgeted():
+    fanout, _ = make_fanout(capacity=1)
+    asyncio.run(fanout.search(["Xfinity"], query="outage"))
+
+    posts = asyncio.run(fanout.primary.search_subreddit("outage"))
+
+    assert not RedditAnalyzer.is_error(posts)
+    assert fanout.primary.request_budget is None
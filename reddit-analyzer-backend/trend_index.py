@@ -0,0 +1,215 @@
+"""
+Time-bucketed trend index over ingested posts.
+
+This module keeps hourly and daily buckets of post count, comment count and
+score sum for every issue category and a set of tracked keywords. Buckets
+live in fixed-size ring buffers of compact integer arrays and are updated
+incrementally as posts are ingested, so "is X increasing?" is answered in
+O(buckets) without re-reading any posts.
+"""
+
+import os
+import re
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from issue_classifier import CATEGORIES, classify_post
+from reddit_models import Post
+
+DEFAULT_KEYWORDS = [
+    "outage", "down", "slow", "refund", "price increase", "data cap", "modem",
+    "gateway", "xb8", "technician", "cancel", "upload",
+]
+
+# (name, bucket width in seconds, number of buckets kept)
+GRANULARITIES = {
+    "hour": (3600, 24 * 30),
+    "day": (86400, 365),
+}
+
+ALL_POSTS = "all"
+
+# Remembered per-post contributions before expired ones are pruned
+MAX_CONTRIBUTIONS = 50000
+
+
+class _Series:
+    """Ring buffers of per-bucket counts for one topic at one granularity."""
+
+    __slots__ = ("posts", "comments", "score", "epoch")
+
+    def __init__(self, size: int):
+        self.posts = array("l", [0]) * size
+        self.comments = array("l", [0]) * size
+        self.score = array("l", [0]) * size
+        # Absolute bucket number currently held in each slot, so stale slots
+        # are reset lazily instead of by a periodic sweep
+        self.epoch = array("q", [-1]) * size
+
+    def add(self, bucket: int, posts: int, comments: int, score: int) -> None:
+        slot = bucket % len(self.epoch)
+        if self.epoch[slot] != bucket:
+            if self.epoch[slot] > bucket:
+                return  # older than the retained window
+            self.epoch[slot] = bucket
+            self.posts[slot] = self.comments[slot] = self.score[slot] = 0
+        self.posts[slot] += posts
+        self.comments[slot] += comments
+        self.score[slot] += score
+
+    def read(self, bucket: int) -> Tuple[int, int, int]:
+        slot = bucket % len(self.epoch)
+        if self.epoch[slot] != bucket:
+            return 0, 0, 0
+        return self.posts[slot], self.comments[slot], self.score[slot]
+
+
+class TrendIndex:
+    """
+    Incrementally maintained hourly/daily buckets per category and keyword.
+
+    Scores and comment counts change as posts are refreshed, so the index
+    remembers the last contribution of each post inside the daily window and
+    applies only the difference when the post is seen again.
+    """
+
+    def __init__(self, keywords: Optional[List[str]] = None):
+        """
+        Initialize an empty index.
+
+        Args:
+            keywords: Keywords tracked in addition to the issue categories
+        """
+        self.keywords = [keyword.lower() for keyword in (keywords or DEFAULT_KEYWORDS)]
+        self._keyword_pattern = re.compile(
+            r"\b(?:" + "|".join(re.escape(keyword) for keyword in sorted(self.keywords, key=len, reverse=True)) + r")\b",
+            re.IGNORECASE,
+        )
+        self.topics = [ALL_POSTS] + CATEGORIES + self.keywords
+        self._series: Dict[str, Dict[str, _Series]] = {
+            granularity: {topic: _Series(size) for topic in self.topics}
+            for granularity, (_, size) in GRANULARITIES.items()
+        }
+        # post id -> (created_utc, comments, score, topics) last added to the index
+        self._contributions: Dict[str, Tuple[float, int, int, Tuple[str, ...]]] = {}
+        # Size at which expired contributions are pruned; raised when most entries are still live
+        self._prune_at = MAX_CONTRIBUTIONS
+
+    @classmethod
+    def from_env(cls) -> "TrendIndex":
+        """Build an index tracking the comma-separated TREND_KEYWORDS, if set."""
+        keywords = os.getenv("TREND_KEYWORDS")
+        return cls([keyword.strip() for keyword in keywords.split(",") if keyword.strip()] if keywords else None)
+
+    def topics_of(self, post: Post) -> Set[str]:
+        """Categories and tracked keywords a post contributes to."""
+        content = post.content if post.content != "[No content]" else ""
+        text = f"{post.title}\n{content}"
+        topics = classify_post(post)
+        topics.update(match.group(0).lower() for match in self._keyword_pattern.finditer(text))
+        topics.add(ALL_POSTS)
+        return topics
+
+    def add_posts(self, posts: Iterable[Post]) -> None:
+        """Add new posts or apply score/comment changes of known ones."""
+        horizon = time.time() - GRANULARITIES["day"][0] * GRANULARITIES["day"][1]
+        for post in posts:
+            if not isinstance(post, Post) or post.created_utc < horizon:
+                continue
+            previous = self._contributions.get(post.id)
+            if previous is None:
+                topics = tuple(self.topics_of(post))
+                self._apply(post.created_utc, topics, 1, post.num_comments, post.score)
+            else:
+                _, old_comments, old_score, topics = previous
+                self._apply(
+                    post.created_utc, topics, 0,
+                    post.num_comments - old_comments, post.score - old_score,
+                )
+            self._contributions[post.id] = (post.created_utc, post.num_comments, post.score, topics)
+
+        if len(self._contributions) > self._prune_at:
+            self._prune(horizon)
+
+    def trend(self, topic: str = ALL_POSTS, granularity: str = "day", periods: int = 14) -> Dict[str, Any]:
+        """
+        Bucketed series and a simple increasing/decreasing verdict for a topic.
+
+        Args:
+            topic: "all", an issue category or a tracked keyword
+            granularity: "hour" or "day"
+            periods: Number of most recent buckets to return
+
+        Returns:
+            Series (oldest first) plus first-half vs second-half change and slope
+        """
+        topic = topic.lower()
+        if granularity not in GRANULARITIES:
+            return {"error": f"Unknown granularity '{granularity}', use 'hour' or 'day'"}
+        if topic not in self._series[granularity]:
+            return {
+                "error": f"Topic '{topic}' is not tracked",
+                "tracked_topics": self.topics,
+            }
+
+        width, size = GRANULARITIES[granularity]
+        periods = max(2, min(periods, size))
+        series = self._series[granularity][topic]
+        current = int(time.time() // width)
+        buckets = [series.read(bucket) for bucket in range(current - periods + 1, current + 1)]
+        counts = [posts for posts, _, _ in buckets]
+
+        half = periods // 2
+        earlier, recent = sum(counts[:half]), sum(counts[-half:])
+        change = None if earlier == 0 else round((recent - earlier) / earlier, 3)
+
+        return {
+            "topic": topic,
+            "granularity": granularity,
+            "bucket_start_utc": (current - periods + 1) * width,
+            "posts": counts,
+            "comments": [comments for _, comments, _ in buckets],
+            "score": [score for _, _, score in buckets],
+            "earlier_half_posts": earlier,
+            "recent_half_posts": recent,
+            "change": change,
+            "slope_per_bucket": round(self._slope(counts), 3),
+            "direction": self._direction(earlier, recent),
+        }
+
+    def _apply(self, created_utc: float, topics: Iterable[str], posts: int, comments: int, score: int) -> None:
+        for granularity, (width, _) in GRANULARITIES.items():
+            bucket = int(created_utc // width)
+            series_by_topic = self._series[granularity]
+            for topic in topics:
+                series_by_topic[topic].add(bucket, posts, comments, score)
+
+    def _prune(self, horizon: float) -> None:
+        self._contributions = {
+            post_id: contribution
+            for post_id, contribution in self._contributions.items()
+            if contribution[0] >= horizon
+        }
+        # Live entries can't be dropped without double counting their next update, so if
+        # pruning freed little, wait for 25% growth instead of rebuilding on every batch
+        self._prune_at = max(MAX_CONTRIBUTIONS, int(len(self._contributions) * 1.25))
+
+    @staticmethod
+    def _slope(values: List[int]) -> float:
+        """Least-squares slope of values against their index."""
+        n = len(values)
+        mean_x = (n - 1) / 2
+        mean_y = sum(values) / n
+        variance = sum((x - mean_x) ** 2 for x in range(n))
+        return sum((x - mean_x) * (y - mean_y) for x, y in enumerate(values)) / variance
+
+    @staticmethod
+    def _direction(earlier: int, recent: int) -> str:
+        if earlier == recent or (earlier + recent) < 3:
+            return "flat"
+        if recent > earlier * 1.2:
+            return "increasing"
+        if recent < earlier * 0.8:
+            return "decreasing"
+        return "flat"